@@ -0,0 +1,177 @@
+"""
+Import Benchmarks
+-----------------
+
+Benchmarks of the startup time of the package and its command line,
+which should not pay for importing heavy dependencies (numba, joblib,
+and numpy or PIL where possible) until they are actually needed.
+
+Each benchmark case runs in a fresh Python process and is repeated
+a few times. The heavy modules loaded by each case are recorded as
+well, and a case loading a module it should not is an error. Results
+are written to a JSON file, which can be compared against a stored
+baseline:
+
+    python benchmarks/imports.py run --output results.json
+    python benchmarks/imports.py compare baseline.json results.json
+"""
+
+import json
+import platform
+import subprocess
+import sys
+import time
+
+from datetime import datetime, timezone
+from pathlib import Path
+
+from loguru import logger
+from typer import Argument, Exit, Option, Typer
+
+from movie_colorbar import __version__
+
+app = Typer(no_args_is_help=True)
+
+# ----- Benchmark Settings ----- #
+
+# Heavy modules whose import is recorded
+HEAVY_MODULES: tuple[str, ...] = ("numpy", "PIL", "joblib", "numba")
+
+# Each case: the Python code run, and the heavy modules it should not import
+CASES: dict[str, tuple[str, tuple[str, ...]]] = {
+    "import package": ("import movie_colorbar", HEAVY_MODULES),
+    "import cli": ("import movie_colorbar.__main__", HEAVY_MODULES),
+    "cli --help": (
+        "import sys; from movie_colorbar.__main__ import app; sys.argv = ['movie_colorbar', "
+        "'--help']\ntry:\n    app()\nexcept SystemExit:\n    pass",
+        HEAVY_MODULES,
+    ),
+    "import api": ("from movie_colorbar import process_video", ("joblib", "numba")),
+}
+
+# Relative slowdown (compared to the baseline) reported as a regression
+DEFAULT_THRESHOLD: float = 0.2
+
+# ----- Commands ----- #
+
+
+@app.command()
+def run(
+    output: Path = Option(
+        default=Path("imports_results.json"),
+        help="Path of the JSON file the results are written to.",
+    ),
+    repeat: int = Option(
+        default=5,
+        min=1,
+        help="Number of timed runs of each case.",
+    ),
+) -> None:
+    """Run the benchmark cases and write their timings to a JSON file."""
+    results, unexpected = [], 0
+    for name, (code, forbidden) in CASES.items():
+        times, loaded = time_case(code, repeat)
+        results.append({"case": name, "times": times, "best": min(times), "loaded": loaded})
+        logger.info(f"{name}: {min(times) * 1000:.0f}ms, loads {', '.join(loaded) or 'none'}")
+        if wrongly_loaded := [module for module in loaded if module in forbidden]:
+            unexpected += 1
+            logger.error(f"{name}: should not import {', '.join(wrongly_loaded)}")
+
+    output.write_text(json.dumps({"metadata": _metadata(), "results": results}, indent=2))
+    logger.success(f"Results written to '{output.absolute()}'")
+    if unexpected:
+        raise Exit(code=1)
+
+
+@app.command()
+def compare(
+    baseline: Path = Argument(exists=True, help="Path to the baseline results file."),
+    results: Path = Argument(exists=True, help="Path to the results file to compare."),
+    threshold: float = Option(
+        default=DEFAULT_THRESHOLD,
+        min=0,
+        help="Relative slowdown reported as a regression (0.2 is 20% slower).",
+    ),
+) -> None:
+    """Compare results to a baseline, exiting with an error on regressions."""
+    baseline_times = {case["case"]: case["best"] for case in _load_results(baseline)}
+    regressions = 0
+
+    for case in _load_results(results):
+        name = case["case"]
+        if name not in baseline_times:
+            logger.info(f"{name}: {case['best'] * 1000:.0f}ms (not in baseline)")
+            continue
+        ratio = case["best"] / baseline_times[name]
+        message = (
+            f"{name}: {baseline_times[name] * 1000:.0f}ms -> {case['best'] * 1000:.0f}ms "
+            f"({ratio:.2f}x)"
+        )
+        if ratio > 1 + threshold:
+            regressions += 1
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+    if regressions:
+        logger.error(f"{regressions} cases are more than {threshold:.0%} slower than baseline")
+        raise Exit(code=1)
+    logger.success("No regression compared to baseline")
+
+
+# ----- Helpers ----- #
+
+
+def time_case(code: str, repeat: int) -> tuple[list[float], list[str]]:
+    """
+    Time the given code in fresh Python processes, including the
+    startup of the interpreter itself, and find which of the heavy
+    modules it imports.
+
+    Parameters
+    ----------
+    code : str
+        The Python code to run.
+    repeat : int
+        Number of timed runs.
+
+    Returns
+    -------
+    tuple[list[float], list[str]]
+        The wall times of the runs, in seconds, and the heavy
+        modules imported by the code.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], capture_output=True, check=True)
+        times.append(time.perf_counter() - start)
+
+    check = (
+        f"{code}\nimport json, sys\n"
+        f"print(json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]))"
+    )
+    result = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.error(f"Benchmark case failed: {result.stderr}")
+        raise RuntimeError(f"Benchmark case failed: {result.stderr}")
+    return times, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _load_results(path: Path) -> list[dict]:
+    """Load the list of benchmark results from a results file."""
+    return json.loads(path.read_text())["results"]
+
+
+def _metadata() -> dict:
+    """Information on the environment the benchmarks are run in."""
+    return {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "movie_colorbar": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+if __name__ == "__main__":
+    app()
@@ -0,0 +1,527 @@
+"""
+Pipeline Benchmarks
+-------------------
+
+End-to-end benchmarks of the `process_video` pipeline, on synthetic
+videos generated locally (and deterministically) with ffmpeg's
+`testsrc2` and `mandelbrot` sources, at several resolutions and
+durations.
+
+Each benchmark case (a video, a method, an fps and whether joblib
+is used) runs in a fresh Python process, so that import costs are
+accounted for as they would be by the command line, and is repeated
+a few times. The pipeline computes colors with vectorized numpy code
+and calls no numba-compiled function, so numba is not toggled there.
+
+Cases run with a temporary cache directory (see the environment
+variable MOVIE_COLORBAR_CACHE_DIR), shared by the cases of a run and
+removed afterwards, so that the user's cache is left alone and every
+run starts from the same, empty cache.
+
+The per-image API (`movie_colorbar.bar.METHOD_ACTION_MAP`, one PIL
+image at a time) is what still uses the JIT-compiled conversions,
+and is benchmarked on its own, with and without numba, by the
+`images` command. Results are written to a JSON file, which can be
+compared against a stored baseline:
+
+    python benchmarks/pipeline.py run --output results.json
+    python benchmarks/pipeline.py images --output images.json
+    python benchmarks/pipeline.py compare baseline.json results.json
+
+See `python benchmarks/pipeline.py run --help` for the options used
+to select benchmark cases.
+"""
+
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+from datetime import datetime, timezone
+from enum import Enum
+from pathlib import Path
+
+from loguru import logger
+from PIL import Image
+from typer import Argument, Exit, Option, Typer
+
+from movie_colorbar import __version__, bar
+from movie_colorbar.constants import ExtractionModes, Methods
+from movie_colorbar.extract import stream_frames_from_video
+from movie_colorbar.jit import NUMBA_AVAILABLE
+from movie_colorbar.process import process_video
+
+app = Typer(no_args_is_help=True)
+
+# ----- Benchmark Settings ----- #
+
+# Generated videos are kept here, so they are only created once
+VIDEOS_DIRECTORY: Path = Path(__file__).parent / "videos"
+
+# The ffmpeg lavfi sources used to generate videos
+VIDEO_SOURCES: tuple[str, ...] = ("testsrc2", "mandelbrot")
+
+# The frame rate of the generated videos
+VIDEO_FRAME_RATE: int = 25
+
+# Default benchmark matrix: 2 videos, every method and with and without joblib,
+# that is 40 cases. Each run is a fresh Python process, repeated 3 times by
+# default, so this takes a few minutes; larger matrices are selected explicitly
+DEFAULT_SOURCES: list[str] = [VIDEO_SOURCES[0]]
+DEFAULT_RESOLUTIONS: list[str] = ["320x240", "1280x720"]
+DEFAULT_DURATIONS: list[int] = [10]
+DEFAULT_FPS: list[int] = [5]
+
+# Frames the per-image API is timed on, taken from one generated video
+DEFAULT_IMAGES_RESOLUTION: str = "320x240"
+DEFAULT_IMAGES_COUNT: int = 50
+
+# Relative slowdown (compared to the baseline) reported as a regression
+DEFAULT_THRESHOLD: float = 0.1
+
+
+class Toggle(str, Enum):
+    on: str = "on"
+    off: str = "off"
+    both: str = "both"
+
+
+# ----- Commands ----- #
+
+
+@app.command()
+def run(
+    output: Path = Option(
+        default=Path("benchmark_results.json"),
+        help="Path of the JSON file the results are written to.",
+    ),
+    source: list[str] = Option(
+        default=DEFAULT_SOURCES,
+        help="ffmpeg source(s) to generate the videos from.",
+    ),
+    resolution: list[str] = Option(
+        default=DEFAULT_RESOLUTIONS,
+        help="Resolution(s) of the generated videos, as WIDTHxHEIGHT.",
+    ),
+    duration: list[int] = Option(
+        default=DEFAULT_DURATIONS,
+        min=1,
+        help="Duration(s) of the generated videos, in seconds.",
+    ),
+    method: list[Methods] = Option(
+        default=list(Methods),
+        help="Method(s) to benchmark.",
+    ),
+    fps: list[int] = Option(
+        default=DEFAULT_FPS,
+        min=1,
+        help="Number(s) of frames extracted per second of video.",
+    ),
+    extraction: ExtractionModes = Option(
+        default=ExtractionModes.pipe,
+        show_choices=True,
+        help="How frames are handed over by ffmpeg.",
+    ),
+    joblib: Toggle = Option(
+        default=Toggle.both,
+        show_choices=True,
+        help="Whether to benchmark with joblib, without it, or both.",
+    ),
+    repeat: int = Option(
+        default=3,
+        min=1,
+        help="Number of timed runs of each case.",
+    ),
+) -> None:
+    """Run the pipeline benchmark cases and write their timings to a JSON file."""
+    videos = [
+        generate_video(video_source, video_resolution, video_duration)
+        for video_source, video_resolution, video_duration in itertools.product(
+            source, resolution, duration
+        )
+    ]
+    cases = list(
+        itertools.product(
+            videos,
+            method,
+            fps,
+            _toggle_values(joblib, bar.JOBLIB_AVAILABLE, "joblib"),
+        )
+    )
+    logger.info(f"Running {len(cases)} benchmark cases, {repeat} times each")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="movie_colorbar_benchmark_") as cache_directory:
+        for index, (video, case_method, case_fps, use_joblib) in enumerate(cases, start=1):
+            case = {
+                "api": "pipeline",
+                "video": video.stem,
+                "method": case_method.value,
+                "fps": case_fps,
+                "extraction": extraction.value,
+                "joblib": use_joblib,
+            }
+            times = time_case(
+                video, case_method, case_fps, extraction, use_joblib, repeat, Path(cache_directory)
+            )
+            results.append({**case, "times": times, "best": min(times)})
+            logger.info(f"[{index}/{len(cases)}] {_case_label(case)}: {min(times):.3f}s")
+
+    output.write_text(json.dumps({"metadata": _metadata(), "results": results}, indent=2))
+    logger.success(f"Results written to '{output.absolute()}'")
+
+
+@app.command()
+def images(
+    output: Path = Option(
+        default=Path("images_benchmark_results.json"),
+        help="Path of the JSON file the results are written to.",
+    ),
+    source: str = Option(
+        default=VIDEO_SOURCES[0],
+        help="ffmpeg source to generate the video the frames come from.",
+    ),
+    resolution: str = Option(
+        default=DEFAULT_IMAGES_RESOLUTION,
+        help="Resolution of the frames, as WIDTHxHEIGHT.",
+    ),
+    count: int = Option(
+        default=DEFAULT_IMAGES_COUNT,
+        min=1,
+        help="Number of frames each method is applied to.",
+    ),
+    method: list[Methods] = Option(
+        default=list(Methods),
+        help="Method(s) to benchmark.",
+    ),
+    numba: Toggle = Option(
+        default=Toggle.both,
+        show_choices=True,
+        help="Whether to benchmark with numba, without it, or both.",
+    ),
+    repeat: int = Option(
+        default=3,
+        min=1,
+        help="Number of timed runs of each case.",
+    ),
+) -> None:
+    """Run the per-image API benchmark cases and write their timings to a JSON file."""
+    duration = -(-count // VIDEO_FRAME_RATE)  # enough seconds for the frames
+    video = generate_video(source, resolution, duration)
+    cases = list(itertools.product(method, _toggle_values(numba, NUMBA_AVAILABLE, "numba")))
+    logger.info(f"Running {len(cases)} benchmark cases on {count} frames, {repeat} times each")
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="movie_colorbar_benchmark_") as cache_directory:
+        for index, (case_method, use_numba) in enumerate(cases, start=1):
+            case = {
+                "api": "image",
+                "video": video.stem,
+                "method": case_method.value,
+                "frames": count,
+                "numba": use_numba,
+            }
+            times = time_images_case(
+                video, resolution, case_method, count, use_numba, repeat, Path(cache_directory)
+            )
+            results.append({**case, "times": times, "best": min(times)})
+            logger.info(f"[{index}/{len(cases)}] {_case_label(case)}: {min(times):.3f}s")
+
+    output.write_text(json.dumps({"metadata": _metadata(), "results": results}, indent=2))
+    logger.success(f"Results written to '{output.absolute()}'")
+
+
+@app.command()
+def compare(
+    baseline: Path = Argument(exists=True, help="Path to the baseline results file."),
+    results: Path = Argument(exists=True, help="Path to the results file to compare."),
+    threshold: float = Option(
+        default=DEFAULT_THRESHOLD,
+        min=0,
+        help="Relative slowdown reported as a regression (0.1 is 10% slower).",
+    ),
+) -> None:
+    """Compare results to a baseline, exiting with an error on regressions."""
+    baseline_times = {_case_label(case): case["best"] for case in _load_results(baseline)}
+    regressions = 0
+
+    for case in _load_results(results):
+        label = _case_label(case)
+        if label not in baseline_times:
+            logger.info(f"{label}: {case['best']:.3f}s (not in baseline)")
+            continue
+        ratio = case["best"] / baseline_times[label]
+        message = f"{label}: {baseline_times[label]:.3f}s -> {case['best']:.3f}s ({ratio:.2f}x)"
+        if ratio > 1 + threshold:
+            regressions += 1
+            logger.warning(message)
+        else:
+            logger.info(message)
+
+    if regressions:
+        logger.error(f"{regressions} cases are more than {threshold:.0%} slower than baseline")
+        raise Exit(code=1)
+    logger.success("No regression compared to baseline")
+
+
+@app.command(hidden=True)
+def worker(
+    video: Path = Argument(exists=True),
+    method: Methods = Argument(),
+    fps: int = Argument(),
+    extraction: ExtractionModes = Argument(),
+    use_joblib: bool = Option(default=True, help="Whether joblib is used."),
+    repeat: int = Option(default=1, min=1),
+) -> None:
+    """
+    Time process_video on a single case, in this process, and print
+    the wall times of the runs as JSON.
+    """
+    logger.remove()  # keep the output clean for the parent process
+    if not use_joblib:
+        bar.JOBLIB_AVAILABLE = False
+
+    times = []
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            process_video(
+                video,
+                method,
+                fps,
+                Path(tmpdir) / "bar.png",
+                extraction=extraction,
+                cache=False,
+            )
+            times.append(time.perf_counter() - start)
+    print(json.dumps(times))
+
+
+@app.command(hidden=True)
+def images_worker(
+    video: Path = Argument(exists=True),
+    resolution: str = Argument(),
+    method: Methods = Argument(),
+    count: int = Argument(),
+    repeat: int = Option(default=1, min=1),
+) -> None:
+    """
+    Time the per-image function of a method on the first frames of
+    the video, in this process, and print the wall times of the runs
+    as JSON. Numba is toggled by the parent process through the
+    NUMBA_DISABLE_JIT environment variable.
+    """
+    logger.remove()  # keep the output clean for the parent process
+    width, height = (int(value) for value in resolution.split("x"))
+    frames = [
+        Image.frombytes("RGB", (width, height), buffer)
+        for buffer in stream_frames_from_video(video, VIDEO_FRAME_RATE, (width, height))
+    ][:count]
+
+    function = bar.METHOD_ACTION_MAP[method]
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frame in frames:
+            function(frame)
+        times.append(time.perf_counter() - start)
+    print(json.dumps(times))
+
+
+# ----- Helpers ----- #
+
+
+def generate_video(source: str, resolution: str, duration: int) -> Path:
+    """
+    Generate a synthetic video with ffmpeg, if it does not exist yet.
+    Encoding is single-threaded and bit-exact, so that the generated
+    file is the same from one run to the next.
+
+    Parameters
+    ----------
+    source : str
+        The ffmpeg lavfi source to use, e.g. 'testsrc2' or 'mandelbrot'.
+    resolution : str
+        The resolution of the video, as WIDTHxHEIGHT.
+    duration : int
+        The duration of the video, in seconds.
+
+    Returns
+    -------
+    pathlib.Path
+        Path to the generated video file.
+    """
+    video = VIDEOS_DIRECTORY / f"{source}_{resolution}_{duration}s.mp4"
+    if video.is_file():
+        return video
+
+    logger.info(f"Generating benchmark video '{video.name}'")
+    VIDEOS_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-y",
+        "-f",
+        "lavfi",
+        "-i",
+        f"{source}=size={resolution}:rate={VIDEO_FRAME_RATE}",
+        "-t",
+        str(duration),
+        "-c:v",
+        "libx264",
+        "-preset",
+        "veryfast",
+        "-pix_fmt",
+        "yuv420p",
+        "-threads",
+        "1",
+        "-fflags",
+        "+bitexact",
+        "-flags:v",
+        "+bitexact",
+        str(video),
+    ]
+    subprocess.run(command, capture_output=True, check=True)
+    return video
+
+
+def time_case(
+    video: Path,
+    method: str,
+    fps: int,
+    extraction: str,
+    use_joblib: bool,
+    repeat: int,
+    cache_directory: Path,
+) -> list[float]:
+    """
+    Time a pipeline benchmark case in a fresh Python process, with
+    the given cache directory. The first run includes the loading of
+    lookup tables (and their building, for the first case needing
+    them), and is reported along with the others. The best time is
+    representative of a warm run.
+
+    Returns
+    -------
+    list[float]
+        The wall times of the runs, in seconds.
+    """
+    command = [
+        sys.executable,
+        __file__,
+        "worker",
+        str(video),
+        Methods(method).value,
+        str(fps),
+        ExtractionModes(extraction).value,
+        "--use-joblib" if use_joblib else "--no-use-joblib",
+        "--repeat",
+        str(repeat),
+    ]
+    return _run_worker(command, cache_directory)
+
+
+def time_images_case(
+    video: Path,
+    resolution: str,
+    method: str,
+    count: int,
+    use_numba: bool,
+    repeat: int,
+    cache_directory: Path,
+) -> list[float]:
+    """
+    Time a per-image API benchmark case in a fresh Python process,
+    with the given cache directory. The first run includes the JIT
+    compilation (or its loading from the on-disk cache), and is
+    reported along with the others. The best time is representative
+    of a warm run.
+
+    Returns
+    -------
+    list[float]
+        The wall times of the runs, in seconds.
+    """
+    command = [
+        sys.executable,
+        __file__,
+        "images-worker",
+        str(video),
+        resolution,
+        Methods(method).value,
+        str(count),
+        "--repeat",
+        str(repeat),
+    ]
+    return _run_worker(command, cache_directory, {"NUMBA_DISABLE_JIT": "0" if use_numba else "1"})
+
+
+def _run_worker(
+    command: list[str], cache_directory: Path, environment: dict | None = None
+) -> list[float]:
+    """
+    Run a worker command with the given cache directory and additional
+    environment variables, and parse the wall times it prints.
+    """
+    environment = {
+        **os.environ,
+        "MOVIE_COLORBAR_CACHE_DIR": str(cache_directory),
+        **(environment or {}),
+    }
+    result = subprocess.run(command, capture_output=True, text=True, env=environment)
+    if result.returncode != 0:
+        logger.error(f"Benchmark case failed: {result.stderr}")
+        raise RuntimeError(f"Benchmark case failed: {result.stderr}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _toggle_values(toggle: str, available: bool, name: str) -> list[bool]:
+    """The values of a toggle to benchmark, only 'off' if the package is not installed."""
+    if not available and toggle != Toggle.off:
+        logger.warning(f"Package {name} is not installed, only benchmarking without it")
+        return [False]
+    return {Toggle.on: [True], Toggle.off: [False], Toggle.both: [True, False]}[toggle]
+
+
+def _case_label(case: dict) -> str:
+    """A readable label identifying a benchmark case."""
+    if case.get("api") == "image":
+        return (
+            f"image {case['video']} {case['method']} frames={case['frames']}"
+            f" numba={'on' if case['numba'] else 'off'}"
+        )
+    return (
+        f"{case['video']} {case['method']} fps={case['fps']} {case['extraction']}"
+        f" joblib={'on' if case['joblib'] else 'off'}"
+    )
+
+
+def _load_results(path: Path) -> list[dict]:
+    """Load the list of benchmark results from a results file."""
+    return json.loads(path.read_text())["results"]
+
+
+def _metadata() -> dict:
+    """Information on the environment the benchmarks are run in."""
+    ffmpeg_version = subprocess.run(
+        ["ffmpeg", "-version"], capture_output=True, text=True
+    ).stdout.split("\n", 1)[0]
+    return {
+        "date": datetime.now(timezone.utc).isoformat(),
+        "movie_colorbar": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "ffmpeg": ffmpeg_version,
+        "joblib_available": bar.JOBLIB_AVAILABLE,
+        "numba_available": NUMBA_AVAILABLE,
+    }
+
+
+if __name__ == "__main__":
+    app()
@@ -1,12 +1,93 @@
+"""
+Movie Colorbar
+--------------
+
+Create colorbars from videos. The functions of the public API are
+imported from their submodules on first access, so that importing
+the package (for instance to run the command line) stays fast.
+"""
+
+from importlib import import_module
+from typing import TYPE_CHECKING
+
 __version__ = "0.3.0"
 
-from .bar import create_colorbar_from_images
-from .extract import extract_frames_from_video
-from .process import process_directory, process_video
+# Maps each public function to the submodule it is defined in
+_EXPORTS: dict[str, str] = {
+    "bin_colors": "bar",
+    "compute_colors_from_frames": "bar",
+    "compute_colors_from_images": "bar",
+    "compute_methods_colors_from_frames": "bar",
+    "compute_methods_colors_from_images": "bar",
+    "create_colorbar_from_colors": "bar",
+    "create_colorbar_from_frames": "bar",
+    "create_colorbar_from_images": "bar",
+    "create_colorbar_from_store": "bar",
+    "compute_colors_from_store": "bar",
+    "compute_methods_colors_from_store": "bar",
+    "iter_colors_from_frames": "bar",
+    "extract_frames_from_video": "extract",
+    "iter_frames_from_video": "extract",
+    "probe_keyframes_timestamps": "extract",
+    "probe_video": "extract",
+    "store_frames_from_video": "extract",
+    "stream_frames_from_video": "extract",
+    "compute_video_colors": "process",
+    "iter_frame_colors": "process",
+    "process_video": "process",
+    "process_directory": "process",
+    "render_colorbar": "process",
+    "render_directory": "process",
+    "load_colors_sidecar": "sidecar",
+    "save_colors_sidecar": "sidecar",
+    "frame_store_length": "store",
+    "open_frame_store": "store",
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .bar import (
+        bin_colors,
+        compute_colors_from_frames,
+        compute_colors_from_images,
+        compute_colors_from_store,
+        compute_methods_colors_from_frames,
+        compute_methods_colors_from_images,
+        compute_methods_colors_from_store,
+        create_colorbar_from_colors,
+        create_colorbar_from_frames,
+        create_colorbar_from_images,
+        create_colorbar_from_store,
+        iter_colors_from_frames,
+    )
+    from .extract import (
+        extract_frames_from_video,
+        iter_frames_from_video,
+        probe_keyframes_timestamps,
+        probe_video,
+        store_frames_from_video,
+        stream_frames_from_video,
+    )
+    from .process import (
+        compute_video_colors,
+        iter_frame_colors,
+        process_directory,
+        process_video,
+        render_colorbar,
+        render_directory,
+    )
+    from .sidecar import load_colors_sidecar, save_colors_sidecar
+    from .store import frame_store_length, open_frame_store
+
+
+def __getattr__(name: str):
+    if name in _EXPORTS:
+        value = getattr(import_module(f".{_EXPORTS[name]}", __name__), name)
+        globals()[name] = value  # next accesses skip this function
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
-__all__ = [
-    "create_colorbar_from_images",
-    "extract_frames_from_video",
-    "process_video",
-    "process_directory",
-]
+def __dir__() -> list[str]:
+    return sorted([*globals(), *__all__])
@@ -7,15 +7,99 @@ import sys
 from pathlib import Path
 
 from loguru import logger
-from typer import Argument, Exit, Option, Typer
+from typer import Argument, BadParameter, Context, Exit, Option, Typer
+from typer.core import TyperGroup
 
-from movie_colorbar.constants import LogLevels, Methods
-from movie_colorbar.process import process_directory, process_video
+from movie_colorbar.constants import (
+    DEFAULT_ANALYSIS_SIZE,
+    DEFAULT_JOBS,
+    DEFAULT_NCLUSTERS,
+    DEFAULT_SEED,
+    DEFAULT_TOLERANCE,
+    FRAMES_BATCH_SIZE,
+    ExtractionModes,
+    Layouts,
+    LogLevels,
+    Methods,
+    Resampling,
+    Sampling,
+)
+from movie_colorbar.state import WATCH_INTERVAL_SECONDS
 
-app = Typer(no_args_is_help=True)
+# Command run when the first argument is not a command name
+DEFAULT_COMMAND: str = "create"
 
 
-@app.command()
+class DefaultCommandGroup(TyperGroup):
+    """
+    Group of commands in which arguments not starting with a command
+    name are handed over to the default command, so that the usual
+    `colorbar INPUT OUTPUT` keeps working next to `colorbar render`.
+    """
+
+    def parse_args(self, ctx: Context, args: list[str]) -> list[str]:
+        group_options = {option for param in self.get_params(ctx) for option in param.opts}
+        if args and args[0] not in self.commands and args[0] not in group_options:
+            args = [DEFAULT_COMMAND, *args]
+        return super().parse_args(ctx, args)
+
+
+app = Typer(cls=DefaultCommandGroup, no_args_is_help=True)
+
+# ----- Options helpers ----- #
+
+
+def parse_methods(values: list[str]) -> list[str]:
+    """
+    Parse the values given to the method option, which can each
+    be a method name, a comma-separated list of method names, or
+    'all' for every available method.
+
+    Parameters
+    ----------
+    values : list[str]
+        The values given to the option.
+
+    Returns
+    -------
+    list[str]
+        The requested methods, without duplicates.
+    """
+    methods: list[str] = []
+    for value in values:
+        for name in value.split(","):
+            name = name.strip().lower()
+            if name == "all":
+                methods.extend(method.value for method in Methods)
+            elif name in {method.value for method in Methods}:
+                methods.append(name)
+            else:
+                raise BadParameter(f"'{name}' is not a valid method.")
+    return list(dict.fromkeys(methods))
+
+
+def validate_jobs(value: int) -> int:
+    """
+    Validate the value given to the jobs option, which follows
+    joblib's convention: a number of worker processes, or a
+    negative number counting back from the number of cores.
+
+    Parameters
+    ----------
+    value : int
+        The value given to the option.
+
+    Returns
+    -------
+    int
+        The validated number of jobs.
+    """
+    if value == 0:
+        raise BadParameter("0 jobs has no meaning, use 1 to compute colors sequentially.")
+    return value
+
+
+@app.command(name=DEFAULT_COMMAND)
 def main(
     input: Path = Argument(
         file_okay=True,
@@ -33,21 +117,158 @@ def main(
         show_default=False,  # required anyway
         help="Path to the output colorbar image or directory.",
     ),
-    method: Methods = Option(
-        default=Methods.rgb,
-        show_choices=True,
-        help="Method used to calculate the color for each frame.",
+    method: list[str] = Option(
+        default=[Methods.rgb.value],
+        callback=parse_methods,
+        help="Method used to calculate the color for each frame, one of: "
+        f"{', '.join(method.value for method in Methods)}. Can be given several times "
+        "(or as a comma-separated list), or as 'all', to create one colorbar per method "
+        "from a single extraction of the frames.",
     ),
     fps: int = Option(
         default=10,
         min=0,
         help="Number of frames to extract per second of video footage.",
     ),
+    width: int | None = Option(
+        default=None,
+        min=1,
+        show_default="number of frames",
+        help="Width of the colorbar, in pixels. With fewer columns than frames, the colors "
+        "of consecutive frames are binned together, according to the method.",
+    ),
+    height: int | None = Option(
+        default=None,
+        min=1,
+        show_default="width / 2.5",
+        help="Height of the colorbar, in pixels.",
+    ),
     cleanup: bool = Option(
         default=True,
         show_choices=True,
         help="Whether to remove the extracted frames after processing.",
     ),
+    sampling: Sampling = Option(
+        default=Sampling.fps,
+        show_choices=True,
+        help="How frames are sampled: at the given fps, or only the keyframes of the video "
+        "(much faster, for quick previews, the fps option is then ignored).",
+    ),
+    extraction: ExtractionModes = Option(
+        default=ExtractionModes.files,
+        show_choices=True,
+        help="How frames are handed over by ffmpeg: written to disk as image files, as raw data "
+        "to a single memory-mapped frame store file, or streamed as raw data with nothing written "
+        "to disk.",
+    ),
+    analysis_size: tuple[int, int] = Option(
+        default=DEFAULT_ANALYSIS_SIZE,
+        min=1,
+        metavar="WIDTH HEIGHT",
+        help="Size frames are downscaled to by ffmpeg before their color is computed.",
+    ),
+    resampling: Resampling = Option(
+        default=Resampling.bicubic,
+        show_choices=True,
+        help="Resampling filter used to downscale the frames.",
+    ),
+    kmeans_clusters: int = Option(
+        default=DEFAULT_NCLUSTERS,
+        min=1,
+        help="Number of clusters used by the kmeans method.",
+    ),
+    kmeans_tolerance: float = Option(
+        default=DEFAULT_TOLERANCE,
+        min=0,
+        help="Convergence tolerance (total shift of the centers) of the kmeans method.",
+    ),
+    seed: int = Option(
+        default=DEFAULT_SEED,
+        min=0,
+        help="Seed for the random initialization of the kmeans method.",
+    ),
+    lut: bool = Option(
+        default=True,
+        show_choices=True,
+        help="Whether to convert colors with precomputed lookup tables, cached on disk "
+        "(for the hsv, hue, lab and xyz methods). Each table takes about 200MB at 8 bits, in "
+        "the cache directory, and is never evicted.",
+    ),
+    lut_bits: int = Option(
+        default=8,
+        min=1,
+        max=8,
+        help="Bits per channel of the lookup tables' RGB grid (8 is exact, lower is coarser).",
+    ),
+    common_bits: int = Option(
+        default=8,
+        min=1,
+        max=8,
+        help="Bits per channel colors are quantized to before the common method counts them "
+        "(8 counts exact colors, lower groups similar colors together).",
+    ),
+    cache: bool = Option(
+        default=True,
+        show_choices=True,
+        help="Whether to reuse the colors computed in a previous run with the same video "
+        "and settings, from an on-disk cache.",
+    ),
+    segments: int = Option(
+        default=1,
+        min=1,
+        help="Number of segments each video's timeline is split into, to decode them "
+        "concurrently. Useful for very long videos, the result being unchanged.",
+    ),
+    jobs: int = Option(
+        default=DEFAULT_JOBS,
+        callback=validate_jobs,
+        help="Number of worker processes computing colors (requires joblib). Negative values "
+        "count back from the number of cores (-1 for all cores), and 1 disables the workers.",
+    ),
+    chunk_size: int = Option(
+        default=FRAMES_BATCH_SIZE,
+        min=1,
+        help="Number of frames handed over to a worker at once, and processed together.",
+    ),
+    window: int | None = Option(
+        default=None,
+        min=1,
+        show_default="whole video",
+        help="With files extraction, extract frames in consecutive windows of this many frames, "
+        "removing each frame once loaded, so that disk and memory usage stay bounded however long "
+        "the video is.",
+    ),
+    concurrent_videos: int | None = Option(
+        default=None,
+        min=1,
+        show_default="number of cores",
+        help="Maximum number of videos processed at the same time, when the input is a "
+        "directory. The cores are shared between the ffmpeg processes of these videos.",
+    ),
+    watch: bool = Option(
+        default=False,
+        help="When the input is a directory, keep watching it and process new or changed videos "
+        "as they appear. An index of processed videos is kept in the output directory, so that "
+        "up to date colorbars are skipped, also from one run to the next.",
+    ),
+    watch_interval: float = Option(
+        default=WATCH_INTERVAL_SECONDS,
+        min=0,
+        help="Time between two scans of the watched directory, in seconds.",
+    ),
+    sidecar: bool = Option(
+        default=False,
+        help="Also write the colors of all frames to a sidecar file next to each colorbar (same "
+        "name, .npz extension), from which colorbars can be rendered again with the render command.",
+    ),
+    profile_report: Path | None = Option(
+        default=None,
+        dir_okay=False,
+        resolve_path=True,
+        help="Path of a JSON file to write a report to, with the time spent in each processing "
+        "stage, the throughput, and the memory and temporary disk usage of each video. Videos "
+        "of a directory are then processed one at a time, so that measurements are their own.",
+    ),
     log_level: LogLevels = Option(
         default=LogLevels.info,
         show_choices=True,
@@ -63,14 +284,28 @@ def main(
     these determined colors, and written to disk as an image file at
     the provided output location. By default the extracted frames are
     removed after processing, but they can be kept if desired (see the
-    'cleanup' option).
+    'cleanup' option). Alternatively, frames can be streamed directly
+    from ffmpeg without writing anything to disk (see the 'extraction'
+    option).
 
     Should the input be a directory, then every video file contained
     within will be processed, provided it is supported by ffmpeg. In
     this case the output should also be a directory, in which one
     colorbar will be created for each video file.
     """
+    # Imported here rather than at the top, so that --help and
+    # invalid options do not pay for importing numpy and friends
+    from movie_colorbar.process import process_directory, process_video
+
     set_logger_level(log_level)
+    method_options = {
+        "nclusters": kmeans_clusters,
+        "tolerance": kmeans_tolerance,
+        "seed": seed,
+        "lut": lut,
+        "lut_bits": lut_bits,
+        "common_bits": common_bits,
+    }
 
     # Handle a single file provided as input
     if input.is_file():
@@ -78,8 +313,30 @@ def main(
         if output.exists() and not output.is_file():
             logger.error("The output path should match the type of the input path")
             raise Exit(code=1)
+        if watch is True:
+            logger.warning("Watch mode only applies to a directory input, ignoring it")
         # Process the video (skipped if unsupported format)
-        process_video(video=input, method=method, fps=fps, outputpath=output, cleanup=cleanup)
+        process_video(
+            video=input,
+            method=method,
+            fps=fps,
+            outputpath=output,
+            cleanup=cleanup,
+            extraction=extraction,
+            analysis_size=analysis_size,
+            resampling=resampling,
+            method_options=method_options,
+            cache=cache,
+            segments=segments,
+            sampling=sampling,
+            profile_report=profile_report,
+            width=width,
+            height=height,
+            jobs=jobs,
+            chunk_size=chunk_size,
+            window=window,
+            sidecar=sidecar,
+        )
 
     # Handle a directory provided as input
     elif input.is_dir():
@@ -89,12 +346,112 @@ def main(
             raise Exit(code=1)
         # Process all videos in the directory
         process_directory(
-            directory=input, method=method, fps=fps, outputdir=output, cleanup=cleanup
+            directory=input,
+            method=method,
+            fps=fps,
+            outputdir=output,
+            cleanup=cleanup,
+            extraction=extraction,
+            analysis_size=analysis_size,
+            resampling=resampling,
+            method_options=method_options,
+            cache=cache,
+            segments=segments,
+            sampling=sampling,
+            concurrent_videos=concurrent_videos,
+            profile_report=profile_report,
+            width=width,
+            height=height,
+            jobs=jobs,
+            chunk_size=chunk_size,
+            watch=watch,
+            watch_interval=watch_interval,
+            window=window,
+            sidecar=sidecar,
         )
 
     logger.success("All done!")
 
 
+@app.command()
+def render(
+    input: Path = Argument(
+        file_okay=True,
+        dir_okay=True,
+        exists=True,
+        resolve_path=True,
+        show_default=False,  # required anyway
+        help="Path to the input sidecar file, or directory of sidecar files.",
+    ),
+    output: Path = Argument(
+        file_okay=True,
+        dir_okay=True,
+        exists=False,
+        resolve_path=True,
+        show_default=False,  # required anyway
+        help="Path to the output colorbar image or directory.",
+    ),
+    width: int | None = Option(
+        default=None,
+        min=1,
+        show_default="number of frames",
+        help="Width of the colorbar, in pixels. With fewer columns than frames, the colors "
+        "of consecutive frames are binned together, according to their method.",
+    ),
+    height: int | None = Option(
+        default=None,
+        min=1,
+        show_default="width / 2.5",
+        help="Height of the colorbar, in pixels.",
+    ),
+    layout: Layouts = Option(
+        default=Layouts.horizontal,
+        show_choices=True,
+        help="Whether time runs from left to right (horizontal) or top to bottom (vertical).",
+    ),
+    file_format: str = Option(
+        "png",
+        "--format",
+        help="Image format of the colorbars when the input is a directory, for instance png, "
+        "jpg or webp. For a single sidecar, the extension of the output path is used.",
+    ),
+    log_level: LogLevels = Option(
+        default=LogLevels.info,
+        show_choices=True,
+        help="The base console logging level.",
+    ),
+) -> None:
+    """Render colorbars from sidecar files, without decoding the videos.
+
+    Sidecar files hold the colors computed from a video's frames, and
+    are written next to the colorbars with the 'sidecar' option of the
+    create command. New colorbars of other sizes, layouts or formats
+    can then be rendered from them in a fraction of a second.
+
+    Should the input be a directory, a colorbar is rendered from every
+    sidecar file contained within, in the output directory.
+    """
+    # Imported here rather than at the top, for the same reason as in main
+    from movie_colorbar.process import render_colorbar, render_directory
+
+    set_logger_level(log_level)
+    if input.is_file():
+        if output.exists() and not output.is_file():
+            logger.error("The output path should match the type of the input path")
+            raise Exit(code=1)
+        try:
+            render_colorbar(input, output, width, height, layout)
+        except ValueError as error:
+            logger.error(str(error))
+            raise Exit(code=1) from error
+    else:
+        if output.exists() and not output.is_dir():
+            logger.error("The output path should match the type of the input path")
+            raise Exit(code=1)
+        render_directory(input, output, width, height, layout, file_format.lstrip("."))
+    logger.success("All done!")
+
+
 # ----- Logger helper ----- #
 
 
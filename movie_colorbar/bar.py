@@ -1,25 +1,43 @@
 """
-Extract
--------
+Bar
+---
 
 Module with functions to handle the creation of
 a colorbar from images extracted from a video.
 """
 
+import queue
+import threading
+import time
+
+from collections.abc import Callable, Iterable, Iterator
+from importlib.util import find_spec
+from itertools import islice
 from pathlib import Path
 
+import numpy as np
+
 from loguru import logger
 from PIL import Image
 
-# Try to import joblib (optional), set a flag on availability
-try:
-    from joblib import Parallel, delayed
-
-    JOBLIB_AVAILABLE: bool = True
-except ImportError:
-    JOBLIB_AVAILABLE: bool = False
+# Check if joblib (optional) is installed, set a flag on availability. It
+# is only imported when needed, as it is not when computing sequentially
+JOBLIB_AVAILABLE: bool = find_spec("joblib") is not None
 
-from movie_colorbar.constants import Methods
+from movie_colorbar.constants import (
+    DEFAULT_ANALYSIS_SIZE,
+    DEFAULT_JOBS,
+    FRAMES_BATCH_SIZE,
+    Layouts,
+    Methods,
+    Resampling,
+)
+from movie_colorbar.frames import (
+    compute_frames_colors,
+    frames_from_buffers,
+    frames_from_images,
+    prepare_method,
+)
 from movie_colorbar.image import (
     get_average_hsv_as_rgb,
     get_average_hue_as_rgb,
@@ -32,6 +50,7 @@ from movie_colorbar.image import (
     get_quantized_color_as_rgb,
     get_resized_1px_rgb,
 )
+from movie_colorbar.store import frame_store_length, open_frame_store
 
 # ----- Mapping methods to called function ----- #
 
@@ -48,58 +67,727 @@ METHOD_ACTION_MAP: dict = {
     Methods.xyz: get_average_xyz_as_rgb,
 }
 
-# ----- Functions to Turn Create Colorbars ----- #
+# The PIL resampling filters corresponding to our resampling filters
+PIL_RESAMPLING_FILTERS: dict = {
+    Resampling.nearest: Image.Resampling.NEAREST,
+    Resampling.bilinear: Image.Resampling.BILINEAR,
+    Resampling.bicubic: Image.Resampling.BICUBIC,
+    Resampling.area: Image.Resampling.BOX,
+    Resampling.lanczos: Image.Resampling.LANCZOS,
+}
 
+# Initial capacity (in colors) of the arrays computed colors are gathered into
+COLORS_INITIAL_CAPACITY: int = 4096
 
-def create_colorbar_from_images(images: list[Path], method: str) -> Image:
+# Number of chunks of frames read ahead (from ffmpeg) while colors are being
+# computed, which bounds the memory used when decoding is faster than them
+PREFETCH_CHUNKS: int = 4
+
+# ----- Functions to Compute Colors ----- #
+
+
+def compute_colors_from_images(
+    images: Iterable[Path],
+    method: str,
+    size: tuple[int, int] = DEFAULT_ANALYSIS_SIZE,
+    resampling: str = Resampling.bicubic,
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    remove: bool = False,
+) -> np.ndarray:
     """
-    Create a colorbar from the computed colors of various
-    images, the paths of which are provided (they should
-    be files on disk).
+    Compute the colors of various images, the paths of
+    which are provided (they should be files on disk).
 
     Note
     ----
-    Currently, the image files are loaded with PIL and
-    all resized to a 25x25 pixels image. This should be
-    a parameter in the future.
+    The image files are loaded with PIL and resized to the
+    analysis size, unless they already are at that size
+    (which is the case if ffmpeg downscaled them during
+    extraction).
 
     Parameters
     ----------
-    images : list[pathlib.Path]
-        List of paths to the images.
+    images : Iterable[pathlib.Path]
+        The paths to the images, which are loaded (and
+        processed) as they are iterated over.
     method : str
         Method to use to compute the color from
         each image.
+    size : tuple[int, int], optional
+        The (width, height) to resize images to before
+        computing their color. Defaults to (25, 25).
+    resampling : str, optional
+        The resampling filter used to resize the images
+        (default is 'bicubic').
+    method_options : dict, optional
+        Options for the method's function, for instance
+        `{"nclusters": 3}` for the kmeans method.
+    jobs : int, optional
+        Number of worker processes computing colors, if
+        joblib is available. Negative values count back
+        from the number of cores (default -2, all cores
+        but one), and 1 processes images in this process.
+    chunk_size : int, optional
+        Number of images handed over to a worker at once,
+        and processed together (default 256).
+    remove : bool, optional
+        Whether to delete each image file once it is loaded
+        (default `False`), so that disk usage stays bounded
+        when the images are extracted as they are consumed.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the color
+        of each image, in order.
+    """
+    colors = compute_methods_colors_from_images(
+        images, [method], size, resampling, method_options, jobs, chunk_size, remove
+    )
+    return colors[method]
+
+
+def compute_methods_colors_from_images(
+    images: Iterable[Path],
+    methods: list[str],
+    size: tuple[int, int] = DEFAULT_ANALYSIS_SIZE,
+    resampling: str = Resampling.bicubic,
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    remove: bool = False,
+    on_wait: Callable[[float], None] | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Compute the colors of various images with several methods
+    at once: each image is loaded a single time and all methods
+    are computed from it. See `compute_colors_from_images` for
+    details on the other parameters.
+
+    Parameters
+    ----------
+    methods : list[str]
+        The methods to use to compute the color from
+        each image.
+    on_wait : Callable[[float], None], optional
+        Called with the time (in seconds) spent waiting for each
+        chunk of frames from their source, for instance to profile
+        the decoding apart from the colors computation.
+
+    Returns
+    -------
+    dict[str, numpy.ndarray]
+        A mapping of each method to a uint8 array of
+        shape (N, 3) with the color of each image.
+    """
+    logger.debug(f"Extracting colors from images, according to methods {', '.join(methods)}")
+    for method in methods:
+        prepare_method(method, **(method_options or {}))
+
+    # Process all images in chunks - either in parallel if
+    # joblib is available, or sequentially otherwise
+    bar_colors = _map_chunks(
+        _process_images_chunk,
+        _prefetch(_batched(images, chunk_size), PREFETCH_CHUNKS, on_wait),
+        jobs,
+        methods=methods,
+        method_options=method_options,
+        size=size,
+        resampling=resampling,
+        remove=remove,
+    )
+    return _collect_colors(bar_colors, methods)
+
+
+def compute_colors_from_frames(
+    frames: Iterable[bytes],
+    size: tuple[int, int],
+    method: str,
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+) -> np.ndarray:
+    """
+    Compute the colors of various raw frames, as streamed
+    from ffmpeg (see the function
+    `movie_colorbar.extract.stream_frames_from_video`).
+    The frames are expected to already be downscaled to
+    the wanted analysis size.
+
+    Parameters
+    ----------
+    frames : Iterable[bytes]
+        The raw RGB24 data of each frame.
+    size : tuple[int, int]
+        The (width, height) of the frames.
+    method : str
+        Method to use to compute the color from
+        each frame.
+    method_options : dict, optional
+        Options for the method's function, for instance
+        `{"nclusters": 3}` for the kmeans method.
+    jobs : int, optional
+        Number of worker processes computing colors, if
+        joblib is available. Negative values count back
+        from the number of cores (default -2, all cores
+        but one), and 1 processes frames in this process.
+    chunk_size : int, optional
+        Number of frames handed over to a worker at once,
+        and processed together (default 256).
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the color
+        of each frame, in order.
+    """
+    colors = compute_methods_colors_from_frames(
+        frames, size, [method], method_options, jobs, chunk_size
+    )
+    return colors[method]
+
+
+def compute_methods_colors_from_frames(
+    frames: Iterable[bytes],
+    size: tuple[int, int],
+    methods: list[str],
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    on_wait: Callable[[float], None] | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Compute the colors of various raw frames with several
+    methods at once: the frames are consumed (decoded) a
+    single time and all methods are computed from them.
+    See `compute_colors_from_frames` for details on the
+    other parameters.
+
+    Parameters
+    ----------
+    methods : list[str]
+        The methods to use to compute the color from
+        each frame.
+    on_wait : Callable[[float], None], optional
+        Called with the time (in seconds) spent waiting for each
+        chunk of frames from their source, for instance to profile
+        the decoding apart from the colors computation.
+
+    Returns
+    -------
+    dict[str, numpy.ndarray]
+        A mapping of each method to a uint8 array of
+        shape (N, 3) with the color of each frame.
+    """
+    logger.debug(f"Extracting colors from frames, according to methods {', '.join(methods)}")
+    for method in methods:
+        prepare_method(method, **(method_options or {}))
+
+    # Process all frames in chunks as they come - either in
+    # parallel if joblib is available, or sequentially otherwise
+    bar_colors = _map_chunks(
+        _process_frames_chunk,
+        _prefetch(_batched(frames, chunk_size), PREFETCH_CHUNKS, on_wait),
+        jobs,
+        methods=methods,
+        method_options=method_options,
+        size=size,
+    )
+    return _collect_colors(bar_colors, methods)
+
+
+def iter_colors_from_frames(
+    frames: Iterable[bytes],
+    size: tuple[int, int],
+    method: str,
+    method_options: dict | None = None,
+    chunk_size: int = 16,
+) -> Iterator[np.ndarray]:
+    """
+    Compute the colors of various raw frames, as streamed from
+    ffmpeg, yielding them one at a time as soon as they are
+    computed. Unlike `compute_colors_from_frames`, colors are
+    computed in this process, in small chunks of frames (read
+    ahead while the previous ones are processed), so that the
+    first colors come out early. See `compute_colors_from_frames`
+    for details on the other parameters.
+
+    Parameters
+    ----------
+    chunk_size : int, optional
+        Number of frames processed together (default 16).
+
+    Yields
+    ------
+    numpy.ndarray
+        A uint8 array of shape (3,) with the color of a
+        frame, in order.
+    """
+    prepare_method(method, **(method_options or {}))
+    for chunk in _prefetch(_batched(frames, chunk_size), PREFETCH_CHUNKS):
+        frames_array = frames_from_buffers(chunk, size)
+        yield from compute_frames_colors(frames_array, method, **(method_options or {}))
+
+
+def compute_colors_from_store(
+    store: Path,
+    method: str,
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    frames: Iterable[int] | None = None,
+) -> np.ndarray:
+    """
+    Compute the colors of the frames of a frame store (see the
+    `movie_colorbar.store` module), which are expected to already
+    be downscaled to the wanted analysis size.
+
+    Note
+    ----
+    Frames are never copied nor sent to the workers: each worker
+    maps its own chunk of frames from the store, and the colors
+    are computed directly from the memory-mapped data.
+
+    Parameters
+    ----------
+    store : pathlib.Path
+        Path to the frame store file.
+    method : str
+        Method to use to compute the color from
+        each frame.
+    method_options : dict, optional
+        Options for the method's function, for instance
+        `{"nclusters": 3}` for the kmeans method.
+    jobs : int, optional
+        Number of worker processes computing colors, if
+        joblib is available. Negative values count back
+        from the number of cores (default -2, all cores
+        but one), and 1 processes frames in this process.
+    chunk_size : int, optional
+        Number of frames handed over to a worker at once,
+        and processed together (default 256).
+    frames : Iterable[int], optional
+        The indices of the frames to process, consecutive
+        and in order, as they become available in the store
+        (for instance as yielded while it is written by the
+        function `movie_colorbar.extract.store_frames_from_video`).
+        Defaults to `None`, for all frames in the store.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the color
+        of each frame, in order.
+    """
+    colors = compute_methods_colors_from_store(
+        store, [method], method_options, jobs, chunk_size, frames
+    )
+    return colors[method]
+
+
+def compute_methods_colors_from_store(
+    store: Path,
+    methods: list[str],
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    frames: Iterable[int] | None = None,
+    on_wait: Callable[[float], None] | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Compute the colors of the frames of a frame store with several
+    methods at once: each chunk of frames is mapped a single time
+    and all methods are computed from it. See the function
+    `compute_colors_from_store` for details on the other parameters.
+
+    Parameters
+    ----------
+    methods : list[str]
+        The methods to use to compute the color from
+        each frame.
+    on_wait : Callable[[float], None], optional
+        Called with the time (in seconds) spent waiting for each
+        chunk of frames from their source, for instance to profile
+        the decoding apart from the colors computation.
+
+    Returns
+    -------
+    dict[str, numpy.ndarray]
+        A mapping of each method to a uint8 array of
+        shape (N, 3) with the color of each frame.
+    """
+    logger.debug(f"Extracting colors from frame store, according to methods {', '.join(methods)}")
+    for method in methods:
+        prepare_method(method, **(method_options or {}))
+
+    # Only the bounds of each chunk are handed over, and the indices of
+    # the frames are read ahead (while the store is written, if it is)
+    indices = range(frame_store_length(store)) if frames is None else frames
+    bounds = ((chunk[0], chunk[-1] + 1) for chunk in _batched(indices, chunk_size))
+    bar_colors = _map_chunks(
+        _process_store_chunk,
+        _prefetch(bounds, PREFETCH_CHUNKS, on_wait),
+        jobs,
+        store=store,
+        methods=methods,
+        method_options=method_options,
+    )
+    return _collect_colors(bar_colors, methods)
+
+
+# ----- Functions to Create Colorbars ----- #
+
+
+def create_colorbar_from_colors(
+    colors: np.ndarray,
+    width: int | None = None,
+    height: int | None = None,
+    layout: str = Layouts.horizontal,
+) -> Image:
+    """
+    Create a colorbar from already computed colors, with one
+    column of pixels per color by default.
+
+    Note
+    ----
+    The colorbar is built from a single row of pixels, which
+    is stretched to the size of the bar, so that memory usage
+    (apart from the final image) scales with the number of
+    colors and not with the size of the image. To get a bar
+    narrower than the number of colors, they should first be
+    aggregated with `bin_colors`.
+
+    Parameters
+    ----------
+    colors : numpy.ndarray
+        A uint8 array of shape (N, 3) with the R, G and B
+        components of each color, in order.
+    width : int, optional
+        Width of the colorbar, in pixels. Defaults to the
+        number of colors (one column per color).
+    height : int, optional
+        Height of the colorbar, in pixels. Defaults to the
+        width divided by 2.5.
+    layout : str, optional
+        How the bar is laid out: with time running from left
+        to right (`horizontal`, the default), or from top to
+        bottom (`vertical`). The width and height are those
+        of the horizontal bar, and are swapped when vertical.
 
     Returns
     -------
     PIL.Image
         A PIL.Image of the colorbar.
     """
-    logger.debug(f"Extracting colors from images, according to method {method}")
+    logger.info("Assembling colorbar from extracted colors")
 
-    def process_image(img_path: Path) -> tuple[int, int, int]:
-        """Load a single image and compute its color according to method."""
-        with Image.open(img_path) as img:
-            img_resized = img.resize((25, 25))
-            return METHOD_ACTION_MAP[method](img_resized)
+    width = width or len(colors)
+    height = height or max([1, int(width / 2.5)])  # ensure height is at least 1
 
-    # Process all images - either in parallel if joblib is
-    # available, or sequentially otherwise
-    if JOBLIB_AVAILABLE:
-        logger.debug("Using joblib to parallelize image processing, n_jobs=-2")
-        bar_colors = Parallel(n_jobs=-2)(delayed(process_image)(img) for img in images)
-    else:
-        logger.debug("Joblib unavailable, processing images sequentially")
-        bar_colors = [process_image(img) for img in images]
+    # A 1 pixel thick strip of the colors, stretched to the bar's size
+    colors = np.ascontiguousarray(colors, dtype=np.uint8)
+    if layout == Layouts.vertical:
+        strip = Image.fromarray(colors.reshape(-1, 1, 3))
+        return strip.resize((height, width), resample=Image.Resampling.NEAREST)
+    strip = Image.fromarray(colors.reshape(1, -1, 3))
+    return strip.resize((width, height), resample=Image.Resampling.NEAREST)
 
-    logger.info("Assembling colorbar from extracted colors")
 
-    width = len(bar_colors)
-    height = max([1, int(width / 2.5)])  # ensure height is at least 1
-    bar_img = Image.new(mode="RGB", size=(width, height))  # blank image with dimensions
+def bin_colors(
+    colors: np.ndarray, nbins: int, method: str, method_options: dict | None = None
+) -> np.ndarray:
+    """
+    Aggregate consecutive colors into the given number of bins, for
+    instance to get as many colors as there are columns in a bar of
+    a given width. Each bin's color is computed from its colors with
+    the same method used to compute them from frames: averaged in
+    the method's colorspace, or the most common one for the common
+    method, etc.
+
+    Parameters
+    ----------
+    colors : numpy.ndarray
+        A uint8 array of shape (N, 3) with the colors, in order.
+    nbins : int
+        The number of bins. If it is not lower than the number
+        of colors, these are returned as is.
+    method : str
+        Method used to compute the color of each bin.
+    method_options : dict, optional
+        Options for the method's function, for instance
+        `{"nclusters": 3}` for the kmeans method.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (nbins, 3) with the color of each bin.
+    """
+    ncolors = len(colors)
+    if nbins >= ncolors:
+        return colors
+
+    logger.debug(f"Binning {ncolors} colors into {nbins} columns, according to method {method}")
+    starts = np.linspace(0, ncolors, nbins + 1).round().astype(np.int64)
+    sizes = np.diff(starts)
+    binned = np.empty((nbins, 3), dtype=np.uint8)
+
+    # Bins have (at most) two different sizes, each bin being handled as a
+    # frame of shape (size, 1) so that all bins of a size are done at once
+    for size in np.unique(sizes):
+        bins = np.flatnonzero(sizes == size)
+        indices = starts[bins, None] + np.arange(size)
+        frames = colors[indices].reshape(len(bins), size, 1, 3)
+        binned[bins] = compute_frames_colors(frames, method, **(method_options or {}))
+    return binned
+
+
+def create_colorbar_from_images(
+    images: list[Path],
+    method: str,
+    size: tuple[int, int] = DEFAULT_ANALYSIS_SIZE,
+    resampling: str = Resampling.bicubic,
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+) -> Image:
+    """
+    Create a colorbar from the computed colors of various
+    images, the paths of which are provided (they should
+    be files on disk). See `compute_colors_from_images`
+    for details on the parameters.
+
+    Returns
+    -------
+    PIL.Image
+        A PIL.Image of the colorbar.
+    """
+    colors = compute_colors_from_images(
+        images, method, size, resampling, method_options, jobs, chunk_size
+    )
+    return create_colorbar_from_colors(colors)
+
+
+def create_colorbar_from_frames(
+    frames: Iterable[bytes],
+    size: tuple[int, int],
+    method: str,
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+) -> Image:
+    """
+    Create a colorbar from the computed colors of various
+    raw frames, as streamed from ffmpeg. See the function
+    `compute_colors_from_frames` for details on the
+    parameters.
+
+    Returns
+    -------
+    PIL.Image
+        A PIL.Image of the colorbar.
+    """
+    colors = compute_colors_from_frames(frames, size, method, method_options, jobs, chunk_size)
+    return create_colorbar_from_colors(colors)
 
-    # Prepare color data (we're in RGB mode) for the colorbar
-    bar_data = [rgb for rgb in bar_colors] * height  # repeat colors for all rows
-    bar_img.putdata(bar_data)  # fill the image
-    return bar_img
+
+def create_colorbar_from_store(
+    store: Path,
+    method: str,
+    method_options: dict | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+) -> Image:
+    """
+    Create a colorbar from the computed colors of the frames
+    of a frame store. See the function `compute_colors_from_store`
+    for details on the parameters.
+
+    Returns
+    -------
+    PIL.Image
+        A PIL.Image of the colorbar.
+    """
+    colors = compute_colors_from_store(store, method, method_options, jobs, chunk_size)
+    return create_colorbar_from_colors(colors)
+
+
+# ----- Helpers ----- #
+
+
+def _process_images_chunk(
+    img_paths: list[Path],
+    methods: list[str],
+    method_options: dict | None,
+    size: tuple[int, int],
+    resampling: str,
+    remove: bool = False,
+) -> dict[str, np.ndarray]:
+    """Load a chunk of images (deleting the files if asked) and compute their colors."""
+    frames = frames_from_images(_load_image(path, size, resampling, remove) for path in img_paths)
+    return _compute_methods_colors(frames, methods, method_options)
+
+
+def _process_frames_chunk(
+    buffers: list[bytes],
+    methods: list[str],
+    method_options: dict | None,
+    size: tuple[int, int],
+) -> dict[str, np.ndarray]:
+    """Load a chunk of raw frames and compute their colors according to methods."""
+    frames = frames_from_buffers(buffers, size)
+    return _compute_methods_colors(frames, methods, method_options)
+
+
+def _process_store_chunk(
+    bounds: tuple[int, int],
+    store: Path,
+    methods: list[str],
+    method_options: dict | None,
+) -> dict[str, np.ndarray]:
+    """Map a chunk (start, stop) of a frame store's frames and compute their colors."""
+    frames = open_frame_store(store, *bounds)
+    return _compute_methods_colors(frames, methods, method_options)
+
+
+def _map_chunks(function: Callable, chunks: Iterable[list], jobs: int, **kwargs) -> Iterator:
+    """
+    Apply the function to each chunk (with the given keyword arguments),
+    in parallel worker processes if joblib is available and more than
+    one job is requested, or sequentially in this process otherwise.
+    Results are yielded in order as they are computed, so that they
+    can be consumed (and released) along the way.
+
+    Note
+    ----
+    The function should be defined at module level, so that it is sent
+    to the workers by reference rather than serialized with each chunk.
+    Joblib's default (loky) backend keeps its worker processes alive
+    between calls with the same number of jobs, so that successive
+    videos reuse the same pool of warm workers (with their imports,
+    loaded lookup tables and compiled functions) instead of spawning
+    new ones.
+    """
+    if JOBLIB_AVAILABLE and jobs != 1:
+        from joblib import Parallel, delayed
+
+        logger.debug(f"Using joblib to parallelize processing, n_jobs={jobs}")
+        parallel = Parallel(n_jobs=jobs, return_as="generator")
+        return parallel(delayed(function)(chunk, **kwargs) for chunk in chunks)
+
+    logger.debug("Processing sequentially")
+    return (function(chunk, **kwargs) for chunk in chunks)
+
+
+def _load_image(
+    img_path: Path, size: tuple[int, int], resampling: str, remove: bool = False
+) -> Image:
+    """Load an image from disk as RGB (then deleting the file if asked), and resize it if needed."""
+    with Image.open(img_path) as img:
+        image = img.convert("RGB")
+    if remove is True:
+        img_path.unlink()
+    if image.size != size:
+        image = image.resize(size, resample=PIL_RESAMPLING_FILTERS[resampling])
+    return image
+
+
+def _prefetch(
+    iterable: Iterable, maxsize: int, on_wait: Callable[[float], None] | None = None
+) -> Iterator:
+    """
+    Iterate over the iterable from a background thread, which reads up
+    to maxsize elements ahead into a bounded queue. This lets a slow
+    source (such as ffmpeg decoding frames) produce elements while the
+    consumer processes the previous ones, the queue applying backpressure
+    to the source when the consumer is slower. Exceptions raised by the
+    source are raised to the consumer, and the source is closed should
+    the consumer stop early. The time the consumer spends waiting for
+    each element is handed to on_wait, if provided.
+    """
+    elements: queue.Queue = queue.Queue(maxsize=maxsize)
+    stop = threading.Event()
+    end = object()  # sentinel marking the end of the source
+
+    def put(element) -> bool:
+        """Put an element in the queue once there is room, unless the consumer stopped."""
+        while not stop.is_set():
+            try:
+                elements.put(element, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce() -> None:
+        """Read the source into the queue, followed by the end sentinel or an exception."""
+        iterator = iter(iterable)
+        try:
+            for element in iterator:
+                if not put((element, None)):
+                    break
+            else:
+                put((end, None))
+        except Exception as error:  # handed over to the consumer
+            put((end, error))
+        finally:
+            if hasattr(iterator, "close"):  # e.g. to kill the ffmpeg process
+                iterator.close()
+
+    producer = threading.Thread(target=produce, name="movie-colorbar-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            start = time.perf_counter()
+            element, error = elements.get()
+            if on_wait is not None:
+                on_wait(time.perf_counter() - start)
+            if error is not None:
+                raise error
+            if element is end:
+                return
+            yield element
+    finally:
+        stop.set()
+        producer.join()
+
+
+def _batched(iterable: Iterable, n: int) -> Iterator[list]:
+    """Split the iterable into lists of n elements (the last one may be shorter)."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
+
+def _compute_methods_colors(
+    frames: np.ndarray, methods: list[str], method_options: dict | None
+) -> dict[str, np.ndarray]:
+    """Compute the colors of a batch of frames according to each of the methods."""
+    return {
+        method: compute_frames_colors(frames, method, **(method_options or {}))
+        for method in methods
+    }
+
+
+def _collect_colors(batches: Iterable[dict[str, np.ndarray]], methods: list[str]) -> dict:
+    """
+    Gather the colors of processed batches (mappings of each method to
+    (N, 3) colors) into a single array per method, as they come. These
+    are preallocated and grow geometrically as needed, so that memory
+    stays proportional to the number of colors with no list of batches.
+    """
+    colors = {method: np.empty((COLORS_INITIAL_CAPACITY, 3), dtype=np.uint8) for method in methods}
+    ncolors = 0
+    for batch in batches:
+        nbatch = len(batch[methods[0]])
+        if ncolors + nbatch > len(colors[methods[0]]):
+            capacity = max(2 * len(colors[methods[0]]), ncolors + nbatch)
+            for method in methods:
+                grown = np.empty((capacity, 3), dtype=np.uint8)
+                grown[:ncolors] = colors[method][:ncolors]
+                colors[method] = grown
+        for method in methods:
+            colors[method][ncolors : ncolors + nbatch] = batch[method]
+        ncolors += nbatch
+    return {method: colors[method][:ncolors].copy() for method in methods}
@@ -0,0 +1,187 @@
+"""
+Cache
+-----
+
+Module with functions to handle a persistent, on-disk cache
+of the colors computed from a video's frames. Entries are
+keyed by a fingerprint of the video file and by all settings
+which influence the colors, so that re-creating a colorbar
+with, for instance, a different output location does not
+need to decode the video again. The cache is bounded in
+size, least recently used entries being evicted first.
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from pathlib import Path
+
+import numpy as np
+
+from loguru import logger
+
+from movie_colorbar.constants import CACHE_DIRECTORY
+
+# ----- Cache Location and Size ----- #
+
+COLORS_CACHE_DIRECTORY: Path = CACHE_DIRECTORY / "colors"
+
+# Maximum total size of the cached colors files, in bytes
+COLORS_CACHE_MAX_BYTES: int = 256 * 1024**2
+
+# Size of the chunks read at the start and end of a video to fingerprint it
+FINGERPRINT_CHUNK_BYTES: int = 1024**2
+
+# Bump this whenever the colors computed by a method would change (for
+# instance its tie-breaking), so that entries computed before are not used
+COLORS_CACHE_VERSION: int = 2
+
+# ----- Cache Keys ----- #
+
+
+def video_fingerprint(video: Path) -> str:
+    """
+    Compute a fingerprint of the video file from its size, its
+    modification time and a hash of its first and last chunks.
+    This is fast even for very large files, while changes to the
+    file's content are very unlikely to go unnoticed.
+
+    Parameters
+    ----------
+    video : pathlib.Path
+        Path to the video file.
+
+    Returns
+    -------
+    str
+        The hexadecimal fingerprint of the video.
+    """
+    stat = video.stat()
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+
+    with video.open("rb") as file:
+        digest.update(file.read(FINGERPRINT_CHUNK_BYTES))
+        if stat.st_size > FINGERPRINT_CHUNK_BYTES:
+            file.seek(max(FINGERPRINT_CHUNK_BYTES, stat.st_size - FINGERPRINT_CHUNK_BYTES))
+            digest.update(file.read(FINGERPRINT_CHUNK_BYTES))
+
+    return digest.hexdigest()
+
+
+def colors_cache_key(video: Path, **settings) -> str:
+    """
+    Compute the cache key for the colors of a video computed with
+    the given settings (for instance fps, analysis size or method).
+    The version of the cache (`COLORS_CACHE_VERSION`) is part of the
+    key, so that changes to the methods invalidate previous entries.
+
+    Parameters
+    ----------
+    video : pathlib.Path
+        Path to the video file.
+    **settings
+        All settings which influence the computed colors. They
+        should be JSON-serializable.
+
+    Returns
+    -------
+    str
+        The hexadecimal cache key.
+    """
+    description = json.dumps(
+        {"version": COLORS_CACHE_VERSION, "video": video_fingerprint(video), **settings},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(description.encode()).hexdigest()
+
+
+# ----- Cache Access ----- #
+
+
+def load_cached_colors(key: str) -> np.ndarray | None:
+    """
+    Load the colors stored in the cache for the given key, if any.
+    A hit marks the entry as recently used.
+
+    Parameters
+    ----------
+    key : str
+        The cache key, as given by `colors_cache_key`.
+
+    Returns
+    -------
+    numpy.ndarray | None
+        The cached colors, or `None` if there is no entry
+        for this key (or if it could not be read).
+    """
+    entry = COLORS_CACHE_DIRECTORY / f"{key}.npy"
+    try:
+        colors = np.load(entry)
+        os.utime(entry)  # mark as recently used, for eviction
+    except (OSError, ValueError):
+        return None
+
+    logger.debug(f"Loaded {len(colors)} colors from cache entry '{entry.name}'")
+    return colors
+
+
+def save_cached_colors(
+    key: str, colors: np.ndarray, max_bytes: int = COLORS_CACHE_MAX_BYTES
+) -> None:
+    """
+    Store the colors in the cache under the given key, then evict
+    the least recently used entries to keep the total size of the
+    cache under the provided limit.
+
+    Parameters
+    ----------
+    key : str
+        The cache key, as given by `colors_cache_key`.
+    colors : numpy.ndarray
+        The computed colors to store.
+    max_bytes : int, optional
+        Maximum total size of the cache, in bytes. Defaults
+        to 256 MiB.
+    """
+    COLORS_CACHE_DIRECTORY.mkdir(parents=True, exist_ok=True)
+    entry = COLORS_CACHE_DIRECTORY / f"{key}.npy"
+
+    # Write to a temporary file first so readers never see a partial entry
+    temporary = entry.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with temporary.open("wb") as file:
+        np.save(file, colors)
+    os.replace(temporary, entry)
+    logger.debug(f"Saved {len(colors)} colors to cache entry '{entry.name}'")
+
+    evict_cached_colors(max_bytes)
+
+
+def evict_cached_colors(max_bytes: int = COLORS_CACHE_MAX_BYTES) -> None:
+    """
+    Remove the least recently used entries from the cache until
+    its total size is under the provided limit.
+
+    Parameters
+    ----------
+    max_bytes : int, optional
+        Maximum total size of the cache, in bytes. Defaults
+        to 256 MiB.
+    """
+    entries = []
+    for entry in COLORS_CACHE_DIRECTORY.glob("*.npy"):
+        try:
+            stat = entry.stat()
+        except FileNotFoundError:  # removed by a concurrent process
+            continue
+        entries.append((stat.st_mtime, stat.st_size, entry))
+
+    total_bytes = sum(size for _, size, _ in entries)
+    for _, size, entry in sorted(entries, key=lambda item: item[0]):
+        if total_bytes <= max_bytes:
+            break
+        logger.debug(f"Evicting cache entry '{entry.name}'")
+        entry.unlink(missing_ok=True)
+        total_bytes -= size
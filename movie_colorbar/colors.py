@@ -5,26 +5,71 @@ Colors
 Module with functions to handle color calculations and conversions.
 """
 
-from colorsys import hls_to_rgb as _hls_to_rgb
+from collections.abc import Callable
 from colorsys import hsv_to_rgb as _hsv_to_rgb
 from colorsys import rgb_to_hls as _rgb_to_hls
 from colorsys import rgb_to_hsv as _rgb_to_hsv
 from colorsys import rgb_to_yiq as _rgb_to_yiq
 from colorsys import yiq_to_rgb as _yiq_to_rgb
+from functools import cache
 
-from movie_colorbar.jit import maybe_jit
+import numpy as np
+
+from movie_colorbar.jit import NUMBA_AVAILABLE, maybe_jit
+
+# Argument types the scalar conversions are compiled for by `warmup_jit`
+FLOATS_SIGNATURE: str = "(float64, float64, float64)"
+INTEGERS_SIGNATURE: str = "(int64, int64, int64)"
 
 # We re-export the colorsys functions with a
 # potential JIT-compilation by numba
-cs_rgb_to_yiq = maybe_jit(_rgb_to_yiq)
-cs_yiq_to_rgb = maybe_jit(_yiq_to_rgb)
-cs_rgb_to_hls = maybe_jit(_rgb_to_hls)
-cs_hls_to_rgb = maybe_jit(_hls_to_rgb)
-cs_rgb_to_hsv = maybe_jit(_rgb_to_hsv)
-cs_hsv_to_rgb = maybe_jit(_hsv_to_rgb)
+cs_rgb_to_yiq = maybe_jit(_rgb_to_yiq, signatures=(FLOATS_SIGNATURE,))
+cs_yiq_to_rgb = maybe_jit(_yiq_to_rgb, signatures=(FLOATS_SIGNATURE,))
+cs_rgb_to_hls = maybe_jit(_rgb_to_hls, signatures=(FLOATS_SIGNATURE,))
+cs_rgb_to_hsv = maybe_jit(_rgb_to_hsv, signatures=(FLOATS_SIGNATURE,))
+cs_hsv_to_rgb = maybe_jit(_hsv_to_rgb, signatures=(FLOATS_SIGNATURE,))
+
 
+@maybe_jit(signatures=(FLOATS_SIGNATURE,))
+def cs_hls_to_rgb(h: float, l: float, s: float) -> tuple[float, float, float]:  # noqa: E741
+    """
+    Converts a color from the HLS to the RGB colorspace, exactly as
+    `colorsys.hls_to_rgb` does. It is rewritten here since numba can
+    not compile the module-level helper colorsys calls.
 
-@maybe_jit
+    Parameters
+    ----------
+    h : float
+        The hue of the color (0-1).
+    l : float
+        The lightness of the color (0-1).
+    s : float
+        The saturation of the color (0-1).
+
+    Returns
+    -------
+    tuple[float, float, float]
+        A tuple with the R, G and B components of the color (0-1).
+    """
+
+    def component(m1: float, m2: float, hue: float) -> float:
+        hue = hue % 1.0
+        if hue < 1.0 / 6.0:
+            return m1 + (m2 - m1) * hue * 6.0
+        if hue < 0.5:
+            return m2
+        if hue < 2.0 / 3.0:
+            return m1 + (m2 - m1) * (2.0 / 3.0 - hue) * 6.0
+        return m1
+
+    if s == 0.0:
+        return l, l, l
+    m2 = l * (1.0 + s) if l <= 0.5 else l + s - (l * s)
+    m1 = 2.0 * l - m2
+    return component(m1, m2, h + 1.0 / 3.0), component(m1, m2, h), component(m1, m2, h - 1.0 / 3.0)
+
+
+@maybe_jit(signatures=(FLOATS_SIGNATURE, INTEGERS_SIGNATURE))  # called with pixel values
 def convert_rgb_to_xyz(R: float, G: float, B: float) -> tuple[float, float, float]:
     """
     Converts a color from the sRGB to the CIE XYZ 1931 colorspace.
@@ -67,7 +112,7 @@ def convert_rgb_to_xyz(R: float, G: float, B: float) -> tuple[float, float, floa
     return X, Y, Z
 
 
-@maybe_jit
+@maybe_jit(signatures=(FLOATS_SIGNATURE,))
 def convert_xyz_to_rgb(X: float, Y: float, Z: float) -> tuple[float, float, float]:
     """
     Converts a color from CIE XYZ 1931 to the sRGB colorspace.
@@ -120,7 +165,7 @@ def convert_xyz_to_rgb(X: float, Y: float, Z: float) -> tuple[float, float, floa
     return R, G, B
 
 
-@maybe_jit
+@maybe_jit(signatures=(FLOATS_SIGNATURE,))
 def convert_xyz_to_lab(X: float, Y: float, Z: float) -> tuple[float, float, float]:
     """
     Converts a color from the CIE XYZ 1931 to the LAB colorspace.
@@ -165,7 +210,7 @@ def convert_xyz_to_lab(X: float, Y: float, Z: float) -> tuple[float, float, floa
     return L, A, B
 
 
-@maybe_jit
+@maybe_jit(signatures=(FLOATS_SIGNATURE,))
 def convert_lab_to_xyz(L: float, A: float, B: float) -> tuple[float, float, float]:
     """
     Converts a color from the LAB to the CIE XYZ 1931 colorspace.
@@ -209,3 +254,453 @@ def convert_lab_to_xyz(L: float, A: float, B: float) -> tuple[float, float, floa
     Y = y * 100.0
     Z = z * 108.883
     return X, Y, Z
+
+
+# ----- Array Conversions ----- #
+# These are equivalent to the functions above but operate on
+# whole arrays of colors, of shape (..., 3), at once. The last
+# axis holds the three components of each color and the output
+# arrays have the same shape as the inputs. They are vectorized
+# with numpy, or can be run by a numba-compiled parallel loop
+# over the colors when numba is available (`parallel=True`).
+
+
+def _make_parallel_kernel(scalar_conversion: Callable) -> Callable:
+    """
+    Create a kernel applying the given (JIT-compiled) scalar conversion
+    to each row of an (M, 3) array, in a numba parallel loop. The kernel
+    is only built, and numba imported, on its first call.
+    """
+
+    @cache
+    def build_kernel() -> Callable:
+        from numba import prange
+
+        conversion = scalar_conversion.dispatcher  # callable from compiled code
+
+        def kernel(colors: np.ndarray) -> np.ndarray:
+            result = np.empty(colors.shape, dtype=np.float64)
+            for index in prange(colors.shape[0]):
+                first, second, third = conversion(
+                    colors[index, 0], colors[index, 1], colors[index, 2]
+                )
+                result[index, 0] = first
+                result[index, 1] = second
+                result[index, 2] = third
+            return result
+
+        # Closures over other compiled functions cannot be reliably cached by numba
+        return maybe_jit(kernel, nopython=True, parallel=True, cache=False)
+
+    def run_kernel(colors: np.ndarray) -> np.ndarray:
+        return build_kernel()(colors)
+
+    return run_kernel
+
+
+def _run_parallel_kernel(kernel: Callable, colors: np.ndarray) -> np.ndarray:
+    """Run the parallel kernel on the flattened (..., 3) colors array."""
+    flat_colors = np.ascontiguousarray(colors, dtype=np.float64).reshape(-1, 3)
+    return kernel(flat_colors).reshape(np.shape(colors))
+
+
+# These are only built and compiled on their first call
+_rgb_to_yiq_kernel = _make_parallel_kernel(cs_rgb_to_yiq)
+_yiq_to_rgb_kernel = _make_parallel_kernel(cs_yiq_to_rgb)
+_rgb_to_hls_kernel = _make_parallel_kernel(cs_rgb_to_hls)
+_hls_to_rgb_kernel = _make_parallel_kernel(cs_hls_to_rgb)
+_rgb_to_hsv_kernel = _make_parallel_kernel(cs_rgb_to_hsv)
+_hsv_to_rgb_kernel = _make_parallel_kernel(cs_hsv_to_rgb)
+_rgb_to_xyz_kernel = _make_parallel_kernel(convert_rgb_to_xyz)
+_xyz_to_rgb_kernel = _make_parallel_kernel(convert_xyz_to_rgb)
+_xyz_to_lab_kernel = _make_parallel_kernel(convert_xyz_to_lab)
+_lab_to_xyz_kernel = _make_parallel_kernel(convert_lab_to_xyz)
+
+
+def convert_rgb_to_yiq_array(rgb: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the RGB to the YIQ colorspace.
+    Equivalent to `colorsys.rgb_to_yiq` applied to each color.
+
+    Parameters
+    ----------
+    rgb : numpy.ndarray
+        Array of shape (..., 3) with the R, G and B components
+        of the colors (0-1).
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the Y, I and Q values
+        of the colors.
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_rgb_to_yiq_kernel, rgb)
+
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    y = 0.30 * r + 0.59 * g + 0.11 * b
+    i = 0.74 * (r - y) - 0.27 * (b - y)
+    q = 0.48 * (r - y) + 0.41 * (b - y)
+    return np.stack((y, i, q), axis=-1)
+
+
+def convert_yiq_to_rgb_array(yiq: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the YIQ to the RGB colorspace.
+    Equivalent to `colorsys.yiq_to_rgb` applied to each color.
+
+    Parameters
+    ----------
+    yiq : numpy.ndarray
+        Array of shape (..., 3) with the Y, I and Q values
+        of the colors.
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the R, G and B components
+        of the colors (0-1).
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_yiq_to_rgb_kernel, yiq)
+
+    y, i, q = yiq[..., 0], yiq[..., 1], yiq[..., 2]
+    r = y + 0.9468822170900693 * i + 0.6235565819861433 * q
+    g = y - 0.27478764629897834 * i - 0.6356910791873801 * q
+    b = y - 1.1085450346420322 * i + 1.7090069284064666 * q
+    return np.clip(np.stack((r, g, b), axis=-1), 0.0, 1.0)
+
+
+def convert_rgb_to_hls_array(rgb: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the RGB to the HLS colorspace.
+    Equivalent to `colorsys.rgb_to_hls` applied to each color.
+
+    Parameters
+    ----------
+    rgb : numpy.ndarray
+        Array of shape (..., 3) with the R, G and B components
+        of the colors (0-1).
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the H, L and S values
+        of the colors (0-1).
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_rgb_to_hls_kernel, rgb)
+
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    sumc = maxc + minc
+    rangec = maxc - minc
+    l = sumc / 2.0  # noqa: E741
+    grey = rangec == 0  # hue and saturation are 0 for these
+
+    # Avoid divisions by zero on grey colors, results are discarded anyway
+    safe_rangec = np.where(grey, 1.0, rangec)
+    low_denominator = np.where(sumc == 0, 1.0, sumc)
+    high_denominator = np.where(2.0 - maxc - minc == 0, 1.0, 2.0 - maxc - minc)
+    s = np.where(l <= 0.5, rangec / low_denominator, rangec / high_denominator)
+    s = np.where(grey, 0.0, s)
+
+    h = _hue_from_rgb(r, g, b, maxc, safe_rangec)
+    h = np.where(grey, 0.0, h)
+    return np.stack((h, l, s), axis=-1)
+
+
+def convert_hls_to_rgb_array(hls: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the HLS to the RGB colorspace.
+    Equivalent to `colorsys.hls_to_rgb` applied to each color.
+
+    Parameters
+    ----------
+    hls : numpy.ndarray
+        Array of shape (..., 3) with the H, L and S values
+        of the colors (0-1).
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the R, G and B components
+        of the colors (0-1).
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_hls_to_rgb_kernel, hls)
+
+    h, l, s = hls[..., 0], hls[..., 1], hls[..., 2]  # noqa: E741
+    m2 = np.where(l <= 0.5, l * (1.0 + s), l + s - (l * s))
+    m1 = 2.0 * l - m2
+
+    def component(hue: np.ndarray) -> np.ndarray:
+        hue = hue % 1.0
+        return np.select(
+            [hue < 1.0 / 6.0, hue < 0.5, hue < 2.0 / 3.0],
+            [m1 + (m2 - m1) * hue * 6.0, m2, m1 + (m2 - m1) * (2.0 / 3.0 - hue) * 6.0],
+            default=m1,
+        )
+
+    rgb = np.stack((component(h + 1.0 / 3.0), component(h), component(h - 1.0 / 3.0)), axis=-1)
+    return np.where((s == 0.0)[..., None], l[..., None], rgb)
+
+
+def convert_rgb_to_hsv_array(rgb: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the RGB to the HSV colorspace.
+    Equivalent to `colorsys.rgb_to_hsv` applied to each color.
+
+    Parameters
+    ----------
+    rgb : numpy.ndarray
+        Array of shape (..., 3) with the R, G and B components
+        of the colors (0-1).
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the H, S and V values
+        of the colors (0-1).
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_rgb_to_hsv_kernel, rgb)
+
+    r, g, b = rgb[..., 0], rgb[..., 1], rgb[..., 2]
+    maxc = rgb.max(axis=-1)
+    minc = rgb.min(axis=-1)
+    rangec = maxc - minc
+    grey = rangec == 0  # hue and saturation are 0 for these
+
+    # Avoid divisions by zero on grey colors, results are discarded anyway
+    safe_maxc = np.where(maxc == 0, 1.0, maxc)
+    safe_rangec = np.where(grey, 1.0, rangec)
+    s = np.where(grey, 0.0, rangec / safe_maxc)
+
+    h = _hue_from_rgb(r, g, b, maxc, safe_rangec)
+    h = np.where(grey, 0.0, h)
+    return np.stack((h, s, maxc), axis=-1)
+
+
+def convert_hsv_to_rgb_array(hsv: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the HSV to the RGB colorspace.
+    Equivalent to `colorsys.hsv_to_rgb` applied to each color.
+
+    Parameters
+    ----------
+    hsv : numpy.ndarray
+        Array of shape (..., 3) with the H, S and V values
+        of the colors (0-1).
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the R, G and B components
+        of the colors (0-1).
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_hsv_to_rgb_kernel, hsv)
+
+    h, s, v = hsv[..., 0], hsv[..., 1], hsv[..., 2]
+    i = (h * 6.0).astype(np.int64)  # truncation as int() in colorsys
+    f = (h * 6.0) - i
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+    i = i % 6
+
+    # Pick the components according to the hue sector (same as colorsys)
+    sectors = [i == sector for sector in range(6)]
+    r = np.select(sectors, [v, q, p, p, t, v])
+    g = np.select(sectors, [t, v, v, q, p, p])
+    b = np.select(sectors, [p, p, t, v, v, q])
+    return np.stack((r, g, b), axis=-1)
+
+
+def convert_rgb_to_xyz_array(rgb: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the sRGB to the CIE XYZ 1931
+    colorspace. Equivalent to `convert_rgb_to_xyz` applied to each
+    color.
+
+    Parameters
+    ----------
+    rgb : numpy.ndarray
+        Array of shape (..., 3) with the R, G and B components
+        of the colors (0-255).
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the X, Y and Z values of
+        the colors (0-100).
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_rgb_to_xyz_kernel, rgb)
+
+    # Normalize and gamma correct each color channel
+    values = np.asarray(rgb, dtype=np.float64) / 255.0
+    linear = np.where(values > 0.04045, ((values + 0.055) / 1.055) ** 2.4, values / 12.92)
+    r, g, b = linear[..., 0], linear[..., 1], linear[..., 2]
+
+    # Transformation matrix (D65 illuminant) and scale to [0, 100]
+    X = 100 * (r * 0.4124 + g * 0.3576 + b * 0.1805)
+    Y = 100 * (r * 0.2126 + g * 0.7152 + b * 0.0722)
+    Z = 100 * (r * 0.0193 + g * 0.1192 + b * 0.9505)
+    return np.stack((X, Y, Z), axis=-1)
+
+
+def convert_xyz_to_rgb_array(xyz: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the CIE XYZ 1931 to the sRGB
+    colorspace. Equivalent to `convert_xyz_to_rgb` applied to each
+    color.
+
+    Parameters
+    ----------
+    xyz : numpy.ndarray
+        Array of shape (..., 3) with the X, Y and Z values of
+        the colors (0-100).
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the R, G and B components
+        of the colors (0-255).
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_xyz_to_rgb_kernel, xyz)
+
+    x = xyz[..., 0] / 100
+    y = xyz[..., 1] / 100
+    z = xyz[..., 2] / 100
+
+    # Inverse transformation matrix (D65 illuminant) to linear RGB
+    rl = x * 3.2406 + y * -1.5372 + z * -0.4986
+    gl = x * -0.9689 + y * 1.8758 + z * 0.0415
+    bl = x * 0.0557 + y * -0.2040 + z * 1.0570
+    linear = np.stack((rl, gl, bl), axis=-1)
+
+    # Apply gamma correction (the power is only taken where it is
+    # used, to avoid invalid values warnings on negative components)
+    powered = 1.055 * np.maximum(linear, 0.0031308) ** (1 / 2.4) - 0.055
+    corrected = np.where(linear > 0.0031308, powered, 12.92 * linear)
+
+    # Clamp values to the [0, 1] range and scale to [0, 255]
+    return np.clip(corrected, 0, 1) * 255
+
+
+def convert_xyz_to_lab_array(xyz: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the CIE XYZ 1931 to the LAB
+    colorspace. Equivalent to `convert_xyz_to_lab` applied to each
+    color.
+
+    Parameters
+    ----------
+    xyz : numpy.ndarray
+        Array of shape (..., 3) with the X, Y and Z values of
+        the colors (0-100).
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the Lightness (L), A channel
+        and B channel values of the colors.
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_xyz_to_lab_kernel, xyz)
+
+    # Normalize XYZ by reference white (D65 illuminant)
+    normalized = np.asarray(xyz, dtype=np.float64) / np.array([95.047, 100.0, 108.883])
+
+    # Nonlinear transformation to align with human perception
+    cubic_root = np.maximum(normalized, 0.008856) ** (1 / 3)
+    transformed = np.where(normalized > 0.008856, cubic_root, 7.787 * normalized + 16.0 / 116.0)
+    xf, yf, zf = transformed[..., 0], transformed[..., 1], transformed[..., 2]
+
+    L = 116 * yf - 16
+    A = 500 * (xf - yf)
+    B = 200 * (yf - zf)
+    return np.stack((L, A, B), axis=-1)
+
+
+def convert_lab_to_xyz_array(lab: np.ndarray, parallel: bool = False) -> np.ndarray:
+    """
+    Converts an array of colors from the LAB to the CIE XYZ 1931
+    colorspace. Equivalent to `convert_lab_to_xyz` applied to each
+    color.
+
+    Parameters
+    ----------
+    lab : numpy.ndarray
+        Array of shape (..., 3) with the Lightness (L), A channel
+        and B channel values of the colors.
+    parallel : bool, optional
+        Use a numba parallel loop if numba is available
+        (default `False`).
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of shape (..., 3) with the X, Y and Z values of
+        the colors (0-100).
+    """
+    if parallel and NUMBA_AVAILABLE:
+        return _run_parallel_kernel(_lab_to_xyz_kernel, lab)
+
+    # Calculate the intermediate XYZ values
+    yf = (lab[..., 0] + 16) / 116
+    xf = lab[..., 1] / 500 + yf
+    zf = yf - lab[..., 2] / 200
+    transformed = np.stack((xf, yf, zf), axis=-1)
+
+    # Reverse the nonlinear transformation for XYZ components
+    cubed = transformed**3
+    normalized = np.where(cubed > 0.008856, cubed, (transformed - 16.0 / 116.0) / 7.787)
+
+    # Scale back by the reference white (D65 illuminant)
+    return normalized * np.array([95.047, 100.0, 108.883])
+
+
+# ----- Helpers ----- #
+
+
+def _hue_from_rgb(
+    r: np.ndarray, g: np.ndarray, b: np.ndarray, maxc: np.ndarray, rangec: np.ndarray
+) -> np.ndarray:
+    """Compute the hue (0-1) from the RGB components, as colorsys does for HSV and HLS."""
+    rc = (maxc - r) / rangec
+    gc = (maxc - g) / rangec
+    bc = (maxc - b) / rangec
+    h = np.where(r == maxc, bc - gc, np.where(g == maxc, 2.0 + rc - bc, 4.0 + gc - rc))
+    return (h / 6.0) % 1.0
@@ -5,7 +5,10 @@ Constants
 Module with constants used in the project.
 """
 
+import os
+
 from enum import Enum
+from pathlib import Path
 
 # ----- Methods ----- #
 
@@ -23,6 +26,71 @@ class Methods(str, Enum):
     xyz: str = "xyz"
 
 
+# ----- Frame Extraction ----- #
+
+
+class ExtractionModes(str, Enum):
+    files: str = "files"  # frames written to disk as image files
+    pipe: str = "pipe"  # raw frames streamed from ffmpeg's output
+    store: str = "store"  # raw frames written to a single memory-mapped file
+
+
+class Sampling(str, Enum):
+    fps: str = "fps"  # frames sampled at a fixed rate, from a full decode
+    keyframes: str = "keyframes"  # only keyframes are decoded, for quick previews
+
+
+# ----- Frame Analysis ----- #
+
+# Size (width, height) frames are downscaled to before their color is computed
+DEFAULT_ANALYSIS_SIZE: tuple[int, int] = (25, 25)
+
+
+class Resampling(str, Enum):
+    nearest: str = "nearest"
+    bilinear: str = "bilinear"
+    bicubic: str = "bicubic"
+    area: str = "area"
+    lanczos: str = "lanczos"
+
+
+# Default settings of the k-means clustering of colors
+DEFAULT_NCLUSTERS: int = 5
+DEFAULT_TOLERANCE: float = 4.0
+DEFAULT_MAX_ITERATIONS: int = 20
+DEFAULT_SEED: int = 0
+
+# ----- Colors Computation ----- #
+
+# Number of frames processed at once by the batched color methods, which
+# is also the size of the chunks of frames handed over to each worker
+FRAMES_BATCH_SIZE: int = 256
+
+# Number of worker processes computing colors, following joblib's n_jobs
+# convention: negative values count back from the number of cores
+DEFAULT_JOBS: int = -2
+
+
+# ----- Colorbars ----- #
+
+
+class Layouts(str, Enum):
+    horizontal: str = "horizontal"  # time runs from left to right
+    vertical: str = "vertical"  # time runs from top to bottom
+
+
+# ----- Caching ----- #
+
+# Directory for files persisted between runs (the MOVIE_COLORBAR_CACHE_DIR
+# environment variable takes precedence, then the XDG cache location)
+CACHE_DIRECTORY: Path = Path(
+    os.environ.get(
+        "MOVIE_COLORBAR_CACHE_DIR",
+        Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "movie_colorbar",
+    )
+)
+
+
 # ----- Extensions ----- #
 
 VALID_VIDEO_EXTENSIONS: tuple[str, ...] = (
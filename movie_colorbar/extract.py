@@ -6,21 +6,200 @@ Module with functions to handle splitting
 a video into many images.
 """
 
+import json
+import re
 import subprocess
+import tempfile
+import time
 
+from collections.abc import Generator, Iterator
+from functools import partial
 from pathlib import Path
+from typing import NamedTuple
 
 from loguru import logger
 
+from movie_colorbar.constants import Resampling, Sampling
+from movie_colorbar.store import write_frame_store
+
+# The ffmpeg scale filter flags corresponding to our resampling filters
+FFMPEG_SCALE_FLAGS: dict = {
+    Resampling.nearest: "neighbor",
+    Resampling.bilinear: "bilinear",
+    Resampling.bicubic: "bicubic",
+    Resampling.area: "area",
+    Resampling.lanczos: "lanczos",
+}
+
+# Time (in seconds) ffmpeg seeks to before the first wanted frame, when
+# extracting from within a video, so that the fps filter has the frames
+# preceding it at hand to pick the same frames as when starting at 0
+SEEK_MARGIN_SECONDS: float = 2.0
+
+# Time (in seconds) between checks for new frames written by ffmpeg to disk
+FRAMES_POLL_INTERVAL_SECONDS: float = 0.01
+
+# The timestamp of a frame, as logged by ffmpeg's showinfo filter
+SHOWINFO_PTS_TIME_PATTERN: re.Pattern = re.compile(r"\bn:\s*\d+\s.*?\bpts_time:(\S+)")
+
+# ----- Video Information ----- #
+
+
+class VideoInfo(NamedTuple):
+    """Basic properties of a video stream, as reported by ffprobe."""
+
+    width: int
+    height: int
+    duration: float | None
+    start_time: float = 0.0
+
+
+def probe_video(video: Path) -> VideoInfo:
+    """
+    Runs ffprobe to determine the dimensions of the frames
+    (as they will be decoded by ffmpeg), the duration and the
+    start time of the provided video.
+
+    Parameters
+    ----------
+    video : pathlib.Path
+        Path to the video file.
+
+    Returns
+    -------
+    VideoInfo
+        A named tuple with the width and height of the decoded
+        frames, the duration in seconds of the video (which is
+        `None` if it could not be determined) and its start
+        time in seconds (the timestamp of its beginning).
+
+    Raises
+    ------
+    RuntimeError
+        If ffprobe fails to read the video.
+    """
+    command = [
+        "ffprobe",
+        "-v",
+        "error",
+        "-select_streams",
+        "v:0",
+        "-show_entries",
+        "stream=width,height:stream_side_data=rotation:format=duration,start_time",
+        "-of",
+        "json",
+        str(video),
+    ]
+    logger.debug(f"Running ffprobe with command: {' '.join(command)}")
+    result = subprocess.run(command, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        logger.error(f"ffprobe failed: {result.stderr}")
+        raise RuntimeError(f"Failed to probe video: {result.stderr}")
+
+    probed = json.loads(result.stdout)
+    if not probed.get("streams"):
+        raise RuntimeError(f"No video stream found in {video.name}")
+    stream = probed["streams"][0]
+    width, height = int(stream["width"]), int(stream["height"])
+
+    # ffmpeg auto-rotates frames on decoding, so we swap
+    # the dimensions for videos with a vertical rotation
+    rotation = next(
+        (int(data["rotation"]) for data in stream.get("side_data_list", []) if "rotation" in data),
+        0,
+    )
+    if abs(rotation) % 180 == 90:
+        width, height = height, width
+
+    duration = probed.get("format", {}).get("duration")
+    start_time = probed.get("format", {}).get("start_time")
+    return VideoInfo(
+        width,
+        height,
+        float(duration) if duration is not None else None,
+        float(start_time) if start_time is not None else 0.0,
+    )
+
+
+def probe_keyframes_timestamps(video: Path, threads: int | None = None) -> list[float]:
+    """
+    Runs ffmpeg to determine the timestamps of the frames extracted
+    with the `keyframes` sampling, that is of the keyframes of the
+    video. Only keyframes are decoded, and they are not scaled or
+    written anywhere.
+
+    Parameters
+    ----------
+    video : pathlib.Path
+        Path to the video file.
+    threads : int, optional
+        Number of threads ffmpeg may use for decoding. Defaults
+        to `None`, in which case ffmpeg picks it based on the
+        number of cores.
+
+    Returns
+    -------
+    list[float]
+        The timestamp of each keyframe, in seconds from the start
+        of the video, in the order they are extracted.
+
+    Raises
+    ------
+    RuntimeError
+        If ffmpeg fails to decode the video, or a keyframe has no
+        timestamp.
+    """
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        "-hide_banner",
+        *_threads_options(threads),
+        "-skip_frame",
+        "nokey",
+        "-i",
+        str(video),
+        "-vf",
+        "showinfo",
+        "-fps_mode",
+        "passthrough",  # as when extracting, every decoded frame is output
+        "-f",
+        "null",
+        "-",
+    ]
+    logger.debug(f"Probing keyframes, running ffmpeg with command: {' '.join(command)}")
+    result = subprocess.run(command, capture_output=True, text=True)
+
+    if result.returncode != 0:
+        logger.error(f"ffmpeg failed: {result.stderr}")
+        raise RuntimeError(f"Failed to probe keyframes: {result.stderr}")
+
+    try:  # frames without a timestamp are logged with 'pts_time:NOPTS'
+        return [float(pts) for pts in SHOWINFO_PTS_TIME_PATTERN.findall(result.stderr)]
+    except ValueError as error:
+        raise RuntimeError(f"A keyframe of {video.name} has no timestamp") from error
+
+
 # ----- Video Extraction ----- #
 
 
 def extract_frames_from_video(
-    video: Path, output_dir: Path, fps: int, file_format: str = "png"
+    video: Path,
+    output_dir: Path,
+    fps: int,
+    file_format: str = "png",
+    size: tuple[int, int] | None = None,
+    resampling: str = Resampling.bicubic,
+    threads: int | None = None,
+    first_frame: int = 0,
+    nframes: int | None = None,
+    sampling: str = Sampling.fps,
 ) -> list[Path]:
     """
     Runs ffmpeg to decompose the video into still frames.
     The frames are extracted in the provided `output_dir`.
+    If a `size` is provided, ffmpeg also downscales the
+    frames before writing them to disk.
 
     Parameters
     ----------
@@ -32,6 +211,31 @@ def extract_frames_from_video(
         Number of frames to extract per second of video.
     output_format : str, optional
         Image format for extracted frames (default is 'png').
+    size : tuple[int, int], optional
+        The (width, height) to scale the frames to. Defaults
+        to `None`, in which case frames are not scaled.
+    resampling : str, optional
+        The resampling filter used by ffmpeg to scale the
+        frames (default is 'bicubic').
+    threads : int, optional
+        Number of threads ffmpeg may use for decoding and
+        filtering. Defaults to `None`, in which case ffmpeg
+        picks it based on the number of cores.
+    first_frame : int, optional
+        Index of the first frame to extract, at the given
+        fps. Defaults to 0, the start of the video. The
+        video is seeked to shortly before it, and frames
+        are the same as when extracting the whole video.
+    nframes : int, optional
+        Maximum number of frames to extract. Defaults to
+        `None`, in which case frames are extracted until
+        the end of the video.
+    sampling : str, optional
+        How frames are sampled: at the given fps (`fps`,
+        the default), or only the keyframes of the video
+        (`keyframes`), in which case fps is ignored and
+        other frames are not even decoded, which is much
+        faster but gives an irregular sampling.
 
     Returns
     -------
@@ -43,34 +247,473 @@ def extract_frames_from_video(
     FileNotFoundError
         If the video file does not exist.
     ValueError
-        If fps is not a positive integer.
+        If fps is not a positive integer (with the `fps`
+        sampling).
+    RuntimeError
+        If ffmpeg fails to extract frames.
+    """
+    images = list(
+        iter_frames_from_video(
+            video,
+            output_dir,
+            fps,
+            file_format,
+            size,
+            resampling,
+            threads,
+            first_frame,
+            nframes,
+            sampling,
+        )
+    )
+    logger.debug(f"Successfully extracted {len(images)} images from {video.name}")
+    return images
+
+
+def iter_frames_from_video(
+    video: Path,
+    output_dir: Path,
+    fps: int,
+    file_format: str = "png",
+    size: tuple[int, int] | None = None,
+    resampling: str = Resampling.bicubic,
+    threads: int | None = None,
+    first_frame: int = 0,
+    nframes: int | None = None,
+    sampling: str = Sampling.fps,
+    window: int | None = None,
+    start_time: float | None = None,
+) -> Iterator[Path]:
+    """
+    Runs ffmpeg to decompose the video into still frames, just
+    like `extract_frames_from_video`, but yields the path of each
+    extracted frame as soon as ffmpeg is done writing it, so that
+    frames can be processed while the video is still decoded.
+    Frames left in `output_dir` by a previous extraction are
+    removed first. See `extract_frames_from_video` for details
+    on the other parameters.
+
+    Note
+    ----
+    Should the consumer stop iterating early, the ffmpeg process
+    is killed.
+
+    Parameters
+    ----------
+    window : int, optional
+        If provided, frames are extracted in consecutive windows
+        of this many frames, by one ffmpeg process per window,
+        each started only once the frames of the previous window
+        have all been consumed. This bounds how far ffmpeg runs
+        ahead of the consumer, and so the disk usage should the
+        consumer remove the frames it is done with. Frames are
+        the same as in a single pass, and numbered continuously.
+        Each window seeks to its first frame, so that larger
+        windows make these seeks negligible. Ignored with the
+        `keyframes` sampling.
+    start_time : float, optional
+        The start time of the video, as given by `probe_video`,
+        needed to seek to a frame. Defaults to `None`, in which
+        case the video is probed (once) if necessary.
+
+    Yields
+    ------
+    pathlib.Path
+        The path to an extracted frame, in order.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the video file does not exist.
+    ValueError
+        If fps is not a positive integer (with the `fps`
+        sampling).
     RuntimeError
         If ffmpeg fails to extract frames.
     """
     # Check the video exists and fps is valid
-    if not video.exists() and video.is_file():
+    if not video.is_file():
         raise FileNotFoundError(f"The video file {video} does not exist.")
-    if fps <= 0:
+    if sampling == Sampling.fps and fps <= 0:
         raise ValueError("FPS must be a positive integer.")
 
     logger.debug("Extracting frames from video")
     output_dir.mkdir(exist_ok=True)
+    for leftover in output_dir.glob(f"*.{file_format}"):
+        leftover.unlink()
+
+    # The windows' ffmpeg processes seek to their first frame just like segments, for
+    # which the start time of the video is determined once rather than for each window
+    windowed = window is not None and sampling == Sampling.fps
+    if windowed and start_time is None:
+        start_time = probe_video(video).start_time
+    extract = partial(
+        _iter_extracted_frames,
+        video,
+        output_dir,
+        fps,
+        file_format,
+        size,
+        resampling,
+        start_time=start_time,
+    )
+    if not windowed:
+        yield from extract(threads, first_frame, nframes, sampling)
+        return
+
+    extracted = 0
+    while nframes is None or extracted < nframes:
+        count = window if nframes is None else min(window, nframes - extracted)
+        logger.trace(f"Extracting window of {count} frames from frame {first_frame + extracted}")
+        window_extracted = yield from extract(
+            threads, first_frame + extracted, count, sampling, start_number=extracted + 1
+        )
+        extracted += window_extracted
+        if window_extracted < count:  # reached the end of the video
+            return
+
+
+def stream_frames_from_video(
+    video: Path,
+    fps: int,
+    size: tuple[int, int],
+    resampling: str = Resampling.bicubic,
+    threads: int | None = None,
+    first_frame: int = 0,
+    nframes: int | None = None,
+    sampling: str = Sampling.fps,
+    start_time: float | None = None,
+) -> Iterator[bytes]:
+    """
+    Runs ffmpeg to decompose the video into still frames, which
+    are scaled to the requested size and read directly from the
+    ffmpeg process' output as a stream of raw RGB24 buffers.
+    Nothing is written to disk.
+
+    Note
+    ----
+    The frames are yielded as ffmpeg decodes them. Should the
+    consumer stop iterating early, the ffmpeg process is killed.
+
+    Parameters
+    ----------
+    video : pathlib.Path
+        Path to the video file.
+    fps : int
+        Number of frames to extract per second of video.
+    size : tuple[int, int]
+        The (width, height) to scale the frames to. The native
+        size of the frames can be obtained with `probe_video`.
+    resampling : str, optional
+        The resampling filter used by ffmpeg to scale the
+        frames (default is 'bicubic').
+    threads : int, optional
+        Number of threads ffmpeg may use for decoding and
+        filtering. Defaults to `None`, in which case ffmpeg
+        picks it based on the number of cores.
+    first_frame : int, optional
+        Index of the first frame to extract, at the given
+        fps. Defaults to 0, the start of the video. The
+        video is seeked to shortly before it, and frames
+        are the same as when extracting the whole video.
+    nframes : int, optional
+        Maximum number of frames to extract. Defaults to
+        `None`, in which case frames are extracted until
+        the end of the video.
+    sampling : str, optional
+        How frames are sampled: at the given fps (`fps`,
+        the default), or only the keyframes of the video
+        (`keyframes`), in which case fps is ignored and
+        other frames are not even decoded, which is much
+        faster but gives an irregular sampling.
+    start_time : float, optional
+        The start time of the video, as given by `probe_video`,
+        needed to seek to the first frame. Defaults to `None`,
+        in which case the video is probed if necessary.
+
+    Yields
+    ------
+    bytes
+        The raw data of a single frame, with 3 bytes (R, G
+        and B components) per pixel. It can be loaded with
+        `PIL.Image.frombytes("RGB", size, frame)`.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the video file does not exist.
+    ValueError
+        If fps is not a positive integer (with the `fps`
+        sampling).
+    RuntimeError
+        If ffmpeg fails to extract frames.
+    """
+    # Check the video exists and fps is valid
+    if not video.is_file():
+        raise FileNotFoundError(f"The video file {video} does not exist.")
+    if sampling == Sampling.fps and fps <= 0:
+        raise ValueError("FPS must be a positive integer.")
+
+    width, height = size
+    frame_nbytes = width * height * 3  # rgb24 is 3 bytes per pixel
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        *_threads_options(threads),
+        *_segment_options(video, fps, size, resampling, first_frame, nframes, sampling, start_time),
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "pipe:1",
+    ]
+
+    logger.debug(f"Streaming frames from video, running ffmpeg with command: {' '.join(command)}")
+    # We send stderr to a temporary file rather than a pipe: ffmpeg can write
+    # a lot there, and a pipe we do not read from could fill up and deadlock
+    with tempfile.TemporaryFile() as errfile:
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=errfile)
+        nframes = 0
+        exhausted = False
+        try:
+            while True:
+                frame = process.stdout.read(frame_nbytes)
+                if len(frame) < frame_nbytes:  # end of stream
+                    exhausted = True
+                    break
+                nframes += 1
+                yield frame
+        finally:
+            # If the consumer stopped early we do not wait for ffmpeg to finish
+            if not exhausted:
+                process.kill()
+            process.stdout.close()
+            returncode = process.wait()
+
+        # Check for ffmpeg errors
+        if returncode != 0:
+            errfile.seek(0)
+            stderr = errfile.read().decode(errors="replace")
+            logger.error(f"ffmpeg failed: {stderr}")
+            raise RuntimeError(f"Failed to extract frames: {stderr}")
+
+    logger.debug(f"Successfully streamed {nframes} frames from {video.name}")
+
+
+def store_frames_from_video(
+    video: Path,
+    store: Path,
+    fps: int,
+    size: tuple[int, int],
+    resampling: str = Resampling.bicubic,
+    threads: int | None = None,
+    first_frame: int = 0,
+    nframes: int | None = None,
+    sampling: str = Sampling.fps,
+    start_time: float | None = None,
+) -> Iterator[int]:
+    """
+    Runs ffmpeg to decompose the video into still frames, just
+    like `stream_frames_from_video`, and writes them to a single
+    frame store file (see the `movie_colorbar.store` module), in
+    place of many image files. The index of each frame is yielded
+    once it is written, so that frames can be read from the store
+    while the video is still decoded. See `stream_frames_from_video`
+    for details on the other parameters.
+
+    Note
+    ----
+    Should the consumer stop iterating early, the ffmpeg process
+    is killed.
 
-    # Define the output file pattern and ffmpeg command
+    Parameters
+    ----------
+    store : pathlib.Path
+        Path of the frame store file to write. An existing
+        file at this path is overwritten.
+
+    Yields
+    ------
+    int
+        The index of the frame just written to the store.
+    """
+    frames = stream_frames_from_video(
+        video, fps, size, resampling, threads, first_frame, nframes, sampling, start_time
+    )
+    yield from write_frame_store(store, frames, size)
+
+
+# ----- Helpers ----- #
+
+
+def _iter_extracted_frames(
+    video: Path,
+    output_dir: Path,
+    fps: int,
+    file_format: str,
+    size: tuple[int, int] | None,
+    resampling: str,
+    threads: int | None,
+    first_frame: int,
+    nframes: int | None,
+    sampling: str,
+    start_number: int = 1,
+    start_time: float | None = None,
+) -> Generator[Path, None, int]:
+    """
+    Run a single ffmpeg process extracting frames to output_dir, numbered
+    from start_number, and yield the path of each frame once ffmpeg is done
+    writing it. Returns the number of extracted frames. The ffmpeg process
+    is killed should the consumer stop early.
+    """
     pattern = output_dir / f"%05d.{file_format}"
-    command = ["ffmpeg", "-i", str(video), "-vf", f"fps={fps}", str(pattern)]
+    command = [
+        "ffmpeg",
+        "-nostdin",
+        *_threads_options(threads),
+        *_segment_options(video, fps, size, resampling, first_frame, nframes, sampling, start_time),
+        "-start_number",
+        str(start_number),
+        str(pattern),
+    ]
 
     logger.debug(f"Running ffmpeg with command: {' '.join(command)}")
-    result = subprocess.run(command, capture_output=True, text=True)
+    # As when streaming, stderr goes to a temporary file so it can never fill up
+    with tempfile.TemporaryFile() as errfile:
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=errfile)
+        index = start_number
+        exhausted = False
+        try:
+            while not exhausted:
+                # ffmpeg writes frames one after the other, so a frame is complete
+                # once the next one appears, or once ffmpeg has exited
+                frame = output_dir / f"{index:05d}.{file_format}"
+                finished = process.poll() is not None
+                if frame.with_stem(f"{index + 1:05d}").exists() or (finished and frame.exists()):
+                    index += 1
+                    yield frame
+                elif finished:
+                    exhausted = True
+                else:
+                    time.sleep(FRAMES_POLL_INTERVAL_SECONDS)
+        finally:
+            # If the consumer stopped early we do not wait for ffmpeg to finish
+            if not exhausted:
+                process.kill()
+            returncode = process.wait()
 
-    # Check for ffmpeg errors
-    if result.returncode != 0:
-        logger.error(f"ffmpeg failed: {result.stderr}")
-        raise RuntimeError(f"Failed to extract frames: {result.stderr}")
+        # Check for ffmpeg errors
+        if returncode != 0:
+            errfile.seek(0)
+            stderr = errfile.read().decode(errors="replace")
+            logger.error(f"ffmpeg failed: {stderr}")
+            raise RuntimeError(f"Failed to extract frames: {stderr}")
+    return index - start_number
 
-    # Gather the extracted frames (frame number from filename)
-    logger.debug("Gathering extracted frames")
-    images = sorted(output_dir.iterdir(), key=lambda x: int(x.stem))
 
-    logger.debug(f"Successfully extracted {len(images)} images from {video.name}")
-    return images
+def _segment_options(
+    video: Path,
+    fps: int,
+    size: tuple[int, int] | None,
+    resampling: str,
+    first_frame: int = 0,
+    nframes: int | None = None,
+    sampling: str = Sampling.fps,
+    start_time: float | None = None,
+) -> list[str]:
+    """
+    The ffmpeg input, filter graph and output options to extract
+    frames from the video, starting at the given frame index and
+    stopping after nframes frames (if provided).
+
+    To start from a given frame, ffmpeg seeks to a bit before it
+    and keeps the original timestamps, shifted by the start time
+    of the video just like ffmpeg does by default. The fps filter
+    then samples frames on the same time grid as when decoding
+    the whole video, and frames before the wanted one are trimmed
+    off, so that frames are identical in both cases. The video is
+    probed for its start time unless it is provided.
+
+    With the `keyframes` sampling, ffmpeg skips the decoding of
+    all frames but keyframes, and outputs every decoded frame as
+    is (first_frame then counts keyframes from the start, which
+    are all decoded).
+    """
+    if sampling == Sampling.keyframes:
+        video_filter = _build_video_filter(None, size, resampling)
+        if first_frame > 0:
+            video_filter = f"select='gte(n,{first_frame})',{video_filter}"
+        options = ["-skip_frame", "nokey", "-i", str(video), "-vf", video_filter]
+        options += ["-fps_mode", "passthrough"]  # do not duplicate frames to a constant rate
+    elif first_frame <= 0:
+        options = ["-i", str(video), "-vf", _build_video_filter(fps, size, resampling)]
+    else:
+        start = first_frame / fps
+        seek = max(0.0, start - SEEK_MARGIN_SECONDS)
+        if start_time is None:
+            start_time = probe_video(video).start_time
+        video_filter = _build_video_filter(fps, size, resampling, start, start_time)
+        options = ["-copyts", "-ss", f"{seek!r}", "-i", str(video), "-vf", video_filter]
+
+    if nframes is not None:
+        options += ["-frames:v", str(nframes)]
+    return options
+
+
+def _build_video_filter(
+    fps: int | None,
+    size: tuple[int, int] | None = None,
+    resampling: str = Resampling.bicubic,
+    start: float | None = None,
+    start_time: float = 0.0,
+) -> str:
+    """
+    Build the ffmpeg filter graph sampling frames at the given
+    fps and, if a size is provided, scaling them to it.
+
+    Parameters
+    ----------
+    fps : int, optional
+        Number of frames to extract per second of video. If
+        `None`, frames are not resampled in time.
+    size : tuple[int, int], optional
+        The (width, height) to scale the frames to. Defaults
+        to `None`, in which case frames are not scaled.
+    resampling : str, optional
+        The resampling filter used to scale the frames
+        (default is 'bicubic').
+    start : float, optional
+        If provided, the time (in seconds from the start of the
+        video) of the first sampled frame to keep. This expects
+        the original timestamps of the video (see `-copyts`).
+    start_time : float, optional
+        The start time of the video, subtracted from the original
+        timestamps when a start is provided. Defaults to 0.
+
+    Returns
+    -------
+    str
+        The filter graph, to be given to ffmpeg's `-vf` flag.
+    """
+    filters = [f"fps={fps}"] if fps is not None else []
+    if start is not None:
+        # Sampled frames are at multiples of 1/fps, we cut in-between two
+        filters = [
+            f"setpts=PTS-{start_time!r}/TB",
+            *filters,
+            f"select='gte(t,{start - 0.5 / fps!r})'",
+        ]
+    if size is not None:
+        width, height = size
+        filters.append(f"scale={width}:{height}:flags={FFMPEG_SCALE_FLAGS[resampling]}")
+    return ",".join(filters) or "null"  # the null filter passes frames unchanged
+
+
+def _threads_options(threads: int | None) -> list[str]:
+    """
+    The ffmpeg input options limiting the number of threads used
+    to decode the video and to run the filter graph, if provided.
+    """
+    if threads is None:
+        return []
+    return ["-threads", str(threads), "-filter_threads", str(threads)]
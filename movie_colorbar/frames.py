@@ -0,0 +1,607 @@
+"""
+Frames
+------
+
+Module with functions to extract color information from
+batches of frames at once. Frames are given as a single
+uint8 array of shape (N, H, W, 3) and each function returns
+an array of shape (N, 3) with one RGB color per frame. These
+are vectorized equivalents of the functions in the `image`
+module, and give the same results (up to floating point
+rounding, and tie-breaking for the most common color).
+"""
+
+from collections.abc import Iterable
+from functools import lru_cache
+
+import numpy as np
+
+from loguru import logger
+from PIL import Image
+
+from movie_colorbar.colors import (
+    convert_hsv_to_rgb_array,
+    convert_lab_to_xyz_array,
+    convert_rgb_to_hsv_array,
+    convert_xyz_to_rgb_array,
+)
+from movie_colorbar.constants import Methods
+from movie_colorbar.image import get_quantized_color_as_rgb
+from movie_colorbar.kmeans import (
+    DEFAULT_NCLUSTERS,
+    DEFAULT_SEED,
+    DEFAULT_TOLERANCE,
+    get_kmeans_dominant_colors,
+)
+from movie_colorbar.lut import LUT_CONVERSIONS, get_lookup_table, lookup_colors
+
+# ----- Loading Frames ----- #
+
+
+def frames_from_buffers(buffers: Iterable[bytes], size: tuple[int, int]) -> np.ndarray:
+    """
+    Load raw RGB24 frame buffers, as streamed from ffmpeg,
+    into a single array.
+
+    Parameters
+    ----------
+    buffers : Iterable[bytes]
+        The raw data of each frame.
+    size : tuple[int, int]
+        The (width, height) of the frames.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    """
+    width, height = size
+    return np.frombuffer(b"".join(buffers), dtype=np.uint8).reshape(-1, height, width, 3)
+
+
+def frames_from_images(images: Iterable[Image.Image]) -> np.ndarray:
+    """
+    Load PIL images, which should all have the same size,
+    into a single array.
+
+    Parameters
+    ----------
+    images : Iterable[PIL.Image]
+        The images to load.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    """
+    return np.stack([np.asarray(image.convert("RGB")) for image in images])
+
+
+# ----- Batched Color Methods ----- #
+
+
+def get_frames_average_rgb(frames: np.ndarray) -> np.ndarray:
+    """
+    Get the average R, G and B components of each frame's pixels.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the average R, G
+        and B components of each frame.
+    """
+    logger.trace("Computing average RGB components of the frames")
+    pixels = _pixels(frames)
+    averages = pixels.sum(axis=1, dtype=np.int64) / pixels.shape[1]
+    return averages.astype(np.uint8)
+
+
+def get_frames_average_rgb_squared(frames: np.ndarray) -> np.ndarray:
+    """
+    Get the squared averaged R, G and B components of each
+    frame's pixels.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the squared averaged
+        R, G and B components of each frame.
+    """
+    logger.trace("Computing square-averaged RGB components of the frames")
+    pixels = _pixels(frames).astype(np.int64)
+    averages = (pixels**2).sum(axis=1) / pixels.shape[1]
+    return np.sqrt(averages).astype(np.uint8)
+
+
+def get_frames_average_hsv_as_rgb(
+    frames: np.ndarray, lut: bool = True, lut_bits: int = 8
+) -> np.ndarray:
+    """
+    Get the average H (hue), S (saturation) and V (value) values
+    of each frame's pixels, as RGB components (for display).
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    lut : bool, optional
+        Whether to convert pixels with a precomputed lookup
+        table (see the `lut` module). Defaults to `True`.
+    lut_bits : int, optional
+        Number of bits per channel of the lookup table's RGB
+        grid. Defaults to 8, for an exact table.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the R, G and B components
+        corresponding to the average H, S and V of each frame.
+    """
+    logger.trace("Computing average HSV components of the frames")
+    hsv = _convert_pixels(frames, "hsv", lut, lut_bits)
+    average_rgb = convert_hsv_to_rgb_array(hsv.mean(axis=1))
+    return (average_rgb * 255).astype(np.uint8)
+
+
+def get_frames_average_hue_as_rgb(
+    frames: np.ndarray, lut: bool = True, lut_bits: int = 8
+) -> np.ndarray:
+    """
+    Get the average hue of each frame's pixels, as RGB
+    components (for display).
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    lut : bool, optional
+        Whether to convert pixels with a precomputed lookup
+        table (see the `lut` module). Defaults to `True`.
+    lut_bits : int, optional
+        Number of bits per channel of the lookup table's RGB
+        grid. Defaults to 8, for an exact table.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the R, G and B components
+        corresponding to the average hue of each frame, assuming
+        full saturation and brightness.
+    """
+    logger.trace("Computing average hue of the frames")
+    avg_hsv_as_rgb = get_frames_average_hsv_as_rgb(frames, lut, lut_bits)
+
+    # Use the hue of the average HSV color with full saturation and brightness
+    hue_color_hsv = convert_rgb_to_hsv_array(avg_hsv_as_rgb / 255.0)
+    hue_color_hsv[:, 1:] = 1.0
+    return (convert_hsv_to_rgb_array(hue_color_hsv) * 255).astype(np.uint8)
+
+
+def get_frames_average_xyz_as_rgb(
+    frames: np.ndarray, lut: bool = True, lut_bits: int = 8
+) -> np.ndarray:
+    """
+    Get the average X, Y and Z values of each frame's pixels,
+    as RGB components (for display).
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    lut : bool, optional
+        Whether to convert pixels with a precomputed lookup
+        table (see the `lut` module). Defaults to `True`.
+    lut_bits : int, optional
+        Number of bits per channel of the lookup table's RGB
+        grid. Defaults to 8, for an exact table.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the R, G and B components
+        corresponding to the average X, Y and Z values of each frame.
+    """
+    logger.trace("Extracting average XYZ components of the frames")
+    xyz = _convert_pixels(frames, "xyz", lut, lut_bits)
+    return convert_xyz_to_rgb_array(xyz.mean(axis=1)).astype(np.uint8)
+
+
+def get_frames_average_lab_as_rgb(
+    frames: np.ndarray, lut: bool = True, lut_bits: int = 8
+) -> np.ndarray:
+    """
+    Get the average L (lightness), A channel and B channel of each
+    frame's pixels, as RGB components (for display).
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    lut : bool, optional
+        Whether to convert pixels with a precomputed lookup
+        table (see the `lut` module). Defaults to `True`.
+    lut_bits : int, optional
+        Number of bits per channel of the lookup table's RGB
+        grid. Defaults to 8, for an exact table.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the R, G and B components
+        corresponding to the average L, A and B values of each frame.
+    """
+    logger.trace("Extracting average LAB components of the frames")
+    lab = _convert_pixels(frames, "lab", lut, lut_bits)
+    average_xyz = convert_lab_to_xyz_array(lab.mean(axis=1))
+    return convert_xyz_to_rgb_array(average_xyz).astype(np.uint8)
+
+
+def get_frames_kmeans_color_as_rgb(
+    frames: np.ndarray,
+    nclusters: int = DEFAULT_NCLUSTERS,
+    tolerance: float = DEFAULT_TOLERANCE,
+    seed: int = DEFAULT_SEED,
+) -> np.ndarray:
+    """
+    Compute the dominant (average) color of each frame using k-means
+    clustering, as RGB components (for display). See the `kmeans`
+    module for details.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    nclusters : int, optional
+        Number of clusters (centers) to use. Defaults to 5.
+    tolerance : float, optional
+        Iterations stop for a frame once the total shift of
+        its centers is below this value. Defaults to 4.
+    seed : int, optional
+        Seed for the random draws of k-means++. Defaults to 0.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the R, G and B components
+        of the dominant color of each frame.
+    """
+    logger.trace(f"Running k-means algorithm with {nclusters} clusters on the frames")
+    return get_kmeans_dominant_colors(frames, nclusters, tolerance, seed=seed).astype(np.uint8)
+
+
+def get_frames_most_common_color_as_rgb(frames: np.ndarray, common_bits: int = 8) -> np.ndarray:
+    """
+    Determine the most common color in each frame, by pixel count,
+    returned as RGB components (for display). Colors can be quantized
+    to fewer bits per channel beforehand, in which case pixels are
+    counted in the bins of a coarser RGB grid and the average color
+    of the pixels in the most populated bin is returned.
+
+    Note
+    ----
+    Should several colors be tied for the most common in a frame,
+    the one with the lowest packed 0xRRGGBB value is returned. The
+    counting is done with a histogram when the number of its bins
+    is small compared to the number of pixels of a frame, and by
+    sorting each frame's colors otherwise.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    common_bits : int, optional
+        Bits per channel colors are quantized to before counting
+        them, from 1 to 8. Defaults to 8 (exact colors).
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the R, G and B components
+        of the most common color in each frame.
+    """
+    logger.trace(f"Determining the most common color in the frames ({common_bits} bits)")
+    codes = _packed_colors(frames, common_bits)
+    nbins = 1 << (3 * common_bits)
+    if nbins <= HISTOGRAM_PIXELS_RATIO * codes.shape[1]:
+        most_common = _histogram_modes(codes, nbins)
+    else:
+        most_common = _sorted_modes(codes)
+
+    if common_bits == 8:
+        return _unpack_colors(most_common)
+
+    # Average the pixels which fall in each frame's most common bin
+    nframes, npixels = codes.shape
+    in_bin = np.flatnonzero(codes == most_common[:, None])
+    in_bin_frames = in_bin // npixels
+    pixels = _pixels(frames).reshape(-1, 3)[in_bin]
+    sums = np.stack(
+        [
+            np.bincount(in_bin_frames, weights=pixels[:, channel], minlength=nframes)
+            for channel in range(3)
+        ],
+        axis=-1,
+    )
+    counts = np.bincount(in_bin_frames, minlength=nframes)
+    return np.round(sums / counts[:, None]).astype(np.uint8)
+
+
+def get_frames_resized_1px_rgb(frames: np.ndarray) -> np.ndarray:
+    """
+    Compute each frame's average color by resizing it to a 1x1
+    pixel. This reproduces exactly what PIL's bicubic resizing
+    does, in fixed-point arithmetic.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the R, G and B components
+        of the 1x1 pixel equivalent of each frame.
+    """
+    logger.trace("Resizing the frames to 1x1 pixel to get the average color")
+    _, height, width, _ = frames.shape
+    horizontal = _pil_fixed_point(
+        np.einsum("nhwc,w->nhc", frames.astype(np.int64), _pil_bicubic_coefficients(width))
+    )
+    return _pil_fixed_point(np.einsum("nhc,h->nc", horizontal, _pil_bicubic_coefficients(height)))
+
+
+def get_frames_color_per_image(frames: np.ndarray, method: str) -> np.ndarray:
+    """
+    Compute the color of each frame by applying, one by one, the
+    single-image function of the `image` module for the method.
+    This is used for the methods without a vectorized version.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    method : str
+        Method to use to compute the color from each frame.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the color of each frame.
+    """
+    function = PER_IMAGE_METHOD_ACTION_MAP[method]
+    colors = [function(Image.fromarray(frame, mode="RGB")) for frame in frames]
+    return np.array(colors, dtype=np.uint8).reshape(-1, 3)
+
+
+# ----- Mapping methods to called function ----- #
+
+BATCH_METHOD_ACTION_MAP: dict = {
+    Methods.common: get_frames_most_common_color_as_rgb,
+    Methods.hsv: get_frames_average_hsv_as_rgb,
+    Methods.hue: get_frames_average_hue_as_rgb,
+    Methods.kmeans: get_frames_kmeans_color_as_rgb,
+    Methods.lab: get_frames_average_lab_as_rgb,
+    Methods.resize: get_frames_resized_1px_rgb,
+    Methods.rgb: get_frames_average_rgb,
+    Methods.rgb_squared: get_frames_average_rgb_squared,
+    Methods.xyz: get_frames_average_xyz_as_rgb,
+}
+
+# Methods without a vectorized implementation, handled image per image
+PER_IMAGE_METHOD_ACTION_MAP: dict = {
+    Methods.quantized: get_quantized_color_as_rgb,
+}
+
+# Options (keyword arguments) accepted by the methods' functions
+METHOD_OPTIONS: dict = {
+    Methods.hsv: ("lut", "lut_bits"),
+    Methods.hue: ("lut", "lut_bits"),
+    Methods.common: ("common_bits",),
+    Methods.kmeans: ("nclusters", "tolerance", "seed"),
+    Methods.lab: ("lut", "lut_bits"),
+    Methods.xyz: ("lut", "lut_bits"),
+}
+
+
+def compute_frames_colors(frames: np.ndarray, method: str, **options) -> np.ndarray:
+    """
+    Compute the color of each frame in the batch according
+    to the given method.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    method : str
+        Method to use to compute the color from each frame.
+    **options
+        Options for the method's function, for instance
+        `nclusters` for the kmeans method. Options that
+        do not apply to the method are ignored.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the color of each frame.
+    """
+    accepted = METHOD_OPTIONS.get(method, ())
+    method_options = {key: value for key, value in options.items() if key in accepted}
+    if method in BATCH_METHOD_ACTION_MAP:
+        return BATCH_METHOD_ACTION_MAP[method](frames, **method_options)
+    return get_frames_color_per_image(frames, method)
+
+
+def prepare_method(method: str, **options) -> None:
+    """
+    Build the precomputed resources (lookup tables) the method needs
+    with the given options, if they are not already cached on disk.
+    This is meant to be called once in the main process, so that
+    parallel workers do not all build them at the same time.
+
+    Parameters
+    ----------
+    method : str
+        Method that will be used to compute the colors.
+    **options
+        Options for the method's function (see `compute_frames_colors`).
+    """
+    if method in LUT_METHODS_SPACES and options.get("lut", True):
+        space, bits = LUT_METHODS_SPACES[method], options.get("lut_bits", 8)
+        get_lookup_table(space, bits)
+        logger.debug(f"Using the {bits}-bits RGB to {space.upper()} lookup table")
+
+
+# ----- Helpers ----- #
+
+# Colorspace of the lookup table used by methods supporting one
+LUT_METHODS_SPACES: dict = {
+    Methods.hsv: "hsv",
+    Methods.hue: "hsv",
+    Methods.lab: "lab",
+    Methods.xyz: "xyz",
+}
+
+# The common method counts colors with a histogram when it has at most this
+# many bins per pixel of a frame, as counting is then cheaper than sorting
+HISTOGRAM_PIXELS_RATIO: int = 8
+
+# Largest number of bins of the histograms counted at once (for several frames)
+HISTOGRAM_MAX_BINS: int = 1 << 22
+
+# Precision of the fixed-point coefficients used by PIL's resampling (8 bits images)
+_PIL_PRECISION_BITS: int = 32 - 8 - 2
+
+
+def _pixels(frames: np.ndarray) -> np.ndarray:
+    """Reshape the (N, H, W, 3) frames to (N, H * W, 3) pixels."""
+    return frames.reshape(frames.shape[0], -1, 3)
+
+
+def _convert_pixels(frames: np.ndarray, space: str, lut: bool, lut_bits: int) -> np.ndarray:
+    """
+    Convert the (N, H, W, 3) frames' pixels to the given colorspace, as
+    (N, H * W, 3), either with the lookup table or by direct computation.
+    The table's values are float32, we accumulate them in float64.
+    """
+    pixels = _pixels(frames)
+    if lut:
+        return lookup_colors(pixels, space, lut_bits).astype(np.float64)
+    return LUT_CONVERSIONS[space](pixels)
+
+
+def _packed_colors(frames: np.ndarray, bits: int = 8) -> np.ndarray:
+    """
+    Pack the (N, H, W, 3) frames' colors to (N, H * W) integers, keeping the
+    given number of most significant bits per channel (0xRRGGBB for 8 bits).
+    """
+    pixels = _pixels(frames) >> (8 - bits) if bits < 8 else _pixels(frames)
+    # Shifted and combined in place, to avoid int32 copies of every channel
+    codes = pixels[..., 0].astype(np.int32)
+    codes <<= bits
+    codes |= pixels[..., 1]
+    codes <<= bits
+    codes |= pixels[..., 2]
+    return codes
+
+
+def _histogram_modes(codes: np.ndarray, nbins: int) -> np.ndarray:
+    """
+    The most common of the (N, P) packed colors of each frame, counted in
+    histograms of `nbins` bins. Frames are tagged with their index so that
+    a single bincount covers several frames at once.
+    """
+    modes = np.empty(codes.shape[0], dtype=np.int64)
+    step = max(1, HISTOGRAM_MAX_BINS // nbins)
+    for start in range(0, codes.shape[0], step):
+        chunk = codes[start : start + step]
+        keys = chunk + (np.arange(chunk.shape[0], dtype=np.int64) * nbins)[:, None]
+        counts = np.bincount(keys.ravel(), minlength=chunk.shape[0] * nbins)
+        modes[start : start + step] = counts.reshape(chunk.shape[0], nbins).argmax(axis=1)
+    return modes
+
+
+def _sorted_modes(codes: np.ndarray) -> np.ndarray:
+    """
+    The most common of the (N, P) packed colors of each frame, found by
+    sorting each frame's colors and measuring the runs of equal values.
+    """
+    nframes, npixels = codes.shape
+    ordered = np.sort(codes, axis=1).ravel()
+
+    # A run starts where the value changes, or at the start of a frame
+    run_starts = np.empty(ordered.size, dtype=bool)
+    run_starts[0] = True
+    np.not_equal(ordered[1:], ordered[:-1], out=run_starts[1:])
+    run_starts[::npixels] = True
+    starts = np.flatnonzero(run_starts)
+    lengths = np.diff(starts, append=ordered.size)
+
+    # The first of the longest runs of each frame has its lowest most common value
+    run_frames = starts // npixels
+    longest = np.maximum.reduceat(lengths, np.searchsorted(run_frames, np.arange(nframes)))
+    candidates = np.flatnonzero(lengths == longest[run_frames])
+    _, first_candidates = np.unique(run_frames[candidates], return_index=True)
+    return ordered[starts[candidates[first_candidates]]].astype(np.int64)
+
+
+def _unpack_colors(codes: np.ndarray) -> np.ndarray:
+    """Unpack 0xRRGGBB integers to a uint8 array of R, G and B components."""
+    return np.stack(((codes >> 16) & 0xFF, (codes >> 8) & 0xFF, codes & 0xFF), axis=-1).astype(
+        np.uint8
+    )
+
+
+@lru_cache
+def _pil_bicubic_coefficients(input_size: int) -> np.ndarray:
+    """
+    Fixed-point coefficients used by PIL to resample an axis of
+    the given size to a single pixel with the bicubic filter.
+    This mirrors, operation for operation, the computation in
+    PIL's Resample.c so that results are identical.
+    """
+
+    def bicubic_filter(x: float) -> float:
+        a = -0.5
+        x = abs(x)
+        if x < 1.0:
+            return ((a + 2.0) * x - (a + 3.0)) * x * x + 1
+        if x < 2.0:
+            return (((x - 5) * x + 8) * x - 4) * a
+        return 0.0
+
+    scale = float(input_size)  # as we resample to a single pixel
+    filterscale = max(scale, 1.0)
+    support = 2.0 * filterscale  # the bicubic filter has a support of 2
+    ss = 1.0 / filterscale
+    center = 0.5 * scale
+    xmin = max(int(center - support + 0.5), 0)
+    xmax = min(int(center + support + 0.5), input_size)
+
+    weights = [bicubic_filter((x - center + 0.5) * ss) for x in range(xmin, xmax)]
+    total = 0.0
+    for weight in weights:  # summed in order, as PIL does
+        total += weight
+
+    # Normalize and round to fixed point the same way PIL does
+    coefficients = np.zeros(input_size, dtype=np.int64)
+    for x, weight in zip(range(xmin, xmax), weights):
+        scaled = (weight / total) * (1 << _PIL_PRECISION_BITS)
+        coefficients[x] = int(scaled - 0.5) if scaled < 0 else int(scaled + 0.5)
+    return coefficients
+
+
+def _pil_fixed_point(accumulated: np.ndarray) -> np.ndarray:
+    """Round and clip fixed-point accumulated values to uint8 as PIL does."""
+    rounded = (accumulated + (1 << (_PIL_PRECISION_BITS - 1))) >> _PIL_PRECISION_BITS
+    return np.clip(rounded, 0, 255).astype(np.uint8)
@@ -6,7 +6,7 @@ Module with functions to handle parsing images
 and extracting color information from them.
 """
 
-import random
+import numpy as np
 
 from loguru import logger
 from PIL import Image
@@ -20,6 +20,12 @@ from movie_colorbar.colors import (
     cs_rgb_to_hsv,
 )
 from movie_colorbar.jit import maybe_jit
+from movie_colorbar.kmeans import (
+    DEFAULT_NCLUSTERS,
+    DEFAULT_SEED,
+    DEFAULT_TOLERANCE,
+    get_kmeans_dominant_colors,
+)
 
 
 def get_rgb_counts_and_colors(image: Image) -> list[tuple[int, tuple[int, int, int]]]:
@@ -277,21 +283,34 @@ def get_average_lab_as_rgb(image: Image) -> tuple[int, int, int]:
     return int(avg_r), int(avg_g), int(avg_b)
 
 
-def get_kmeans_color_as_rgb(image: Image) -> tuple[int, int, int]:
+def get_kmeans_color_as_rgb(
+    image: Image,
+    nclusters: int = DEFAULT_NCLUSTERS,
+    tolerance: float = DEFAULT_TOLERANCE,
+    seed: int = DEFAULT_SEED,
+) -> tuple[int, int, int]:
     """
-    Compute the dominant (average) color of the image using a simplified
-    k-means algorithm. Returns the dominant average color's RGB components
+    Compute the dominant (average) color of the image using k-means
+    clustering. Returns the dominant average color's RGB components
     (for display).
 
-    The function extracts the weighted RGB components from the image and applies
-    k-means clustering  (with a default of 5 clusters) to group similar colors.
-    It then returns the center of the cluster with the largest total pixel count
-    as the dominant color.
+    The function applies k-means clustering (with a default of 5 clusters
+    and deterministic k-means++ seeding) to the image's pixels, to group
+    similar colors. It then returns the center of the cluster with the
+    largest total pixel count as the dominant color. See the `kmeans`
+    module for details.
 
     Parameters
     ----------
     image : PIL.Image
         The image to extract the colors from.
+    nclusters : int, optional
+        Number of clusters (centers) to use. Defaults to 5.
+    tolerance : float, optional
+        Iterations stop once the total shift of the centers
+        is below this value. Defaults to 4.
+    seed : int, optional
+        Seed for the random draws of k-means++. Defaults to 0.
 
     Returns
     -------
@@ -299,78 +318,9 @@ def get_kmeans_color_as_rgb(image: Image) -> tuple[int, int, int]:
         A tuple with the R, G and B components corresponding
         to the dominant average color color of the image.
     """
-    counts_and_colors = get_rgb_counts_and_colors(image)
-    logger.trace("Starting k-means algorithm, defaulting to 5 clusters")
-
-    # Number of clusters (centers) to use.
-    nclusters = 5
-    centers: list[tuple[int, int, int]] = []  # holds RGB colors
-
-    # If there are fewer unique colors than k, use all available
-    # colors, and naturally the centers are the unique colors
-    logger.trace("Checking number of colors vs number of clusters")
-    ncolors = len(counts_and_colors)
-    if ncolors < nclusters:
-        nclusters = ncolors
-        centers = [rgb_color for _, rgb_color in counts_and_colors]
-        logger.trace("Set number of clusters to number of unique colors")
-    else:
-        # Randomly select nclusters distinct starting centers.
-        logger.trace("Selecting random starting centers")
-        while len(centers) < nclusters:
-            rgb_candidate = random.choice(counts_and_colors)[1]
-            if rgb_candidate not in centers:
-                centers.append(rgb_candidate)
-
-    # Iterate to update centers (up to 20 iterations)
-    logger.trace("Iterating on means")
-    for iteration in range(20):
-        previous_centers = centers.copy()
-        color_groups = [[] for _ in range(nclusters)]
-
-        # Assign each color to the closest center.
-        for count, color in counts_and_colors:
-            logger.trace("Determining closest center for current color")
-            distances = [euclidean_distance_3d(center, color) for center in centers]
-            closest_index = distances.index(min(distances))
-            color_groups[closest_index].append((count, color))
-
-        # Update centers as weighted averages of the groups
-        logger.trace("Calculating new centers from groups' weighted averages")
-        new_centers: list[tuple[int, int, int]] = []
-        for i in range(nclusters):
-            group = color_groups[i]
-            if group:
-                total_count = sum(count for count, _ in group)
-                avg_color = tuple(
-                    sum(count * color[channel] for count, color in group) / total_count
-                    for channel in range(3)
-                )
-                new_centers.append(avg_color)
-            else:
-                # If a cluster is empty, retain the previous center
-                new_centers.append(centers[i])
-
-        # We update the centers with the newly determined ones
-        centers = new_centers
-
-        # We compute the total movement of centers
-        logger.trace("Calculating total shift of centers")
-        total_shift = sum(
-            euclidean_distance_3d(centers[i], previous_centers[i]) for i in range(nclusters)
-        )
-
-        logger.trace(f"Iteration {iteration + 1}: Total center shift = {total_shift}")
-        if total_shift < 4:
-            logger.trace("Converged")
-            break
-
-    # Select the cluster with the largest total pixel count
-    logger.trace("Selecting the dominant color as center with the largest pixel count")
-    cluster_counts = [sum(count for count, _ in group) for group in color_groups]
-    dominant_index = cluster_counts.index(max(cluster_counts))
-    dominant_color = centers[dominant_index]
-
+    logger.trace(f"Running k-means algorithm with {nclusters} clusters")
+    frame = np.asarray(image.convert("RGB"))[None]  # a batch of a single frame
+    dominant_color = get_kmeans_dominant_colors(frame, nclusters, tolerance, seed=seed)[0]
     return tuple(int(channel) for channel in dominant_color)
 
 
@@ -388,14 +338,18 @@ def get_most_common_color_as_rgb(image: Image) -> tuple[int, int, int]:
     -------
     tuple[int, int, int]
         A tuple with the R, G and B components of the most
-        common color in the image (by pixel count).
+        common color in the image (by pixel count). Should
+        several colors be tied, the lowest one (by packed
+        0xRRGGBB value) is returned, as by the batched
+        `movie_colorbar.frames.get_frames_most_common_color_as_rgb`.
     """
     logger.trace("Determining the most common color in the image")
     counts_and_colors = get_rgb_counts_and_colors(image)
 
-    # Sort the list of (count, color) by count and take highest
-    # this is 10x faster than sorted(counts_and_colors)[-1] :)
-    most_common_color = max(counts_and_colors, key=lambda x: x[0])
+    # Take the highest count, and the lowest color among ties (comparing
+    # RGB tuples orders them as their packed values), rather than sorting
+    # the whole list which is 10x slower :)
+    most_common_color = min(counts_and_colors, key=lambda x: (-x[0], x[1]))
 
     # And we return the RGB values from this entry
     return most_common_color[1]
@@ -454,7 +408,7 @@ def get_resized_1px_rgb(image: Image) -> tuple[int, int, int]:
 # ----- Some useful JIT-compiled (maybe) functions ----- #
 
 
-@maybe_jit
+@maybe_jit(signatures=("(UniTuple(float64, 3), UniTuple(float64, 3))",))
 def euclidean_distance_3d(
     point1: tuple[float, float, float], point2: tuple[float, float, float]
 ) -> float:
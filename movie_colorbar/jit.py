@@ -4,18 +4,200 @@ JIT
 
 Provides a simple decorator to JIT-compile the function using
 numba if the library is installed, and do nothing otherwise.
+
+Numba is only imported, and functions only compiled, on their
+first call: importing numba alone takes a good fraction of a
+second, which code paths not using these functions (such as the
+batched color methods) do not pay. Compiled functions are cached
+on disk (in the `numba` folder of our cache directory, unless the
+NUMBA_CACHE_DIR environment variable or the host process says
+otherwise), so that compilation is only paid once, and not on
+every run or in every worker process. Numba's configuration is
+only changed once numba is imported, and the process environment
+is left alone. Functions can also be compiled ahead of their
+first call with `warmup_jit`.
+
+Only the per-image API (`movie_colorbar.image`) and the scalar
+color conversions use these functions: colorbars are created by
+the batched numpy methods, which are not compiled, so neither the
+caching nor the warmup speed up colorbar creation.
 """
 
-from typing import Callable
+import threading
+import time
+
+from collections.abc import Callable
+from functools import partial, update_wrapper
+from importlib.util import find_spec
+from pathlib import Path
+
+from loguru import logger
+
+from movie_colorbar.constants import CACHE_DIRECTORY
+
+# Where compiled functions are cached, unless numba was told otherwise
+NUMBA_CACHE_DIRECTORY: Path = CACHE_DIRECTORY / "numba"
 
+# Check if numba (optional) is installed, without importing it
+NUMBA_AVAILABLE: bool = find_spec("numba") is not None
 
-def maybe_jit(func: Callable, **kwargs) -> Callable:
+# The lazily JIT-compiled functions, to be warmed up
+_JIT_FUNCTIONS: list["LazyJit"] = []
+
+# Measures the time spent compiling functions in this process (including loading
+# them from the on-disk cache, when it happens on their first call). It is set
+# up when numba is first imported.
+_COMPILE_TIMER = None
+_NUMBA_LOCK = threading.RLock()
+
+# ----- Decorator ----- #
+
+
+class LazyJit:
     """
-    A numba.jit decorator that does nothing if numba is not installed.
+    A function JIT-compiled by numba on its first call (numba being
+    imported then), which behaves like the compiled function. The
+    compiled function itself, a numba dispatcher, is available as
+    the `dispatcher` attribute, for instance to be called from other
+    compiled functions.
     """
-    try:
-        from numba import jit
 
-        return jit(func, **kwargs)
-    except ImportError:
+    def __init__(self, func: Callable, signatures: tuple[str, ...] = (), **kwargs) -> None:
+        update_wrapper(self, func)
+        self.signatures: tuple[str, ...] = signatures
+        self._func = func
+        self._options = kwargs
+        self._dispatcher: Callable | None = None
+
+    @property
+    def dispatcher(self) -> Callable:
+        """The compiled function (compilation per argument types is still lazy)."""
+        if self._dispatcher is None:
+            with _NUMBA_LOCK:
+                if self._dispatcher is None:
+                    _import_numba()
+                    from numba import jit
+
+                    self._dispatcher = jit(self._func, **self._options)
+        return self._dispatcher
+
+    def __call__(self, *args, **kwargs):
+        dispatcher = self._dispatcher or self.dispatcher
+        return dispatcher(*args, **kwargs)
+
+
+def maybe_jit(func: Callable | None = None, signatures: tuple[str, ...] = (), **kwargs) -> Callable:
+    """
+    A numba.jit decorator that does nothing if numba is not installed.
+    Compilation happens on the first call, and compiled functions are
+    cached on disk by default (`cache=True`). It can be used with or
+    without arguments, as `@maybe_jit` or `@maybe_jit(signatures=...)`.
+
+    Parameters
+    ----------
+    func : Callable
+        The function to compile.
+    signatures : tuple[str, ...], optional
+        Argument types (for instance '(float64, float64)') the
+        function is compiled for by `warmup_jit`. Compilation
+        is otherwise lazy, on the first call for given types.
+    **kwargs
+        Options for numba.jit, for instance `parallel=True`.
+
+    Returns
+    -------
+    Callable
+        The function to be compiled, or the function itself if
+        numba is not installed.
+    """
+    if func is None:
+        return partial(maybe_jit, signatures=signatures, **kwargs)
+    if not NUMBA_AVAILABLE:
         return func
+
+    kwargs.setdefault("cache", True)
+    lazy_jit = LazyJit(func, signatures, **kwargs)
+    _JIT_FUNCTIONS.append(lazy_jit)
+    return lazy_jit
+
+
+# ----- Warmup and Compile Time ----- #
+
+
+def warmup_jit() -> float:
+    """
+    Compile all JIT functions for their declared signatures, ahead
+    of their first call. Compiled functions are stored in the
+    on-disk cache, from which later runs and worker processes load
+    them instead of compiling them again, so this is mostly useful
+    once, for instance after installing or upgrading the package.
+
+    Returns
+    -------
+    float
+        The time spent compiling, in seconds (close to 0 if all
+        functions were found in cache, or numba is not installed).
+        Loading the functions from cache takes a moment still.
+    """
+    if not NUMBA_AVAILABLE:
+        logger.debug("Numba unavailable, nothing to warm up")
+        return 0.0
+
+    start = time.perf_counter()
+    _import_numba()
+    from numba import config
+
+    if config.DISABLE_JIT:
+        logger.debug("Numba is disabled, nothing to warm up")
+        return 0.0
+
+    start_compile_time = jit_compile_time()
+    for lazy_jit in _JIT_FUNCTIONS:
+        for signature in lazy_jit.signatures:
+            lazy_jit.dispatcher.compile(signature)
+    compile_time = jit_compile_time() - start_compile_time
+    logger.info(
+        f"Warmed up JIT functions in {time.perf_counter() - start:.2f}s, "
+        f"of which {compile_time:.2f}s compiling"
+    )
+    return compile_time
+
+
+def jit_compile_time() -> float:
+    """
+    Total time spent by numba compiling functions in this process,
+    in seconds, since numba was first imported. This includes the
+    compilations of `warmup_jit`, and loading functions from the
+    on-disk cache when it happens on their first call. Worker
+    processes compile (or load) their own functions, which is not
+    included.
+
+    Returns
+    -------
+    float
+        The compile time, 0 if numba has not been used.
+    """
+    if _COMPILE_TIMER is None or not _COMPILE_TIMER.done:
+        return 0.0
+    return _COMPILE_TIMER.duration
+
+
+# ----- Helpers ----- #
+
+
+def _import_numba() -> None:
+    """
+    Import numba and, on the first import, point its cache to our
+    cache directory (unless it was set otherwise) and start measuring
+    compile time.
+    """
+    global _COMPILE_TIMER
+    with _NUMBA_LOCK:
+        if _COMPILE_TIMER is None:
+            from numba.core import config, event
+
+            if not config.CACHE_DIR:  # neither NUMBA_CACHE_DIR nor the host process set it
+                config.CACHE_DIR = str(NUMBA_CACHE_DIRECTORY)
+
+            _COMPILE_TIMER = event.TimingListener()
+            event.register("numba:compile", _COMPILE_TIMER)
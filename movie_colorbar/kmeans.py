@@ -0,0 +1,170 @@
+"""
+KMeans
+------
+
+Module with a vectorized, deterministic implementation of the
+k-means clustering of colors, run over many frames at once.
+"""
+
+import zlib
+
+import numpy as np
+
+from loguru import logger
+
+from movie_colorbar.constants import (
+    DEFAULT_MAX_ITERATIONS,
+    DEFAULT_NCLUSTERS,
+    DEFAULT_SEED,
+    DEFAULT_TOLERANCE,
+)
+
+# ----- K-Means ----- #
+
+
+def get_kmeans_dominant_colors(
+    frames: np.ndarray,
+    nclusters: int = DEFAULT_NCLUSTERS,
+    tolerance: float = DEFAULT_TOLERANCE,
+    max_iterations: int = DEFAULT_MAX_ITERATIONS,
+    seed: int = DEFAULT_SEED,
+) -> np.ndarray:
+    """
+    Compute the dominant color of each frame with k-means clustering
+    of its pixels' colors. All frames are clustered at once, and the
+    center of the cluster with the largest pixel count is returned
+    as the frame's dominant color.
+
+    Centers are initialized with k-means++ seeding. The random draws
+    for each frame are derived from the seed and the frame's content,
+    so that results are reproducible and do not depend on how frames
+    are batched together.
+
+    Parameters
+    ----------
+    frames : numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames.
+    nclusters : int, optional
+        Number of clusters (centers) to use. Defaults to 5.
+    tolerance : float, optional
+        The iterations stop for a frame once the total shift of
+        its centers is below this value. Defaults to 4.
+    max_iterations : int, optional
+        Maximum number of iterations. Defaults to 20.
+    seed : int, optional
+        Seed for the random draws of k-means++. Defaults to 0.
+
+    Returns
+    -------
+    numpy.ndarray
+        A float array of shape (N, 3) with the R, G and B components
+        of the dominant color of each frame.
+    """
+    nframes = frames.shape[0]
+    pixels = frames.reshape(nframes, -1, 3).astype(np.float64)
+    frame_offsets = np.arange(nframes)[:, None] * nclusters
+
+    logger.trace(f"Seeding {nclusters} centers for {nframes} frames with k-means++")
+    draws = _frames_random_draws(frames, nclusters, seed)
+    centers = _kmeans_plusplus_centers(pixels, nclusters, draws)
+    labels = _assign_to_centers(pixels, centers)
+    active = np.ones(nframes, dtype=bool)  # frames which have not converged yet
+
+    for iteration in range(max_iterations):
+        # Update centers as averages of their assigned pixels, only for
+        # active frames (a cluster with no pixels retains its center)
+        counts = _per_cluster_sums(labels, frame_offsets, nframes * nclusters, None)
+        sums = np.stack(
+            [
+                _per_cluster_sums(labels, frame_offsets, nframes * nclusters, pixels[..., channel])
+                for channel in range(3)
+            ],
+            axis=-1,
+        )
+        counts = counts.reshape(nframes, nclusters)
+        sums = sums.reshape(nframes, nclusters, 3)
+        non_empty = counts > 0
+        new_centers = np.where(
+            non_empty[..., None], sums / np.maximum(counts, 1)[..., None], centers
+        )
+        new_centers[~active] = centers[~active]
+
+        shifts = np.linalg.norm(new_centers - centers, axis=-1).sum(axis=-1)
+        centers = new_centers
+        labels[active] = _assign_to_centers(pixels[active], centers[active])
+
+        active &= shifts >= tolerance
+        logger.trace(f"Iteration {iteration + 1}: {active.sum()} frames not yet converged")
+        if not active.any():
+            break
+
+    # Select the cluster with the largest pixel count for each frame
+    counts = _per_cluster_sums(labels, frame_offsets, nframes * nclusters, None)
+    dominant = counts.reshape(nframes, nclusters).argmax(axis=-1)
+    return centers[np.arange(nframes), dominant]
+
+
+# ----- Helpers ----- #
+
+
+def _frames_random_draws(frames: np.ndarray, nclusters: int, seed: int) -> np.ndarray:
+    """
+    Uniform random draws in [0, 1) for the seeding of each frame, of
+    shape (N, nclusters). Each frame's generator is seeded from both
+    the provided seed and a checksum of the frame's content.
+    """
+    return np.stack(
+        [
+            np.random.default_rng((seed, zlib.crc32(np.ascontiguousarray(frame)))).random(nclusters)
+            for frame in frames
+        ]
+    ).reshape(-1, nclusters)
+
+
+def _kmeans_plusplus_centers(pixels: np.ndarray, nclusters: int, draws: np.ndarray) -> np.ndarray:
+    """
+    Pick initial centers with k-means++: the first one uniformly among
+    pixels, then each next one among pixels with a probability that is
+    proportional to their squared distance to the closest center.
+    Should a frame have fewer distinct colors than clusters, some
+    centers end up duplicated and their clusters stay empty.
+    """
+    nframes, npixels, _ = pixels.shape
+    frame_indices = np.arange(nframes)
+    centers = np.empty((nframes, nclusters, 3))
+
+    first = np.minimum((draws[:, 0] * npixels).astype(np.int64), npixels - 1)
+    centers[:, 0] = pixels[frame_indices, first]
+    closest_sq_distances = ((pixels - centers[:, :1]) ** 2).sum(axis=-1)
+
+    for index in range(1, nclusters):
+        cumulative = np.cumsum(closest_sq_distances, axis=1)
+        thresholds = draws[:, index] * cumulative[:, -1]
+        # First pixel whose cumulative distance exceeds the threshold (0 if all
+        # distances are null, in which case any pixel is as good as another)
+        chosen = np.minimum((cumulative <= thresholds[:, None]).sum(axis=1), npixels - 1)
+        centers[:, index] = pixels[frame_indices, chosen]
+        sq_distances = ((pixels - centers[:, index : index + 1]) ** 2).sum(axis=-1)
+        closest_sq_distances = np.minimum(closest_sq_distances, sq_distances)
+
+    return centers
+
+
+def _assign_to_centers(pixels: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """
+    Index of the closest center for each pixel, of shape (N, P). As
+    |p - c|^2 = |p|^2 - 2 p.c + |c|^2 and the |p|^2 term is the same
+    for all centers, we only need the (batched) products p.c, which
+    avoids building an (N, P, K, 3) array of differences.
+    """
+    products = np.matmul(pixels, centers.transpose(0, 2, 1))
+    sq_norms = (centers**2).sum(axis=-1)
+    return (sq_norms[:, None, :] - 2 * products).argmin(axis=-1)
+
+
+def _per_cluster_sums(
+    labels: np.ndarray, frame_offsets: np.ndarray, size: int, weights: np.ndarray | None
+) -> np.ndarray:
+    """Sum the weights (or count the pixels) of each cluster of each frame, flattened."""
+    flat_weights = None if weights is None else weights.ravel()
+    return np.bincount((labels + frame_offsets).ravel(), weights=flat_weights, minlength=size)
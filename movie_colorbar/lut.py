@@ -0,0 +1,156 @@
+"""
+LUT
+---
+
+Module with functions to handle precomputed lookup tables of
+colorspace conversions. The RGB input domain is finite (256^3
+values, or fewer on a quantized grid), so the conversions to the
+HSV, XYZ and LAB colorspaces are computed once for the whole grid,
+persisted to a cache file and memory-mapped. Converting pixels
+then becomes a single gather in the table, and all processes
+share the same (OS-cached) pages of the file.
+"""
+
+import os
+import threading
+
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+from loguru import logger
+
+from movie_colorbar.colors import (
+    convert_rgb_to_hsv_array,
+    convert_rgb_to_xyz_array,
+    convert_xyz_to_lab_array,
+)
+from movie_colorbar.constants import CACHE_DIRECTORY
+
+# ----- Conversions ----- #
+
+# Colorspaces for which tables can be built, with the conversion from RGB
+# components (0-255) to this colorspace, as the array functions in colors
+LUT_CONVERSIONS: dict = {
+    "hsv": lambda rgb: convert_rgb_to_hsv_array(rgb / 255.0),
+    "xyz": convert_rgb_to_xyz_array,
+    "lab": lambda rgb: convert_xyz_to_lab_array(convert_rgb_to_xyz_array(rgb)),
+}
+
+# Bump this whenever the content of the tables would change
+LUT_VERSION: int = 1
+
+# ----- Lookup Tables ----- #
+
+
+@lru_cache
+def get_lookup_table(space: str, bits: int = 8) -> np.ndarray:
+    """
+    Get the lookup table of the conversion from RGB to the given
+    colorspace, memory-mapped from its cache file. The table is
+    built and written to the cache directory on first use.
+
+    Parameters
+    ----------
+    space : str
+        The colorspace to convert to, one of 'hsv', 'xyz' or 'lab'.
+    bits : int, optional
+        Number of bits per channel of the RGB grid. The default of
+        8 covers every RGB color, lower values use a coarser grid
+        for a smaller table (each color maps to its cell's center).
+
+    Returns
+    -------
+    numpy.ndarray
+        A read-only float32 array of shape (2^(3*bits), 3), indexed
+        by the packed RGB value (see `lookup_colors`).
+
+    Raises
+    ------
+    ValueError
+        If the colorspace is not supported or bits is not in [1, 8].
+    """
+    if space not in LUT_CONVERSIONS:
+        raise ValueError(f"No lookup table for the '{space}' colorspace.")
+    if not 1 <= bits <= 8:
+        raise ValueError("The number of bits per channel must be between 1 and 8.")
+
+    table_path = CACHE_DIRECTORY / f"lut_v{LUT_VERSION}_{space}_{bits}bits.npy"
+    if not table_path.is_file():
+        _build_lookup_table(table_path, space, bits)
+
+    # Trace level: worker processes run this too, without the CLI's log level
+    logger.trace(f"Memory-mapping lookup table from '{table_path}'")
+    return np.load(table_path, mmap_mode="r")
+
+
+def lookup_colors(rgb: np.ndarray, space: str, bits: int = 8) -> np.ndarray:
+    """
+    Convert RGB colors to the given colorspace with its lookup table.
+
+    Parameters
+    ----------
+    rgb : numpy.ndarray
+        A uint8 array of shape (..., 3) with the R, G and B
+        components of the colors (0-255).
+    space : str
+        The colorspace to convert to, one of 'hsv', 'xyz' or 'lab'.
+    bits : int, optional
+        Number of bits per channel of the table's RGB grid.
+        Defaults to 8 (exact, every color is in the table).
+
+    Returns
+    -------
+    numpy.ndarray
+        A float32 array of shape (..., 3) with the converted colors.
+    """
+    table = get_lookup_table(space, bits)
+    return np.take(table, _packed_indices(rgb, bits), axis=0)
+
+
+# ----- Helpers ----- #
+
+
+def _packed_indices(rgb: np.ndarray, bits: int) -> np.ndarray:
+    """Pack the (quantized) R, G and B components into indices of the table."""
+    shift = 8 - bits
+    components = rgb.astype(np.int32) >> shift
+    return (components[..., 0] << (2 * bits)) | (components[..., 1] << bits) | components[..., 2]
+
+
+def _grid_values(bits: int) -> np.ndarray:
+    """The RGB values of the grid for each channel: cells' centers when quantized."""
+    if bits == 8:
+        return np.arange(256, dtype=np.float64)
+    step = 1 << (8 - bits)
+    return np.arange(1 << bits, dtype=np.float64) * step + (step - 1) / 2
+
+
+def _build_lookup_table(table_path: Path, space: str, bits: int) -> None:
+    """
+    Compute the conversion of every color on the RGB grid and write
+    the table to disk. This is done one R plane at a time to bound
+    memory usage, in a temporary file which is then atomically moved
+    in place (so that concurrent processes never see a partial table).
+    """
+    logger.info(f"Building the RGB to {space.upper()} lookup table (only done once)")
+    table_path.parent.mkdir(parents=True, exist_ok=True)
+    values = _grid_values(bits)
+    size = len(values)
+
+    temporary_path = table_path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+    table = np.lib.format.open_memmap(
+        temporary_path, mode="w+", dtype=np.float32, shape=(size**3, 3)
+    )
+    green, blue = np.meshgrid(values, values, indexing="ij")
+    for index, red in enumerate(values):
+        plane = np.stack((np.full_like(green, red), green, blue), axis=-1)
+        table[index * size**2 : (index + 1) * size**2] = LUT_CONVERSIONS[space](plane).reshape(
+            -1, 3
+        )
+    table.flush()
+    del table  # close the memory-map before moving the file
+
+    os.replace(temporary_path, table_path)
+    logger.debug(f"Lookup table written to '{table_path}'")
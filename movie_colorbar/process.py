@@ -1,5 +1,5 @@
 """
-Extract
+Process
 -------
 
 Module with high level functions to handle processing
@@ -7,108 +7,1156 @@ a video into a colorbar, or all videos into a provided
 directory into colorbars.
 """
 
+import os
+import time
+
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
 from pathlib import Path
 from shutil import rmtree
 
+import numpy as np
+
 from loguru import logger
 from PIL import Image
 
-from movie_colorbar.bar import create_colorbar_from_images
-from movie_colorbar.constants import VALID_VIDEO_EXTENSIONS
-from movie_colorbar.extract import extract_frames_from_video
+from movie_colorbar.bar import (
+    bin_colors,
+    compute_methods_colors_from_frames,
+    compute_methods_colors_from_images,
+    compute_methods_colors_from_store,
+    create_colorbar_from_colors,
+    iter_colors_from_frames,
+)
+from movie_colorbar.cache import colors_cache_key, load_cached_colors, save_cached_colors
+from movie_colorbar.constants import (
+    DEFAULT_ANALYSIS_SIZE,
+    DEFAULT_JOBS,
+    FRAMES_BATCH_SIZE,
+    VALID_VIDEO_EXTENSIONS,
+    ExtractionModes,
+    Layouts,
+    Methods,
+    Resampling,
+    Sampling,
+)
+from movie_colorbar.extract import (
+    iter_frames_from_video,
+    probe_keyframes_timestamps,
+    probe_video,
+    store_frames_from_video,
+    stream_frames_from_video,
+)
+from movie_colorbar.frames import METHOD_OPTIONS
+from movie_colorbar.profiling import VideoProfile, format_profile_summary, write_profile_report
+from movie_colorbar.sidecar import SIDECAR_EXTENSION, load_colors_sidecar, save_colors_sidecar
+from movie_colorbar.state import STATE_INDEX_FILENAME, WATCH_INTERVAL_SECONDS, StateIndex
+from movie_colorbar.store import FRAME_STORE_EXTENSION
 
 # ----- Video Processing ----- #
 
 
 def process_video(
-    video: Path, method: str, fps: int, outputpath: Path, cleanup: bool = True
+    video: Path,
+    method: str | list[str],
+    fps: int,
+    outputpath: Path,
+    cleanup: bool = True,
+    extraction: str = ExtractionModes.files,
+    analysis_size: tuple[int, int] = DEFAULT_ANALYSIS_SIZE,
+    resampling: str = Resampling.bicubic,
+    method_options: dict | None = None,
+    cache: bool = True,
+    segments: int = 1,
+    sampling: str = Sampling.fps,
+    profile_report: Path | None = None,
+    width: int | None = None,
+    height: int | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    window: int | None = None,
+    sidecar: bool = False,
 ) -> None:
     """
     Handles the creation of a colorbar from a video, with the
     given method. Will extract frames from the video via ffmpeg,
     compute colors from the frames, make a colorbar image and
-    save it to disk.
+    save it to disk. Should several methods be given, frames
+    are extracted only once and one colorbar is created for
+    each method.
 
     Note
     ----
-    The extracted frames are saved in a temporary directory
-    named `images_{video.stem}`, placed in the same directory
-    as the output colorbar image.
+    With the `files` extraction mode, the extracted frames are
+    saved in a temporary directory named `images_{video.stem}`,
+    placed in the same directory as the output colorbar image.
+    With the `store` extraction mode, they are written instead
+    to a single frame store file, `images_{video.stem}.frames`,
+    at the same place. With the `pipe` extraction mode, raw
+    frames are streamed from ffmpeg and nothing is written to
+    disk.
 
     Parameters
     ----------
     video : pathlib.Path
         Path to the video file.
-    method : str
-        Method to use to compute the colors from
-        extracted images.
+    method : str | list[str]
+        Method, or list of methods, to use to compute
+        the colors from extracted images.
     fps : int
         Number of frames to extract per second of video.
     outputpath : pathlib.Path
-        Path where to save the colorbar image.
+        Path where to save the colorbar image. With
+        several methods, each colorbar is saved next to
+        it with the method's name appended to its stem,
+        for instance `bar_rgb.png` and `bar_lab.png`.
     cleanup : bool, optional
         Flag to remove the extracted frames directory
         after creating the colorbar (default `True`).
+        Has no effect with the `pipe` extraction mode.
+    extraction : str, optional
+        How frames are handed over by ffmpeg: either
+        written to disk as image files (`files`), as
+        raw data to a single memory-mapped frame store
+        file (`store`), or streamed as raw data (`pipe`).
+        Defaults to `files`.
+    analysis_size : tuple[int, int], optional
+        The (width, height) frames are downscaled to, by
+        ffmpeg, before their color is computed. Defaults
+        to (25, 25).
+    resampling : str, optional
+        The resampling filter used to downscale the frames
+        (default is 'bicubic').
+    method_options : dict, optional
+        Options for the method's function, for instance
+        `{"nclusters": 3}` for the kmeans method.
+    cache : bool, optional
+        Whether to reuse (and store) the computed colors
+        from the on-disk cache, which skips decoding the
+        video again for identical settings (default `True`).
+    segments : int, optional
+        Number of segments the video's timeline is split
+        into, which are decoded concurrently by as many
+        ffmpeg processes (default 1). The colors are the
+        same as when decoding the video in one go.
+    sampling : str, optional
+        How frames are sampled from the video: at the given
+        fps (`fps`, the default), or only its keyframes
+        (`keyframes`) for a much faster, rougher preview.
+        In the latter case fps and segments are ignored.
+    profile_report : pathlib.Path, optional
+        If provided, path of a JSON file to write a report
+        to, with the wall and CPU time of each processing
+        stage, the throughput, the peak memory usage (of
+        the main process, and of the largest exited child
+        process) and the temporary disk usage.
+    width : int, optional
+        Width of the colorbar, in pixels. Defaults to the
+        number of extracted frames. With fewer columns than
+        frames, the colors of consecutive frames are binned
+        together, computed with the same method.
+    height : int, optional
+        Height of the colorbar, in pixels. Defaults to the
+        width divided by 2.5.
+    jobs : int, optional
+        Number of worker processes computing colors, if
+        joblib is available. Negative values count back
+        from the number of cores (default -2, all cores
+        but one), and 1 computes colors in this process.
+    chunk_size : int, optional
+        Number of frames handed over to a worker at once,
+        and processed together (default 256).
+    window : int, optional
+        With the `files` extraction mode, extract frames
+        in consecutive windows of this many frames, each
+        frame being deleted once loaded (with cleanup), so
+        that disk and memory usage are bounded regardless
+        of the video's length. Defaults to `None`, in which
+        case ffmpeg extracts the whole video at its pace.
+    sidecar : bool, optional
+        Whether to also write the colors of the frames to a
+        sidecar file next to each colorbar, with the same
+        name and a `.npz` extension, from which colorbars
+        can be rendered again without decoding the video
+        (see `render_colorbar`). Defaults to `False`.
     """
     if not _is_handled_video(video):
         logger.warning(f"File '{video.name}' is not a supported format, skipping")
         return
 
-    logger.info(f"Creating colorbar from '{video.name}'")
-    images_dir = outputpath.parent / f"images_{video.stem}"
-    images: list[Path] = extract_frames_from_video(video, images_dir, fps)
+    methods = _as_methods_list(method)
+    if len(methods) == 1:
+        outputpaths = {methods[0]: outputpath}
+    else:
+        outputpaths = {
+            method: outputpath.with_name(f"{outputpath.stem}_{method}{outputpath.suffix}")
+            for method in methods
+        }
 
-    colorbar: Image = create_colorbar_from_images(images, method)
-    colorbar.save(outputpath)
-    logger.success(f"Saved created colorbar at '{outputpath.absolute()}'")
+    profile = _create_video_colorbars(
+        video,
+        outputpaths,
+        fps,
+        cleanup,
+        extraction,
+        analysis_size,
+        resampling,
+        method_options,
+        cache,
+        segments=segments,
+        sampling=sampling,
+        width=width,
+        height=height,
+        jobs=jobs,
+        chunk_size=chunk_size,
+        window=window,
+        sidecar=sidecar,
+    )
 
-    if cleanup is True:
-        logger.info(f"Cleaning up: removing temporary '{images_dir.name}' directory")
-        rmtree(images_dir)
+    if profile_report is not None:
+        write_profile_report([profile], profile_report)
 
 
 def process_directory(
-    directory: Path, method: str, fps: int, outputdir: Path, cleanup: bool = True
+    directory: Path,
+    method: str | list[str],
+    fps: int,
+    outputdir: Path,
+    cleanup: bool = True,
+    extraction: str = ExtractionModes.files,
+    analysis_size: tuple[int, int] = DEFAULT_ANALYSIS_SIZE,
+    resampling: str = Resampling.bicubic,
+    method_options: dict | None = None,
+    cache: bool = True,
+    segments: int = 1,
+    sampling: str = Sampling.fps,
+    concurrent_videos: int | None = None,
+    profile_report: Path | None = None,
+    width: int | None = None,
+    height: int | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    watch: bool = False,
+    watch_interval: float = WATCH_INTERVAL_SECONDS,
+    window: int | None = None,
+    sidecar: bool = False,
 ) -> None:
     """
     Handles the creation of colorbars from all videos in a
-    directory, with the given method. Will extract frames from
+    directory, with the given method(s). Will extract frames from
     each video via ffmpeg, compute colors from the frames, make
-    a colorbar image and save it to disk.
+    a colorbar image per method and save it to disk.
+
+    Note
+    ----
+    Several videos are processed concurrently, the available
+    cores being shared between their ffmpeg processes (each one
+    is given an explicit number of threads). Videos are started
+    longest first, according to their probed durations, so that
+    no long video is left to run on its own at the end.
+    Colors are computed by a single pool of worker processes
+    (see `jobs`), which is shared by all videos and kept alive
+    from one video to the next.
+
+    In watch mode, the directory is scanned again and again for
+    new videos, and an index of processed videos is kept in the
+    output directory (see `movie_colorbar.state.StateIndex`):
+    only new or changed videos are processed, whether they come
+    in while watching or since a previous run.
 
     Parameters
     ----------
     directory : pathlib.Path
         Path to the directory with video files.
-    method : str
-        Method to use to compute the colors from
-        extracted images.
+    method : str | list[str]
+        Method, or list of methods, to use to compute
+        the colors from extracted images.
     fps : int
         Number of frames to extract per second of video.
     outputdir : pathlib.Path
         Path where to save the colorbar images. Each one
         will be named after the video file it is created
-        from.
+        from and the method used.
     cleanup : bool, optional
         Flag to remove the extracted frames directories
         after creating the colorbars (default `True`).
+        Has no effect with the `pipe` extraction mode.
+    extraction : str, optional
+        How frames are handed over by ffmpeg: either
+        written to disk as image files (`files`), as
+        raw data to a single memory-mapped frame store
+        file (`store`), or streamed as raw data (`pipe`).
+        Defaults to `files`.
+    analysis_size : tuple[int, int], optional
+        The (width, height) frames are downscaled to, by
+        ffmpeg, before their color is computed. Defaults
+        to (25, 25).
+    resampling : str, optional
+        The resampling filter used to downscale the frames
+        (default is 'bicubic').
+    method_options : dict, optional
+        Options for the method's function, for instance
+        `{"nclusters": 3}` for the kmeans method.
+    cache : bool, optional
+        Whether to reuse (and store) the computed colors
+        from the on-disk cache, which skips decoding the
+        video again for identical settings (default `True`).
+    segments : int, optional
+        Number of segments the video's timeline is split
+        into, which are decoded concurrently by as many
+        ffmpeg processes (default 1). The colors are the
+        same as when decoding the video in one go.
+    sampling : str, optional
+        How frames are sampled from the video: at the given
+        fps (`fps`, the default), or only its keyframes
+        (`keyframes`) for a much faster, rougher preview.
+        In the latter case fps and segments are ignored.
+    concurrent_videos : int, optional
+        Maximum number of videos processed at the same time.
+        Defaults to `None`, in which case it is the number of
+        available cores (or of videos, if there are fewer).
+    profile_report : pathlib.Path, optional
+        If provided, path of a JSON file to write a report
+        to, with the wall and CPU time of each processing
+        stage, the throughput, the peak memory usage (of
+        the main process, and of the largest exited child
+        process) and the temporary disk usage of each video.
+        A summary table is also logged at the end. When
+        watching, the report covers all videos processed so
+        far and is rewritten after each batch of videos,
+        each batch being summarized. As time and memory are
+        measured for the whole process, videos are processed
+        one at a time, regardless of concurrent_videos.
+    width : int, optional
+        Width of the colorbar, in pixels. Defaults to the
+        number of extracted frames. With fewer columns than
+        frames, the colors of consecutive frames are binned
+        together, computed with the same method.
+    height : int, optional
+        Height of the colorbar, in pixels. Defaults to the
+        width divided by 2.5.
+    jobs : int, optional
+        Number of worker processes computing colors, if
+        joblib is available. Negative values count back
+        from the number of cores (default -2, all cores
+        but one), and 1 computes colors in this process.
+    chunk_size : int, optional
+        Number of frames handed over to a worker at once,
+        and processed together (default 256).
+    watch : bool, optional
+        Whether to keep watching the directory, processing
+        new or changed videos as they appear, until the
+        process is interrupted (default `False`).
+    watch_interval : float, optional
+        Time between two scans of the directory in watch
+        mode, in seconds (default 5). Videos modified more
+        recently than that are left for the next scan, as
+        they may still be being written.
+    window : int, optional
+        With the `files` extraction mode, extract frames
+        in consecutive windows of this many frames, each
+        frame being deleted once loaded (with cleanup), so
+        that disk and memory usage are bounded regardless
+        of the video's length. Defaults to `None`, in which
+        case ffmpeg extracts the whole video at its pace.
+    sidecar : bool, optional
+        Whether to also write the colors of the frames to a
+        sidecar file next to each colorbar, with the same
+        name and a `.npz` extension, from which colorbars
+        can be rendered again without decoding the video
+        (see `render_colorbar`). Defaults to `False`.
     """
     logger.info(f"Processing all videos in '{directory.name}'")
     outputdir.mkdir(exist_ok=True)
+    methods = _as_methods_list(method)
+    state_index = StateIndex(outputdir / STATE_INDEX_FILENAME, watch_interval) if watch else None
+    if profile_report is not None and concurrent_videos != 1:
+        # CPU time and memory are measured for the whole process, and would be shared
+        logger.info(
+            "Profiling: processing videos one at a time, so their measurements are their own"
+        )
+        concurrent_videos = 1
+    settings = {
+        "methods": methods,
+        "fps": fps,
+        "sampling": sampling,
+        "analysis_size": analysis_size,
+        "resampling": resampling,
+        # Per method, so that options of other methods do not invalidate colorbars
+        "method_options": {method: _method_options(method, method_options) for method in methods},
+        "width": width,
+        "height": height,
+    }
+
+    first_scan = True
+    profiles: list[VideoProfile] = []  # of all batches, when watching
+    while True:
+        video_files = [element for element in directory.iterdir() if _is_handled_video(element)]
+        if state_index is not None:
+            video_files = [
+                video
+                for video in video_files
+                if state_index.needs_processing(
+                    video,
+                    settings,
+                    _expected_outputs(_directory_outputpaths(video, methods, outputdir), sidecar),
+                )
+            ]
+        logger.debug(f"Found {len(video_files)} videos to process")
+
+        if video_files:
+            batch_profiles = _process_videos(
+                video_files,
+                methods,
+                fps,
+                outputdir,
+                cleanup,
+                extraction,
+                analysis_size,
+                resampling,
+                method_options,
+                cache,
+                segments,
+                sampling,
+                concurrent_videos,
+                width,
+                height,
+                jobs,
+                chunk_size,
+                state_index,
+                settings,
+                window,
+                sidecar,
+            )
+            if profile_report is not None:
+                profiles += batch_profiles
+                write_profile_report(profiles, profile_report)
+                logger.info(f"Processing summary:\n{format_profile_summary(batch_profiles)}")
 
-    video_files = [element for element in directory.iterdir() if _is_handled_video(element)]
-    logger.debug(f"Found {len(video_files)} videos to process")
+        if not watch:
+            return
+        if video_files or first_scan:
+            logger.info(f"Watching '{directory.name}' for new or changed videos")
+        first_scan = False
+        time.sleep(watch_interval)
 
-    # Note: we do not parallelize these calls, as ffmpeg
-    # already parallelizes the extraction of frames.
-    for video in video_files:
-        outputfile = outputdir / f"{video.stem}_{method}_bar.png"
-        process_video(video, method, fps, outputfile, cleanup)
+
+# ----- Video Colors ----- #
+
+
+def iter_frame_colors(
+    video: Path,
+    method: str,
+    fps: int,
+    analysis_size: tuple[int, int] = DEFAULT_ANALYSIS_SIZE,
+    resampling: str = Resampling.bicubic,
+    method_options: dict | None = None,
+    chunk_size: int = 16,
+) -> Iterator[tuple[float, tuple[int, int, int]]]:
+    """
+    Stream the colors of a video's frames, as they are decoded by
+    ffmpeg. Nothing is written to disk, and should the iteration
+    be stopped early the ffmpeg process is killed, so that only
+    the needed part of the video is decoded.
+
+    Parameters
+    ----------
+    video : pathlib.Path
+        Path to the video file.
+    method : str
+        Method to use to compute the color of each frame.
+    fps : int
+        Number of frames to extract per second of video.
+    analysis_size : tuple[int, int], optional
+        The (width, height) frames are downscaled to, by
+        ffmpeg, before their color is computed. Defaults
+        to (25, 25).
+    resampling : str, optional
+        The resampling filter used to downscale the frames
+        (default is 'bicubic').
+    method_options : dict, optional
+        Options for the method's function, for instance
+        `{"nclusters": 3}` for the kmeans method.
+    chunk_size : int, optional
+        Number of frames processed together (default 16).
+        Larger chunks are more efficient, smaller ones
+        yield the first colors earlier.
+
+    Yields
+    ------
+    tuple[float, tuple[int, int, int]]
+        The timestamp of a frame, in seconds from the start
+        of the video, and its (R, G, B) color.
+
+    Raises
+    ------
+    FileNotFoundError
+        If the video file does not exist.
+    ValueError
+        If fps is not a positive integer.
+    RuntimeError
+        If ffmpeg fails to extract frames.
+    """
+    method = Methods(method).value
+    frames = stream_frames_from_video(video, fps, analysis_size, resampling)
+    colors = iter_colors_from_frames(frames, analysis_size, method, method_options, chunk_size)
+    for index, color in enumerate(colors):
+        yield index / fps, tuple(color.tolist())
+
+
+def compute_video_colors(
+    video: Path,
+    method: str,
+    fps: int,
+    analysis_size: tuple[int, int] = DEFAULT_ANALYSIS_SIZE,
+    resampling: str = Resampling.bicubic,
+    method_options: dict | None = None,
+    cache: bool = True,
+    segments: int = 1,
+    sampling: str = Sampling.fps,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+) -> np.ndarray:
+    """
+    Compute the colors of all of a video's frames, as used to
+    create its colorbar, without creating any image. Frames are
+    streamed from ffmpeg (the `pipe` extraction mode) so nothing
+    is written to disk, apart from the colors cache. The frame
+    at index i is at i / fps seconds from the start of the video
+    (with the `fps` sampling). See `process_video` for details
+    on the parameters.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, 3) with the color
+        of each frame, in order.
+    """
+    method = Methods(method).value
+    colors = _get_video_colors(
+        video,
+        [method],
+        fps,
+        video,  # where frames would be extracted with the files extraction mode
+        True,
+        ExtractionModes.pipe,
+        analysis_size,
+        resampling,
+        method_options,
+        cache,
+        segments,
+        sampling,
+        jobs=jobs,
+        chunk_size=chunk_size,
+    )
+    return colors[method]
+
+
+# ----- Rendering from Sidecars ----- #
+
+
+def render_colorbar(
+    sidecar: Path,
+    outputpath: Path,
+    width: int | None = None,
+    height: int | None = None,
+    layout: str = Layouts.horizontal,
+) -> None:
+    """
+    Render a colorbar from the colors stored in a sidecar file (see
+    the `sidecar` option of `process_video`), without decoding the
+    video again. The image format is determined by the extension
+    of the output path.
+
+    Parameters
+    ----------
+    sidecar : pathlib.Path
+        Path to the sidecar file.
+    outputpath : pathlib.Path
+        Path where to save the colorbar image.
+    width : int, optional
+        Width of the colorbar, in pixels. Defaults to the
+        number of colors in the sidecar. With fewer columns
+        than colors, consecutive colors are binned together
+        with the method they were computed with.
+    height : int, optional
+        Height of the colorbar, in pixels. Defaults to the
+        width divided by 2.5.
+    layout : str, optional
+        How the bar is laid out, with time running from left
+        to right (`horizontal`, the default) or from top to
+        bottom (`vertical`).
+
+    Raises
+    ------
+    ValueError
+        If the sidecar file is invalid.
+    """
+    start = time.perf_counter()
+    colors_sidecar = load_colors_sidecar(sidecar)
+    colors = colors_sidecar.colors
+    if width is not None and width < len(colors):
+        colors = bin_colors(colors, width, colors_sidecar.method, colors_sidecar.method_options)
+    colorbar: Image = create_colorbar_from_colors(colors, width, height, layout)
+    colorbar.save(outputpath)
+    logger.success(
+        f"Rendered colorbar at '{outputpath.absolute()}' in {time.perf_counter() - start:.3f}s"
+    )
+
+
+def render_directory(
+    directory: Path,
+    outputdir: Path,
+    width: int | None = None,
+    height: int | None = None,
+    layout: str = Layouts.horizontal,
+    file_format: str = "png",
+) -> None:
+    """
+    Render colorbars from all the sidecar files in a directory,
+    without decoding any video. Each colorbar is named after its
+    sidecar, with the extension of the given image format. Invalid
+    sidecars are reported and skipped. See `render_colorbar` for
+    details on the other parameters.
+
+    Parameters
+    ----------
+    directory : pathlib.Path
+        Path to the directory with sidecar files.
+    outputdir : pathlib.Path
+        Path where to save the colorbar images.
+    file_format : str, optional
+        Image format (extension) of the colorbars, for
+        instance 'png' (the default), 'jpg' or 'webp'.
+    """
+    sidecars = sorted(directory.glob(f"*{SIDECAR_EXTENSION}"))
+    logger.info(f"Rendering {len(sidecars)} colorbars from sidecars in '{directory.name}'")
+    outputdir.mkdir(exist_ok=True)
+    for sidecar in sidecars:
+        try:
+            render_colorbar(
+                sidecar, outputdir / f"{sidecar.stem}.{file_format}", width, height, layout
+            )
+        except ValueError as error:
+            logger.error(f"Skipping '{sidecar.name}': {error}")
 
 
 # ----- Helpers ----- #
 
 
+def _process_videos(
+    videos: list[Path],
+    methods: list[str],
+    fps: int,
+    outputdir: Path,
+    cleanup: bool,
+    extraction: str,
+    analysis_size: tuple[int, int],
+    resampling: str,
+    method_options: dict | None,
+    cache: bool,
+    segments: int,
+    sampling: str,
+    concurrent_videos: int | None,
+    width: int | None,
+    height: int | None,
+    jobs: int,
+    chunk_size: int,
+    state_index: StateIndex | None = None,
+    settings: dict | None = None,
+    window: int | None = None,
+    sidecar: bool = False,
+) -> list[VideoProfile]:
+    """
+    Create the colorbars of several videos concurrently, sharing
+    the cores between their ffmpeg processes. Each video is recorded
+    in the state index (with the given settings) once processed, if
+    one is provided, in which case failing videos are skipped rather
+    than raising. See `process_directory` for details on the other
+    parameters. Returns the profiles of the videos' processing.
+    """
+    cores = os.cpu_count() or 1
+    nworkers = min(len(videos), concurrent_videos or cores)
+    # With a single worker we let ffmpeg use all cores as it sees fit,
+    # otherwise each ffmpeg process gets an even share of the cores
+    ffmpeg_threads = None if nworkers == 1 else max(1, cores // nworkers)
+    logger.debug(
+        f"Processing {nworkers} videos at a time, with {ffmpeg_threads or 'auto'} ffmpeg threads"
+    )
+
+    def record(video: Path, future: Future) -> None:
+        """Record the processed video in the state index as soon as it is done."""
+        failed = future.exception() is not None
+        if failed:
+            logger.error(f"Failed to process '{video.name}', it will be retried once changed")
+        state_index.record(video, settings, failed=failed)
+
+    # Jobs are queued longest first, and picked up in this order as workers
+    # free up, so the total time is close to the total work divided by cores
+    with ThreadPoolExecutor(max_workers=nworkers) as executor:
+        futures = []
+        for video in _longest_first(videos):
+            future = executor.submit(
+                _create_video_colorbars,
+                video,
+                _directory_outputpaths(video, methods, outputdir),
+                fps,
+                cleanup,
+                extraction,
+                analysis_size,
+                resampling,
+                method_options,
+                cache,
+                segments,
+                sampling,
+                ffmpeg_threads,
+                width,
+                height,
+                jobs,
+                chunk_size,
+                window,
+                sidecar,
+            )
+            if state_index is not None:
+                future.add_done_callback(partial(record, video))
+            futures.append(future)
+        if state_index is not None:  # failures are reported and recorded, and we carry on
+            futures = [future for future in futures if future.exception() is None]
+        # Getting results propagates any exception raised in a worker
+        return [future.result() for future in futures]
+
+
+def _directory_outputpaths(video: Path, methods: list[str], outputdir: Path) -> dict[str, Path]:
+    """The paths of the colorbars of a video processed with process_directory, per method."""
+    return {method: outputdir / f"{video.stem}_{method}_bar.png" for method in methods}
+
+
+def _expected_outputs(outputpaths: dict[str, Path], sidecar: bool) -> list[Path]:
+    """The files created when processing a video: its colorbars, and their sidecars if asked."""
+    if sidecar is False:
+        return list(outputpaths.values())
+    return [
+        path
+        for outputpath in outputpaths.values()
+        for path in (outputpath, outputpath.with_suffix(SIDECAR_EXTENSION))
+    ]
+
+
+def _method_options(method: str, method_options: dict | None) -> dict:
+    """The options which apply to the method, among the given ones."""
+    return {
+        option: value
+        for option, value in (method_options or {}).items()
+        if option in METHOD_OPTIONS.get(method, ())
+    }
+
+
+def _create_video_colorbars(
+    video: Path,
+    outputpaths: dict[str, Path],
+    fps: int,
+    cleanup: bool,
+    extraction: str,
+    analysis_size: tuple[int, int],
+    resampling: str,
+    method_options: dict | None,
+    cache: bool,
+    segments: int = 1,
+    sampling: str = Sampling.fps,
+    ffmpeg_threads: int | None = None,
+    width: int | None = None,
+    height: int | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    window: int | None = None,
+    sidecar: bool = False,
+) -> VideoProfile:
+    """
+    Create the colorbars of a video for several methods, decoding
+    its frames at most once (and not at all if the colors of all
+    methods are found in cache). The outputpaths map each method
+    to the path of its colorbar, and ffmpeg_threads is the number
+    of threads given to ffmpeg. See `process_video` for details
+    on the other parameters. Returns the profile of the video's
+    processing.
+    """
+    logger.info(f"Creating colorbar from '{video.name}'")
+    profile = VideoProfile(video)
+    colors = _get_video_colors(
+        video,
+        list(outputpaths),
+        fps,
+        next(iter(outputpaths.values())),
+        cleanup,
+        extraction,
+        analysis_size,
+        resampling,
+        method_options,
+        cache,
+        segments,
+        sampling,
+        ffmpeg_threads,
+        jobs,
+        chunk_size,
+        profile,
+        window,
+    )
+
+    profile.nframes = len(next(iter(colors.values())))
+    timestamps = None
+    if sidecar is True and sampling == Sampling.keyframes:  # irregular, ask ffmpeg
+        with profile.stage("sidecar"):
+            timestamps = np.array(probe_keyframes_timestamps(video, ffmpeg_threads))
+
+    for method, outputpath in outputpaths.items():
+        if sidecar is True:  # the colors of all frames, before binning
+            with profile.stage("sidecar"):
+                save_colors_sidecar(
+                    outputpath.with_suffix(SIDECAR_EXTENSION),
+                    colors[method],
+                    method,
+                    fps,
+                    sampling,
+                    _method_options(method, method_options),
+                    video.name,
+                    timestamps,
+                )
+        if width is not None and width < profile.nframes:
+            with profile.stage("binning"):
+                colors[method] = bin_colors(colors[method], width, method, method_options)
+        with profile.stage("assembly"):
+            colorbar: Image = create_colorbar_from_colors(colors[method], width, height)
+        with profile.stage("save"):
+            colorbar.save(outputpath)
+        logger.success(f"Saved created colorbar at '{outputpath.absolute()}'")
+
+    profile.finish()
+    return profile
+
+
+def _get_video_colors(
+    video: Path,
+    methods: list[str],
+    fps: int,
+    outputpath: Path,
+    cleanup: bool,
+    extraction: str,
+    analysis_size: tuple[int, int],
+    resampling: str,
+    method_options: dict | None,
+    cache: bool,
+    segments: int = 1,
+    sampling: str = Sampling.fps,
+    ffmpeg_threads: int | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    profile: VideoProfile | None = None,
+    window: int | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Get the colors of the video's frames according to each of the
+    methods, from the cache when possible, and otherwise by decoding
+    the video (at most once) and computing them, in which case they
+    are stored in the cache. See `_compute_video_colors` for details
+    on the parameters.
+    """
+    profile = profile or VideoProfile(video)
+    colors: dict[str, np.ndarray] = {}
+    cache_keys: dict[str, str] = {}
+
+    if cache is True:
+        with profile.stage("cache"):
+            for method in methods:
+                cache_keys[method] = colors_cache_key(
+                    video,
+                    fps=fps,
+                    sampling=sampling,
+                    analysis_size=analysis_size,
+                    resampling=resampling,
+                    method=method,
+                    method_options=_method_options(method, method_options),
+                )
+                cached_colors = load_cached_colors(cache_keys[method])
+                if cached_colors is not None:
+                    logger.info(f"Reusing the {method} colors found in cache")
+                    colors[method] = cached_colors
+
+    if missing_methods := [method for method in methods if method not in colors]:
+        computed_colors = _compute_video_colors(
+            video,
+            missing_methods,
+            fps,
+            outputpath,
+            cleanup,
+            extraction,
+            analysis_size,
+            resampling,
+            method_options,
+            segments,
+            sampling,
+            ffmpeg_threads,
+            jobs,
+            chunk_size,
+            profile,
+            window,
+        )
+        colors.update(computed_colors)
+        if cache is True:
+            with profile.stage("cache"):
+                for method, method_colors in computed_colors.items():
+                    save_cached_colors(cache_keys[method], method_colors)
+
+    return {method: colors[method] for method in methods}
+
+
+def _compute_video_colors(
+    video: Path,
+    methods: list[str],
+    fps: int,
+    outputpath: Path,
+    cleanup: bool,
+    extraction: str,
+    analysis_size: tuple[int, int],
+    resampling: str,
+    method_options: dict | None,
+    segments: int = 1,
+    sampling: str = Sampling.fps,
+    ffmpeg_threads: int | None = None,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    profile: VideoProfile | None = None,
+    window: int | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Extract frames from the video via ffmpeg once, and compute
+    their colors according to each of the methods. With several
+    segments, these are extracted and processed concurrently,
+    and their colors concatenated in order. With the `files`
+    extraction mode, frames are extracted next to the outputpath.
+    The stages are timed in the profile, if provided. See the
+    function `process_video` for details on the other parameters.
+    """
+    profile = profile or VideoProfile(video)
+    images_dir = outputpath.parent / f"images_{video.stem}"
+    boundaries = None
+    if segments > 1 and sampling == Sampling.keyframes:
+        logger.info("Segments are not used with keyframes sampling, which is fast anyway")
+    elif segments > 1:
+        # Probed once here, rather than by each segment to seek to its start
+        info = probe_video(video)
+        boundaries = _segments_boundaries(video, info.duration, fps, segments)
+
+    if boundaries is None:
+        return _compute_segment_colors(
+            video,
+            methods,
+            fps,
+            images_dir,
+            cleanup,
+            extraction,
+            analysis_size,
+            resampling,
+            method_options,
+            ffmpeg_threads,
+            sampling=sampling,
+            jobs=jobs,
+            chunk_size=chunk_size,
+            profile=profile,
+            window=window,
+        )
+
+    nsegments = len(boundaries) - 1
+    threads = max(1, (ffmpeg_threads or os.cpu_count() or 1) // nsegments)
+    logger.debug(f"Decoding '{video.name}' in {nsegments} segments, starting at {boundaries[:-1]}")
+
+    def compute_segment(index: int) -> dict[str, np.ndarray]:
+        """Compute the colors of the frames of a segment (the last one runs to the end)."""
+        first_frame, next_first_frame = boundaries[index], boundaries[index + 1]
+        return _compute_segment_colors(
+            video,
+            methods,
+            fps,
+            images_dir.with_name(f"{images_dir.name}_{index}"),
+            cleanup,
+            extraction,
+            analysis_size,
+            resampling,
+            method_options,
+            threads,
+            first_frame,
+            None if index == nsegments - 1 else next_first_frame - first_frame,
+            jobs=jobs,
+            chunk_size=chunk_size,
+            profile=profile,
+            window=window,
+            start_time=info.start_time,
+        )
+
+    with ThreadPoolExecutor(max_workers=nsegments) as executor:
+        segments_colors = list(executor.map(compute_segment, range(nsegments)))
+    return {
+        method: np.concatenate([colors[method] for colors in segments_colors]) for method in methods
+    }
+
+
+def _compute_segment_colors(
+    video: Path,
+    methods: list[str],
+    fps: int,
+    images_dir: Path,
+    cleanup: bool,
+    extraction: str,
+    analysis_size: tuple[int, int],
+    resampling: str,
+    method_options: dict | None,
+    ffmpeg_threads: int | None = None,
+    first_frame: int = 0,
+    nframes: int | None = None,
+    sampling: str = Sampling.fps,
+    jobs: int = DEFAULT_JOBS,
+    chunk_size: int = FRAMES_BATCH_SIZE,
+    profile: VideoProfile | None = None,
+    window: int | None = None,
+    start_time: float | None = None,
+) -> dict[str, np.ndarray]:
+    """
+    Extract the frames of (a segment of) the video via ffmpeg, and
+    compute their colors according to each of the methods. Frames
+    are extracted in images_dir with the `files` extraction mode,
+    and to a frame store file named after it with the `store` mode.
+    The stages are timed in the profile, if provided: frames being
+    decoded while colors are computed, the time spent waiting for
+    ffmpeg to hand frames over is the extraction stage, and the
+    rest the colors stage. The start time of the video, as given by
+    `probe_video`, spares probing it again to seek to first_frame.
+    See `process_video` and the function `extract_frames_from_video`
+    for details on the parameters.
+    """
+    profile = profile or VideoProfile(video)
+    if extraction == ExtractionModes.pipe:
+        with profile.waiting_stage("colors", "extraction") as on_wait:
+            frames = stream_frames_from_video(
+                video,
+                fps,
+                analysis_size,
+                resampling,
+                ffmpeg_threads,
+                first_frame,
+                nframes,
+                sampling,
+                start_time,
+            )
+            return compute_methods_colors_from_frames(
+                frames, analysis_size, methods, method_options, jobs, chunk_size, on_wait
+            )
+
+    if extraction == ExtractionModes.store:
+        store = images_dir.with_name(f"{images_dir.name}{FRAME_STORE_EXTENSION}")
+        with profile.waiting_stage("colors", "extraction") as on_wait:
+            written = store_frames_from_video(
+                video,
+                store,
+                fps,
+                analysis_size,
+                resampling,
+                ffmpeg_threads,
+                first_frame,
+                nframes,
+                sampling,
+                start_time,
+            )
+            colors = compute_methods_colors_from_store(
+                store, methods, method_options, jobs, chunk_size, frames=written, on_wait=on_wait
+            )
+        profile.add_temp_disk_usage(store)
+
+        if cleanup is True:
+            logger.info(f"Cleaning up: removing temporary '{store.name}' frame store")
+            with profile.stage("cleanup"):
+                store.unlink()
+        return colors
+
+    with profile.waiting_stage("colors", "extraction") as on_wait:
+        images: Iterator[Path] = iter_frames_from_video(
+            video,
+            images_dir,
+            fps,
+            size=analysis_size,
+            resampling=resampling,
+            threads=ffmpeg_threads,
+            first_frame=first_frame,
+            nframes=nframes,
+            sampling=sampling,
+            window=window,
+            start_time=start_time,
+        )
+        # With windows, frames are removed as soon as they are loaded
+        remove = cleanup and window is not None
+        colors = compute_methods_colors_from_images(
+            profile.track_temp_files(images, removed=remove),
+            methods,
+            analysis_size,
+            resampling,
+            method_options,
+            jobs,
+            chunk_size,
+            remove=remove,
+            on_wait=on_wait,
+        )
+
+    if cleanup is True:
+        logger.info(f"Cleaning up: removing temporary '{images_dir.name}' directory")
+        with profile.stage("cleanup"):
+            rmtree(images_dir)
+    return colors
+
+
+def _segments_boundaries(
+    video: Path, duration: float | None, fps: int, segments: int
+) -> list[int] | None:
+    """
+    Split the timeline of the video, of the given duration (as given
+    by `probe_video`), into (at most) the given number of segments, of
+    about the same number of frames at the given fps. Returns the index
+    of the first frame of each segment, followed by the expected total
+    number of frames, or `None` if the video is not to be split (its
+    duration cannot be determined or is too short).
+    """
+    if not duration:
+        logger.warning(f"Could not determine the duration of '{video.name}', decoding it at once")
+        return None
+
+    total_frames = round(duration * fps)
+    # Empty segments, for very short videos, are dropped
+    boundaries = sorted({round(index * total_frames / segments) for index in range(segments + 1)})
+    return boundaries if len(boundaries) > 2 else None
+
+
+def _longest_first(videos: list[Path]) -> list[Path]:
+    """
+    Sort the videos by decreasing duration, as probed by ffprobe.
+    Videos which cannot be probed are placed last, their errors
+    being reported when they are processed.
+    """
+
+    def duration(video: Path) -> float:
+        try:
+            return probe_video(video).duration or 0.0
+        except RuntimeError:
+            return 0.0
+
+    with ThreadPoolExecutor() as executor:  # probing is mostly waiting on ffprobe
+        durations = list(executor.map(duration, videos))
+    return [video for _, video in sorted(zip(durations, videos), key=lambda x: -x[0])]
+
+
+def _as_methods_list(method: str | list[str]) -> list[str]:
+    """Get the given method(s) as a list of unique method names, in order."""
+    methods = [method] if isinstance(method, str) else method
+    return list(dict.fromkeys(Methods(element).value for element in methods))
+
+
 def _is_handled_video(video: Path) -> bool:
     """
     Check that the file extension is a handled video format.
@@ -0,0 +1,363 @@
+"""
+Profiling
+---------
+
+Module with helpers to record where time and memory go when
+processing videos: wall and CPU time of each processing stage,
+throughput, peak memory usage and temporary disk usage. These
+are gathered in a report which can be written to disk and
+summarized as a table.
+"""
+
+import json
+import sys
+import threading
+import time
+
+from collections import deque
+from collections.abc import Callable, Iterable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+
+from loguru import logger
+
+# Try to import resource (not available on Windows), set a flag on availability
+try:
+    import resource
+
+    RESOURCE_AVAILABLE: bool = True
+except ImportError:
+    RESOURCE_AVAILABLE: bool = False
+
+# Linux files to read, and reset, the peak memory usage of this process
+PROC_STATUS_PATH: Path = Path("/proc/self/status")
+PROC_CLEAR_REFS_PATH: Path = Path("/proc/self/clear_refs")
+
+# ----- Video Profiles ----- #
+
+
+class VideoProfile:
+    """
+    Measurements made while processing a single video. Stages are
+    timed with the `stage` context manager, and a stage entered
+    several times (for instance once per segment of the video)
+    accumulates its times.
+
+    Note
+    ----
+    CPU times include those of child processes (ffmpeg, and
+    worker processes) once they have exited. The peak memory
+    usage is reported for the main Python process and, apart,
+    for the largest exited child process: the worker processes
+    computing colors are kept alive and reused, so that they
+    only count once the pool shuts down (at the latest when the
+    command exits), and meanwhile only ffmpeg processes do.
+
+    CPU times and memory usage are measured for the whole process,
+    so that videos should be profiled one at a time (which is what
+    `movie_colorbar.process.process_directory` does when profiling).
+    The peak memory usage of the main process is reset when a profile
+    starts, where the OS allows it (on Linux), so that it is the
+    video's own. That of child processes can not be, and is the
+    largest so far.
+    """
+
+    def __init__(self, video: Path) -> None:
+        self.video: str = video.name
+        self.stages: dict[str, dict[str, float]] = {}
+        self.nframes: int = 0
+        self.temp_disk_bytes: int = 0
+        self._lock = threading.Lock()
+        self._start_wall = time.perf_counter()
+        self._wall_time: float | None = None
+        self._peak_rss_bytes: int | None = None
+        self._children_peak_rss_bytes: int | None = None
+        _reset_peak_rss()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Time the code run within this context as the given stage.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage, for instance 'extraction'.
+        """
+        start_wall, start_cpu = time.perf_counter(), _cpu_time()
+        try:
+            yield
+        finally:
+            self._add_stage_time(name, time.perf_counter() - start_wall, _cpu_time() - start_cpu)
+
+    @contextmanager
+    def waiting_stage(self, name: str, waiting_name: str) -> Iterator[Callable[[float], None]]:
+        """
+        Time the code run within this context as two stages, for code
+        which overlaps waiting on a source with processing its output
+        (such as computing colors while ffmpeg decodes frames). The
+        time spent waiting on the source, reported through the yielded
+        callback, is accounted as the waiting stage and the rest as the
+        given stage. The CPU time of child processes (such as ffmpeg)
+        goes to the waiting stage, and that of this process to the other.
+
+        Parameters
+        ----------
+        name : str
+            The name of the stage, for instance 'colors'.
+        waiting_name : str
+            The name of the waiting stage, for instance 'extraction'.
+
+        Yields
+        ------
+        Callable[[float], None]
+            To be called with each time (in seconds) spent waiting.
+        """
+        waited = []
+        start_wall = time.perf_counter()
+        start_cpu, start_children_cpu = time.process_time(), _children_cpu_time()
+        try:
+            yield waited.append
+        finally:
+            wall, wait = time.perf_counter() - start_wall, sum(waited)
+            self._add_stage_time(waiting_name, wait, _children_cpu_time() - start_children_cpu)
+            self._add_stage_time(name, wall - wait, time.process_time() - start_cpu)
+
+    def add_temp_disk_usage(self, path: Path) -> None:
+        """
+        Account for the size of a temporary file (such as a frame
+        store), or of the files in a directory which holds temporary
+        files (such as extracted frames).
+
+        Parameters
+        ----------
+        path : pathlib.Path
+            Path to the temporary file or directory.
+        """
+        if path.is_file():
+            nbytes = path.stat().st_size
+        else:
+            nbytes = sum(file.stat().st_size for file in path.iterdir() if file.is_file())
+        with self._lock:
+            self.temp_disk_bytes += nbytes
+
+    def track_temp_files(self, paths: Iterable[Path], removed: bool = False) -> Iterator[Path]:
+        """
+        Iterate over temporary files as they are created (such as the
+        extracted frames), accounting for the peak disk usage they
+        make. Each file's size is read as it goes through, so that it
+        is known even if the file is removed once consumed. If files
+        are removed by the consumer, the files still on disk are
+        measured each time a new one comes through, including those
+        still in flight in the consumer, and the peak is accounted
+        for. Otherwise all files are on disk at once, and their total
+        size is.
+
+        Note
+        ----
+        A removed file is only counted off once all the files before
+        it are removed as well (which is the case of the frames, that
+        are removed in about the order they are loaded), and the file
+        being written by the producer is not counted, so that the
+        peak is slightly off, by about a file.
+
+        Parameters
+        ----------
+        paths : Iterable[pathlib.Path]
+            The paths of the temporary files, once each is written.
+        removed : bool
+            Whether files are removed by the consumer once it is done
+            with them. Defaults to `False`.
+
+        Yields
+        ------
+        pathlib.Path
+            The paths of the files, unchanged.
+        """
+        on_disk: deque[tuple[Path, int]] = deque()
+        peak_bytes = disk_bytes = 0
+        try:
+            for path in paths:
+                while removed and on_disk and not on_disk[0][0].exists():
+                    disk_bytes -= on_disk.popleft()[1]
+                nbytes = path.stat().st_size
+                if removed:
+                    on_disk.append((path, nbytes))
+                disk_bytes += nbytes
+                peak_bytes = max(peak_bytes, disk_bytes)
+                yield path
+        finally:
+            with self._lock:
+                self.temp_disk_bytes += peak_bytes
+
+    def _add_stage_time(self, name: str, wall: float, cpu: float) -> None:
+        """Accumulate wall and CPU times to the given stage."""
+        with self._lock:
+            stage = self.stages.setdefault(name, {"wall_time": 0.0, "cpu_time": 0.0})
+            stage["wall_time"] += wall
+            stage["cpu_time"] += cpu
+
+    def finish(self) -> None:
+        """Mark the end of the processing of the video."""
+        self._wall_time = time.perf_counter() - self._start_wall
+        self._peak_rss_bytes = _peak_rss_bytes()
+        self._children_peak_rss_bytes = _peak_rss_bytes(children=True)
+
+    @property
+    def wall_time(self) -> float:
+        """Total wall time of the processing of the video, in seconds."""
+        if self._wall_time is None:
+            return time.perf_counter() - self._start_wall
+        return self._wall_time
+
+    def as_dict(self) -> dict:
+        """
+        The measurements as a JSON-serializable dictionary.
+
+        Returns
+        -------
+        dict
+            The profile of the video, with times in seconds and
+            memory and disk usage in bytes. The peak memory usage
+            of the main process and of its largest exited child
+            process are given separately.
+        """
+        return {
+            "video": self.video,
+            "wall_time": self.wall_time,
+            "cpu_time": sum(stage["cpu_time"] for stage in self.stages.values()),
+            "frames": self.nframes,
+            "frames_per_second": self.nframes / self.wall_time if self.wall_time else 0.0,
+            "main_peak_rss_bytes": self._peak_rss_bytes or _peak_rss_bytes(),
+            "children_peak_rss_bytes": (
+                self._children_peak_rss_bytes or _peak_rss_bytes(children=True)
+            ),
+            "temp_disk_bytes": self.temp_disk_bytes,
+            "stages": self.stages,
+        }
+
+
+# ----- Reports ----- #
+
+
+def write_profile_report(profiles: list[VideoProfile], path: Path) -> None:
+    """
+    Write the profiles of processed videos to a JSON file.
+
+    Parameters
+    ----------
+    profiles : list[VideoProfile]
+        The profiles of the processed videos.
+    path : pathlib.Path
+        Path of the JSON file to write.
+    """
+    report = {"videos": [profile.as_dict() for profile in profiles]}
+    path.write_text(json.dumps(report, indent=2))
+    logger.info(f"Wrote profile report to '{path.absolute()}'")
+
+
+def format_profile_summary(profiles: list[VideoProfile]) -> str:
+    """
+    Format a summary table of the profiles of processed videos,
+    with one row per video and a column per stage (wall times).
+
+    Parameters
+    ----------
+    profiles : list[VideoProfile]
+        The profiles of the processed videos.
+
+    Returns
+    -------
+    str
+        The summary table, as multiple lines of text.
+    """
+    stages = list(dict.fromkeys(name for profile in profiles for name in profile.stages))
+    header = [
+        "video",
+        *stages,
+        "total",
+        "cpu",
+        "frames/s",
+        "main peak RSS",
+        "child peak RSS",
+        "temp disk",
+    ]
+    rows = []
+    for profile in profiles:
+        summary = profile.as_dict()
+        rows.append(
+            [
+                profile.video,
+                *(
+                    f"{profile.stages[name]['wall_time']:.2f}s" if name in profile.stages else "-"
+                    for name in stages
+                ),
+                f"{summary['wall_time']:.2f}s",
+                f"{summary['cpu_time']:.2f}s",
+                f"{summary['frames_per_second']:.1f}",
+                _format_bytes(summary["main_peak_rss_bytes"]),
+                _format_bytes(summary["children_peak_rss_bytes"]),
+                _format_bytes(summary["temp_disk_bytes"]),
+            ]
+        )
+
+    widths = [max(len(str(row[index])) for row in [header, *rows]) for index in range(len(header))]
+    lines = [
+        "  ".join(str(cell).ljust(width) for cell, width in zip(row, widths))
+        for row in [header, *rows]
+    ]
+    lines.insert(1, "  ".join("-" * width for width in widths))
+    return "\n".join(lines)
+
+
+# ----- Helpers ----- #
+
+
+def _cpu_time() -> float:
+    """CPU time used so far by this process and its exited child processes."""
+    return time.process_time() + _children_cpu_time()
+
+
+def _children_cpu_time() -> float:
+    """CPU time used so far by the exited child processes of this process, 0 if unknown."""
+    if not RESOURCE_AVAILABLE:
+        return 0.0
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return children.ru_utime + children.ru_stime
+
+
+def _peak_rss_bytes(children: bool = False) -> int:
+    """
+    Peak resident memory of this process (since the last reset, see
+    `_reset_peak_rss`) or, with `children`, of the largest of its
+    exited child processes (as the OS reports it for RUSAGE_CHILDREN).
+    Returns 0 if unknown.
+    """
+    if not children:
+        try:  # Linux, which accounts for resets
+            for line in PROC_STATUS_PATH.read_text().splitlines():
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024  # in kilobytes
+        except (OSError, ValueError, IndexError):
+            pass
+    if not RESOURCE_AVAILABLE:
+        return 0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # Reported in kilobytes on Linux, but in bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+
+def _reset_peak_rss() -> None:
+    """Reset the peak resident memory of this process, where the OS allows it (Linux)."""
+    try:
+        PROC_CLEAR_REFS_PATH.write_text("5")  # resets the VmHWM of /proc/self/status
+    except OSError:
+        pass
+
+
+def _format_bytes(nbytes: int) -> str:
+    """Human readable size."""
+    for unit in ("B", "KB", "MB", "GB"):
+        if nbytes < 1024 or unit == "GB":
+            return f"{nbytes:.0f}{unit}" if unit == "B" else f"{nbytes:.1f}{unit}"
+        nbytes /= 1024
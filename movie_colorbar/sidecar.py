@@ -0,0 +1,152 @@
+"""
+Sidecar
+-------
+
+Module with functions to save the per-frame colors computed from
+a video to a small sidecar file next to its colorbar, along with
+what is needed to make sense of them (method and its options, fps,
+sampling and frame timestamps), and to load them back. Colorbars
+can then be rendered again from sidecars alone, at other sizes or
+layouts, without decoding the video.
+
+Sidecars are numpy `.npz` archives, which hold no pickled objects.
+"""
+
+import json
+import zipfile
+
+from pathlib import Path
+from typing import NamedTuple
+
+import numpy as np
+
+from loguru import logger
+
+from movie_colorbar.constants import Methods, Sampling
+
+# Extension of the sidecar files, written next to the colorbars
+SIDECAR_EXTENSION: str = ".npz"
+
+# Version of the sidecar format, bumped on incompatible changes
+SIDECAR_FORMAT_VERSION: int = 1
+
+
+class ColorsSidecar(NamedTuple):
+    """The contents of a colors sidecar file."""
+
+    colors: np.ndarray  # uint8 array of shape (N, 3)
+    timestamps: np.ndarray  # float64 array of shape (N,)
+    method: str
+    method_options: dict
+    fps: int
+    sampling: str
+    video: str
+
+
+# ----- Saving and Loading ----- #
+
+
+def save_colors_sidecar(
+    path: Path,
+    colors: np.ndarray,
+    method: str,
+    fps: int,
+    sampling: str = Sampling.fps,
+    method_options: dict | None = None,
+    video: str = "",
+    timestamps: np.ndarray | None = None,
+) -> None:
+    """
+    Write the per-frame colors computed from a video to a sidecar
+    file. The timestamp of each frame (in seconds from the start of
+    the video) is stored as well. With the `fps` sampling these are
+    known from the fps, while with the `keyframes` sampling they
+    have to be provided (see `extract.probe_keyframes_timestamps`).
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path of the sidecar file to write.
+    colors : numpy.ndarray
+        A uint8 array of shape (N, 3) with the color of each frame.
+    method : str
+        The method the colors were computed with.
+    fps : int
+        Number of frames extracted per second of video.
+    sampling : str, optional
+        How frames were sampled from the video (default `fps`).
+    method_options : dict, optional
+        The options the method was used with, which are needed
+        to bin colors consistently. They should be JSON-serializable.
+    video : str, optional
+        Name of the video the colors were computed from.
+    timestamps : numpy.ndarray, optional
+        The timestamp of each frame, in seconds from the start of
+        the video. Defaults to `None`, in which case they are those
+        of the `fps` sampling.
+
+    Raises
+    ------
+    ValueError
+        If timestamps are not provided with the `keyframes` sampling,
+        or there are not as many as colors.
+    """
+    if timestamps is None:
+        if sampling != Sampling.fps:
+            raise ValueError(f"Timestamps must be provided with the '{sampling}' sampling")
+        timestamps = np.arange(len(colors), dtype=np.float64) / fps
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if timestamps.shape != (len(colors),):
+        raise ValueError(f"Got {timestamps.size} timestamps for {len(colors)} colors")
+
+    with path.open("wb") as sidecar:  # so numpy does not append its own extension
+        np.savez_compressed(
+            sidecar,
+            version=np.int64(SIDECAR_FORMAT_VERSION),
+            colors=np.ascontiguousarray(colors, dtype=np.uint8),
+            timestamps=timestamps,
+            method=np.str_(Methods(method).value),
+            method_options=np.str_(json.dumps(method_options or {}, sort_keys=True)),
+            fps=np.int64(fps),
+            sampling=np.str_(Sampling(sampling).value),
+            video=np.str_(video),
+        )
+    logger.debug(f"Saved {len(colors)} colors to sidecar '{path.name}'")
+
+
+def load_colors_sidecar(path: Path) -> ColorsSidecar:
+    """
+    Load the colors and their metadata from a sidecar file.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path to the sidecar file.
+
+    Returns
+    -------
+    ColorsSidecar
+        The colors and their metadata.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid sidecar, or was written by
+        an incompatible version.
+    """
+    try:
+        with np.load(path, allow_pickle=False) as archive:
+            version = int(archive["version"])
+            if version != SIDECAR_FORMAT_VERSION:
+                raise ValueError(f"Unsupported sidecar format version {version}")
+            return ColorsSidecar(
+                colors=archive["colors"],
+                timestamps=archive["timestamps"],
+                method=str(archive["method"]),
+                method_options=json.loads(str(archive["method_options"])),
+                fps=int(archive["fps"]),
+                sampling=str(archive["sampling"]),
+                video=str(archive["video"]),
+            )
+    except (OSError, KeyError, ValueError, zipfile.BadZipFile) as error:
+        raise ValueError(f"Invalid colors sidecar '{path}': {error}") from error
@@ -0,0 +1,139 @@
+"""
+State
+-----
+
+Module with a small index of the videos of a directory which
+have already been processed, recording each video's size and
+modification time along with the settings used, so that only
+new or changed videos are processed again when watching the
+directory for new footage.
+"""
+
+import json
+import os
+import threading
+import time
+
+from pathlib import Path
+
+from loguru import logger
+
+# Name of the state index file, written in the output directory
+STATE_INDEX_FILENAME: str = ".movie_colorbar_index.json"
+
+# Time (in seconds) between two scans of a watched directory
+WATCH_INTERVAL_SECONDS: float = 5.0
+
+# ----- State Index ----- #
+
+
+class StateIndex:
+    """
+    Index of processed videos, persisted as a JSON file. Each video
+    is recorded with its size and modification time at the time it
+    was processed, and the settings it was processed with. A video
+    is up to date if none of these changed and its colorbars exist.
+    Videos which failed to be processed are recorded as well, and
+    are not retried until they change.
+
+    Note
+    ----
+    Videos modified less than `settle_seconds` ago are considered
+    not ready yet, as they may still be being written (for instance
+    copied into the directory), and are left for a later scan.
+    """
+
+    def __init__(self, path: Path, settle_seconds: float = 0.0) -> None:
+        self.path: Path = path
+        self.settle_seconds: float = settle_seconds
+        self._lock = threading.Lock()
+        try:
+            self._entries: dict[str, dict] = json.loads(path.read_text())["videos"]
+        except (OSError, ValueError, KeyError):
+            self._entries = {}
+
+    def needs_processing(self, video: Path, settings: dict, outputs: list[Path]) -> bool:
+        """
+        Whether the video is new or changed (or was processed with
+        other settings, or its colorbars are missing) and ready to
+        be processed.
+
+        Parameters
+        ----------
+        video : pathlib.Path
+            Path to the video file.
+        settings : dict
+            All settings which influence the colorbars. They
+            should be JSON-serializable.
+        outputs : list[pathlib.Path]
+            Paths to the colorbars created from the video.
+
+        Returns
+        -------
+        bool
+            `True` if the video should be processed now, `False`
+            if it is up to date, not ready yet or no longer exists.
+        """
+        try:
+            stat = video.stat()
+        except FileNotFoundError:  # removed or renamed since the directory was scanned
+            logger.debug(f"Video '{video.name}' no longer exists, skipping it")
+            return False
+        if time.time() - stat.st_mtime < self.settle_seconds:
+            logger.debug(f"Video '{video.name}' was modified recently, waiting for it to settle")
+            return False
+
+        with self._lock:
+            entry = self._entries.get(str(video.absolute()))
+        return not (
+            entry is not None
+            and entry["size"] == stat.st_size
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["settings"] == _normalized(settings)
+            and (entry["failed"] or all(output.is_file() for output in outputs))
+        )
+
+    def record(self, video: Path, settings: dict, failed: bool = False) -> None:
+        """
+        Record the video as processed with the given settings, and
+        write the index to disk. A video which no longer exists (it
+        was removed or renamed meanwhile) is not recorded.
+
+        Parameters
+        ----------
+        video : pathlib.Path
+            Path to the video file.
+        settings : dict
+            All settings which influence the colorbars. They
+            should be JSON-serializable.
+        failed : bool, optional
+            Whether processing the video failed (default `False`).
+        """
+        try:
+            stat = video.stat()
+        except FileNotFoundError:
+            logger.debug(f"Video '{video.name}' no longer exists, not recording it")
+            return
+        with self._lock:
+            self._entries[str(video.absolute())] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "settings": _normalized(settings),
+                "failed": failed,
+            }
+            self._save()
+
+    def _save(self) -> None:
+        """Write the index to disk (with the lock held)."""
+        # Write to a temporary file first so the index is never left partially written
+        temporary = self.path.with_suffix(f".{os.getpid()}.tmp")
+        temporary.write_text(json.dumps({"videos": self._entries}, indent=2))
+        os.replace(temporary, self.path)
+
+
+# ----- Helpers ----- #
+
+
+def _normalized(settings: dict) -> dict:
+    """The settings as they are read back from JSON, for comparisons (tuples become lists)."""
+    return json.loads(json.dumps(settings, sort_keys=True, default=str))
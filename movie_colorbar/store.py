@@ -0,0 +1,166 @@
+"""
+Store
+-----
+
+Module with functions to handle frame stores: single files holding
+many raw frames one after the other, behind a small header giving
+their dimensions. A store replaces the thousands of image files of
+an extraction (which are slow to list and open, for instance on a
+network filesystem) and is read as a memory-mapped (N, H, W, 3)
+uint8 array, without copies or decoding. Slices of it can be mapped
+on their own, for instance by each worker process for its chunk of
+frames.
+
+Frames are appended as they come, and the number of frames is given
+by the size of the file, so that a store can be read while it is
+still being written.
+"""
+
+import struct
+
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+import numpy as np
+
+from loguru import logger
+
+# Extension of the frame store files
+FRAME_STORE_EXTENSION: str = ".frames"
+
+# Layout of the header: magic bytes, format version, height, width and
+# channels of the frames. It is padded to a fixed size, reserved for
+# later additions, after which the frames' data starts.
+FRAME_STORE_MAGIC: bytes = b"MCBFRAME"
+FRAME_STORE_FORMAT_VERSION: int = 1
+FRAME_STORE_HEADER_SIZE: int = 64
+_HEADER_STRUCT = struct.Struct("<8sIIII")
+
+# ----- Writing ----- #
+
+
+def write_frame_store(path: Path, frames: Iterable[bytes], size: tuple[int, int]) -> Iterator[int]:
+    """
+    Write raw RGB24 frames (for instance as streamed by ffmpeg, see
+    `movie_colorbar.extract.stream_frames_from_video`) to a frame
+    store, yielding the index of each frame once it is written, so
+    that it can be read (mapped) while the next ones are written.
+    An existing file at the path is overwritten.
+
+    Note
+    ----
+    Should the consumer stop iterating early, the frames' source is
+    closed (which kills the ffmpeg process streaming them).
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path of the frame store file to write.
+    frames : Iterable[bytes]
+        The raw RGB24 data of each frame.
+    size : tuple[int, int]
+        The (width, height) of the frames.
+
+    Yields
+    ------
+    int
+        The index of the frame just written.
+    """
+    width, height = size
+    frame_bytes = width * height * 3
+    header = _HEADER_STRUCT.pack(FRAME_STORE_MAGIC, FRAME_STORE_FORMAT_VERSION, height, width, 3)
+    logger.debug(f"Writing frames to store '{path.name}'")
+    try:
+        with path.open("wb") as store:
+            store.write(header.ljust(FRAME_STORE_HEADER_SIZE, b"\0"))
+            for index, frame in enumerate(frames):
+                if len(frame) != frame_bytes:
+                    raise ValueError(
+                        f"Frame {index} has {len(frame)} bytes, {frame_bytes} expected"
+                    )
+                store.write(frame)
+                store.flush()  # so that the frame can be mapped from now on
+                yield index
+    finally:
+        if hasattr(frames, "close"):
+            frames.close()
+
+
+# ----- Reading ----- #
+
+
+def open_frame_store(path: Path, start: int = 0, stop: int | None = None) -> np.ndarray:
+    """
+    Map (a slice of) the frames of a frame store, read-only. Only
+    the requested frames are mapped, and nothing is read from disk
+    until they are accessed.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path to the frame store file.
+    start : int, optional
+        Index of the first frame to map. Defaults to 0.
+    stop : int, optional
+        Index of the frame to stop at (excluded). Defaults to
+        `None`, for all frames currently in the store.
+
+    Returns
+    -------
+    numpy.ndarray
+        A uint8 array of shape (N, H, W, 3) with the frames,
+        memory-mapped from the file (or an empty array).
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid frame store.
+    """
+    height, width, channels = _read_header(path)
+    frame_bytes = height * width * channels
+    nframes = (path.stat().st_size - FRAME_STORE_HEADER_SIZE) // frame_bytes
+    stop = nframes if stop is None else min(stop, nframes)
+    if stop <= start:  # numpy cannot map 0 bytes
+        return np.empty((0, height, width, channels), dtype=np.uint8)
+    return np.memmap(
+        path,
+        dtype=np.uint8,
+        mode="r",
+        offset=FRAME_STORE_HEADER_SIZE + start * frame_bytes,
+        shape=(stop - start, height, width, channels),
+    )
+
+
+def frame_store_length(path: Path) -> int:
+    """
+    The number of frames currently in a frame store.
+
+    Parameters
+    ----------
+    path : pathlib.Path
+        Path to the frame store file.
+
+    Returns
+    -------
+    int
+        The number of complete frames in the store.
+    """
+    height, width, channels = _read_header(path)
+    return (path.stat().st_size - FRAME_STORE_HEADER_SIZE) // (height * width * channels)
+
+
+# ----- Helpers ----- #
+
+
+def _read_header(path: Path) -> tuple[int, int, int]:
+    """Read the (height, width, channels) of the frames from the store's header."""
+    with path.open("rb") as store:
+        header = store.read(_HEADER_STRUCT.size)
+    if len(header) < _HEADER_STRUCT.size:
+        raise ValueError(f"'{path}' is not a frame store (header too short)")
+    magic, version, height, width, channels = _HEADER_STRUCT.unpack(header)
+    if magic != FRAME_STORE_MAGIC:
+        raise ValueError(f"'{path}' is not a frame store")
+    if version != FRAME_STORE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported frame store format version {version} in '{path}'")
+    return height, width, channels
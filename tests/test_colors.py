@@ -0,0 +1,126 @@
+"""
+Tests of the vectorized color conversions of `movie_colorbar.colors`,
+against their scalar counterparts (colorsys or our own conversions)
+and through round trips.
+"""
+
+import colorsys
+
+import numpy as np
+import pytest
+
+from movie_colorbar import colors
+
+# Absolute tolerance against the scalar conversions, which compute the same thing
+SCALAR_TOLERANCE: float = 1e-9
+
+# Absolute tolerances of round trips, in the units of the starting space
+RGB_UNIT_ROUND_TRIP_TOLERANCE: float = 1e-9  # RGB in [0, 1]
+RGB_255_ROUND_TRIP_TOLERANCE: float = 0.1  # RGB in [0, 255], XYZ matrices are truncated
+XYZ_ROUND_TRIP_TOLERANCE: float = 1e-9
+
+# Each case: the array conversion, its scalar counterpart, and the scale of inputs
+ARRAY_CONVERSIONS = [
+    (colors.convert_rgb_to_yiq_array, colors.cs_rgb_to_yiq, 1.0),
+    (colors.convert_rgb_to_hls_array, colors.cs_rgb_to_hls, 1.0),
+    (colors.convert_hls_to_rgb_array, colors.cs_hls_to_rgb, 1.0),
+    (colors.convert_rgb_to_hsv_array, colors.cs_rgb_to_hsv, 1.0),
+    (colors.convert_hsv_to_rgb_array, colors.cs_hsv_to_rgb, 1.0),
+    (colors.convert_rgb_to_xyz_array, colors.convert_rgb_to_xyz, 255.0),
+    (colors.convert_xyz_to_rgb_array, colors.convert_xyz_to_rgb, 100.0),
+    (colors.convert_xyz_to_lab_array, colors.convert_xyz_to_lab, 100.0),
+    (colors.convert_lab_to_xyz_array, colors.convert_lab_to_xyz, 100.0),
+]
+
+# Each case: the forward and backward conversions, scale of inputs and tolerance
+ROUND_TRIPS = [
+    (
+        colors.convert_rgb_to_yiq_array,
+        colors.convert_yiq_to_rgb_array,
+        1.0,
+        RGB_UNIT_ROUND_TRIP_TOLERANCE,
+    ),
+    (
+        colors.convert_rgb_to_hls_array,
+        colors.convert_hls_to_rgb_array,
+        1.0,
+        RGB_UNIT_ROUND_TRIP_TOLERANCE,
+    ),
+    (
+        colors.convert_rgb_to_hsv_array,
+        colors.convert_hsv_to_rgb_array,
+        1.0,
+        RGB_UNIT_ROUND_TRIP_TOLERANCE,
+    ),
+    (
+        colors.convert_rgb_to_xyz_array,
+        colors.convert_xyz_to_rgb_array,
+        255.0,
+        RGB_255_ROUND_TRIP_TOLERANCE,
+    ),
+    (
+        colors.convert_xyz_to_lab_array,
+        colors.convert_lab_to_xyz_array,
+        100.0,
+        XYZ_ROUND_TRIP_TOLERANCE,
+    ),
+]
+
+
+@pytest.fixture
+def random_colors() -> np.ndarray:
+    """Random colors with components in [0, 1], including greys and extremes."""
+    rng = np.random.default_rng(42)
+    values = rng.random((500, 3))
+    greys = np.repeat(rng.random((20, 1)), 3, axis=1)
+    extremes = np.array([[0.0, 0.0, 0.0], [1.0, 1.0, 1.0], [1.0, 0.0, 0.0], [0.0, 1.0, 1.0]])
+    return np.concatenate((values, greys, extremes))
+
+
+@pytest.mark.parametrize("parallel", [False, True], ids=["numpy", "parallel"])
+@pytest.mark.parametrize(
+    ("array_conversion", "scalar_conversion", "scale"),
+    ARRAY_CONVERSIONS,
+    ids=[case[0].__name__ for case in ARRAY_CONVERSIONS],
+)
+def test_array_conversion_matches_scalar(
+    random_colors, array_conversion, scalar_conversion, scale, parallel
+):
+    values = random_colors * scale
+    expected = np.array([scalar_conversion(*color) for color in values])
+    result = array_conversion(values, parallel=parallel)
+    assert result.shape == values.shape
+    np.testing.assert_allclose(result, expected, rtol=0, atol=SCALAR_TOLERANCE)
+
+
+def test_hls_to_rgb_matches_colorsys(random_colors):
+    # Our own implementation, which numba can compile, replaces colorsys' one
+    for color in random_colors:
+        np.testing.assert_allclose(
+            colors.cs_hls_to_rgb(*color), colorsys.hls_to_rgb(*color), rtol=0, atol=1e-12
+        )
+
+
+@pytest.mark.parametrize("parallel", [False, True], ids=["numpy", "parallel"])
+def test_array_conversion_keeps_leading_dimensions(random_colors, parallel):
+    image = random_colors[:520].reshape(20, 26, 3)
+    result = colors.convert_rgb_to_hsv_array(image, parallel=parallel)
+    assert result.shape == image.shape
+    np.testing.assert_allclose(
+        result.reshape(-1, 3),
+        colors.convert_rgb_to_hsv_array(random_colors[:520]),
+        rtol=0,
+        atol=SCALAR_TOLERANCE,
+    )
+
+
+@pytest.mark.parametrize("parallel", [False, True], ids=["numpy", "parallel"])
+@pytest.mark.parametrize(
+    ("forward", "backward", "scale", "tolerance"),
+    ROUND_TRIPS,
+    ids=[case[0].__name__ for case in ROUND_TRIPS],
+)
+def test_round_trip(random_colors, forward, backward, scale, tolerance, parallel):
+    values = random_colors * scale
+    result = backward(forward(values, parallel=parallel), parallel=parallel)
+    np.testing.assert_allclose(result, values, rtol=0, atol=tolerance)
@@ -0,0 +1,49 @@
+"""
+Tests of the batched color methods of `movie_colorbar.frames`,
+against the per-image functions of `movie_colorbar.image`.
+"""
+
+import numpy as np
+import pytest
+
+from PIL import Image
+
+from movie_colorbar import frames
+from movie_colorbar.image import get_most_common_color_as_rgb
+
+
+@pytest.fixture
+def tied_frames() -> np.ndarray:
+    """Frames in which two colors are tied for the most common, the higher one first."""
+    tied = np.zeros((2, 4, 4, 3), dtype=np.uint8)
+    tied[0, :2] = (200, 10, 10)  # 8 pixels
+    tied[0, 2:] = (10, 200, 10)  # 8 pixels, lower packed value
+    tied[1, :, :2] = (0, 0, 255)  # 8 pixels, lower packed value
+    tied[1, :, 2:] = (0, 255, 0)  # 8 pixels
+    return tied
+
+
+def test_most_common_ties_match_per_image(tied_frames):
+    batched = frames.get_frames_most_common_color_as_rgb(tied_frames)
+    per_image = [
+        get_most_common_color_as_rgb(Image.fromarray(frame, mode="RGB")) for frame in tied_frames
+    ]
+    np.testing.assert_array_equal(batched, np.array(per_image, dtype=np.uint8))
+    np.testing.assert_array_equal(batched, [[10, 200, 10], [0, 0, 255]])
+
+
+def test_most_common_engines_break_ties_alike(tied_frames):
+    codes = frames._packed_colors(tied_frames)
+    np.testing.assert_array_equal(
+        frames._histogram_modes(codes, 1 << 24), frames._sorted_modes(codes)
+    )
+
+
+def test_most_common_matches_per_image_on_random_frames():
+    rng = np.random.default_rng(42)
+    batch = rng.integers(0, 4, size=(8, 12, 16, 3), dtype=np.uint8) * 60  # many ties
+    batched = frames.get_frames_most_common_color_as_rgb(batch)
+    per_image = [
+        get_most_common_color_as_rgb(Image.fromarray(frame, mode="RGB")) for frame in batch
+    ]
+    np.testing.assert_array_equal(batched, np.array(per_image, dtype=np.uint8))
@@ -0,0 +1,42 @@
+"""
+Tests of the colors sidecar files of `movie_colorbar.sidecar`.
+"""
+
+import numpy as np
+import pytest
+
+from movie_colorbar.sidecar import load_colors_sidecar, save_colors_sidecar
+
+
+@pytest.fixture
+def colors() -> np.ndarray:
+    return np.random.default_rng(0).integers(0, 256, size=(4, 3), dtype=np.uint8)
+
+
+def test_fps_timestamps_from_fps(tmp_path, colors):
+    path = tmp_path / "colors.npz"
+    save_colors_sidecar(path, colors, "rgb", 2, "fps", video="video.mp4")
+    sidecar = load_colors_sidecar(path)
+    np.testing.assert_array_equal(sidecar.colors, colors)
+    np.testing.assert_array_equal(sidecar.timestamps, [0.0, 0.5, 1.0, 1.5])
+
+
+def test_keyframes_timestamps_are_stored(tmp_path, colors):
+    path = tmp_path / "colors.npz"
+    timestamps = np.array([0.0, 1.48, 2.96, 4.44])
+    save_colors_sidecar(path, colors, "rgb", 2, "keyframes", timestamps=timestamps)
+    sidecar = load_colors_sidecar(path)
+    np.testing.assert_array_equal(sidecar.timestamps, timestamps)
+    assert sidecar.sampling == "keyframes"
+
+
+def test_keyframes_timestamps_are_required(tmp_path, colors):
+    with pytest.raises(ValueError, match="Timestamps must be provided"):
+        save_colors_sidecar(tmp_path / "colors.npz", colors, "rgb", 2, "keyframes")
+
+
+def test_timestamps_match_colors(tmp_path, colors):
+    with pytest.raises(ValueError, match="3 timestamps for 4 colors"):
+        save_colors_sidecar(
+            tmp_path / "colors.npz", colors, "rgb", 2, "keyframes", timestamps=[0.0, 1.0, 2.0]
+        )